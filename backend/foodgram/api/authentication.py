@@ -0,0 +1,139 @@
+import threading
+from collections import OrderedDict
+from copy import copy
+from time import monotonic
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.authentication import TokenAuthentication
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+from .cache import get_versions
+
+AUTH_VERSION_KEY = 'api:auth:{}:version'
+
+
+class ExpiringLRUCache:
+    """
+    Кэш процесса ограниченного размера: записи живут ttl секунд,
+    при переполнении вытесняются давно не использованные.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.items.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < monotonic():
+                del self.items[key]
+                return None
+            self.items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.items[key] = (value, monotonic() + self.ttl)
+            self.items.move_to_end(key)
+            while len(self.items) > self.maxsize:
+                self.items.popitem(last=False)
+
+    def discard(self, key):
+        with self.lock:
+            self.items.pop(key, None)
+
+    def discard_user(self, pk):
+        """Убирает все записи пользователя: и по токенам, и по id."""
+        with self.lock:
+            for key in [
+                key for key, (value, _) in self.items.items()
+                if value[0].pk == pk
+            ]:
+                del self.items[key]
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+
+credentials = ExpiringLRUCache(
+    settings.AUTH_CACHE_SIZE, settings.AUTH_CACHE_TIMEOUT)
+
+
+def auth_version(pk):
+    version, = get_versions(AUTH_VERSION_KEY.format(pk))
+    return version
+
+
+def forget_token(key, user_id=None):
+    credentials.discard(('token', key))
+    if user_id is not None:
+        forget_user(user_id)
+
+
+def forget_user(pk):
+    """
+    Сбрасывает записи пользователя в этом процессе сразу, а в остальных -
+    сменой версии в общем кэше после коммита.
+    """
+    credentials.discard_user(pk)
+    transaction.on_commit(lambda: cache.set(
+        AUTH_VERSION_KEY.format(pk), uuid4().hex, timeout=None))
+
+
+def remember(key, load_credentials):
+    """
+    (user, token) из кэша процесса, если версия пользователя в общем
+    кэше не сменилась, иначе из load_credentials().
+    """
+    cached = credentials.get(key)
+    if cached is not None:
+        user, token, version = cached
+        if version == auth_version(user.pk):
+            return copy(user), token
+        credentials.discard(key)
+    user, token = load_credentials()
+    credentials.set(key, (user, token, auth_version(user.pk)))
+    return copy(user), token
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication, который запоминает пользователя по токену
+    в кэше процесса, чтобы не делать JOIN authtoken_token и
+    users_user на каждый запрос. Запись проверяется по версии
+    пользователя в кэше Django: выход и изменение пользователя в любом
+    процессе сбрасывают её во всех, если кэш общий (recipes.W001).
+    """
+
+    def authenticate_credentials(self, key):
+        return remember(
+            ('token', key),
+            lambda: super(
+                CachedTokenAuthentication, self
+            ).authenticate_credentials(key)
+        )
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWT из djoser.urls.jwt: подпись и срок проверяются без БД,
+    пользователь по id из токена берётся из того же кэша.
+    """
+
+    def get_user(self, validated_token):
+        user, _ = remember(
+            ('user', validated_token.get(api_settings.USER_ID_CLAIM)),
+            lambda: (super(CachedJWTAuthentication, self).get_user(
+                validated_token), None)
+        )
+        return user
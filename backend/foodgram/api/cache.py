@@ -0,0 +1,106 @@
+import json
+from hashlib import md5
+from time import time
+from urllib.parse import urlencode
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from recipes.catalog import get_catalog
+
+RECIPE_LIST_VERSION_KEY = 'api:recipes:list:version'
+RECIPE_VERSION_KEY = 'api:recipes:{}:version'
+RECIPE_FLAGS = ('is_favorited', 'is_in_shopping_cart')
+
+
+def get_versions(*keys, create=True):
+    """
+    Текущие токены версий; недостающие создаются атомарно через add.
+    С create=False вместо недостающих возвращается None.
+    """
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing and create:
+        for key in missing:
+            cache.add(key, uuid4().hex, timeout=None)
+        versions.update(cache.get_many(missing))
+    return [versions.get(key) for key in keys]
+
+
+def normalize_query(query_params):
+    """Параметры запроса в каноническом порядке, без пустых значений."""
+    return urlencode(sorted(
+        (name, value)
+        for name, values in query_params.lists()
+        for value in values if value
+    ))
+
+
+def list_key(request, create=True):
+    """
+    Ключ страницы списка. Версия справочника входит в ключ, поэтому
+    изменение тегов и ингридиентов сбрасывает все страницы.
+    """
+    list_version, = get_versions(RECIPE_LIST_VERSION_KEY, create=create)
+    if list_version is None:
+        return None
+    query = md5(
+        f'{request.build_absolute_uri(request.path)}?'
+        f'{normalize_query(request.query_params)}'.encode()
+    ).hexdigest()
+    return (f'api:recipes:list:{get_catalog(request).version}:'
+            f'{list_version}:{query}')
+
+
+def detail_key(request, pk, create=True):
+    """
+    Ключ ответа рецепта pk (целое число). Без create версия не создаётся
+    и ключа нет, пока рецепт не отдан хотя бы раз: запросы к
+    несуществующим id не оставляют в кэше вечных записей.
+    """
+    recipe_version, = get_versions(
+        RECIPE_VERSION_KEY.format(pk), create=create)
+    if recipe_version is None:
+        return None
+    host = md5(request.build_absolute_uri('/').encode()).hexdigest()
+    return (f'api:recipes:detail:{pk}:{get_catalog(request).version}:'
+            f'{recipe_version}:{host}')
+
+
+def recipe_rows(data):
+    """Карточки рецептов внутри ответа list или retrieve."""
+    if isinstance(data, list):
+        return data
+    if 'results' in data:
+        return data['results']
+    return [data]
+
+
+def store(key, data):
+    """
+    Сохраняет базовый ответ: флаги пользователя сброшены в False,
+    ETag считается по содержимому, Last-Modified - время сборки.
+    """
+    base = json.loads(json.dumps(data))
+    for row in recipe_rows(base):
+        row.update(dict.fromkeys(RECIPE_FLAGS, False))
+    entry = {
+        'data': base,
+        'etag': md5(json.dumps(base).encode()).hexdigest(),
+        'modified': int(time()),
+    }
+    cache.set(key, entry, settings.RECIPE_RESPONSE_CACHE_TIMEOUT)
+    return entry
+
+
+def invalidate_recipes(ids):
+    """После коммита сбрасывает ответы рецептов ids и все страницы списка."""
+    keys = [RECIPE_LIST_VERSION_KEY] + [
+        RECIPE_VERSION_KEY.format(pk) for pk in set(ids)
+    ]
+    transaction.on_commit(
+        lambda: cache.set_many(
+            dict.fromkeys(keys, uuid4().hex), timeout=None)
+    )
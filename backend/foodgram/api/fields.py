@@ -0,0 +1,116 @@
+import binascii
+import re
+import uuid
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from PIL import Image
+from rest_framework import serializers
+
+DATA_URI_PREFIX = re.compile(r'^data:(?P<content_type>[\w/+.-]*);base64,')
+DECODE_CHUNK_SIZE = 64 * 1024
+IMAGE_EXTENSIONS = {
+    'JPEG': 'jpg',
+    'PNG': 'png',
+    'GIF': 'gif',
+    'WEBP': 'webp',
+}
+
+
+class Base64ImageField(serializers.ImageField):
+    """
+    Изображение в base64 (в том числе data URI). Строка декодируется
+    частями во временный файл, размеры проверяются по заголовку, как
+    только он декодирован, поэтому память на загрузку ограничена
+    размером части, а не изображения.
+    """
+
+    default_error_messages = {
+        'invalid_base64': 'Ожидается изображение в кодировке base64.',
+        'too_large': 'Изображение больше {max_bytes} байт.',
+        'too_many_pixels': 'Изображение больше {max_pixels} пикселей.',
+        'invalid_format': 'Поддерживаются изображения JPEG, PNG, GIF и WEBP.',
+    }
+
+    def __init__(self, *args, max_bytes=None, max_pixels=None, **kwargs):
+        self.max_bytes = max_bytes or settings.IMAGE_UPLOAD_MAX_BYTES
+        self.max_pixels = max_pixels or settings.IMAGE_UPLOAD_MAX_PIXELS
+        super().__init__(*args, **kwargs)
+
+    def to_internal_value(self, data):
+        if data == '':
+            return None
+        if not isinstance(data, str):
+            self.fail('invalid_base64')
+
+        match = DATA_URI_PREFIX.match(data)
+        start = match.end() if match else 0
+        if (len(data) - start) * 3 // 4 > self.max_bytes:
+            self.fail('too_large', max_bytes=self.max_bytes)
+
+        upload = TemporaryUploadedFile(
+            name='upload', content_type=None, size=0, charset=None)
+        try:
+            file_format = self.decode(data, start, upload)
+            upload.name = (
+                f'{uuid.uuid4()}.{IMAGE_EXTENSIONS[file_format]}')
+            upload.size = upload.file.tell()
+            upload.seek(0)
+            return super().to_internal_value(upload)
+        except Exception:
+            upload.close()
+            raise
+
+    def decode(self, data, start, upload):
+        """
+        Пишет декодированные части в upload и возвращает формат
+        изображения. Размеры проверяются сразу после заголовка.
+        """
+        file_format = None
+        remainder = ''
+        for position in range(start, len(data), DECODE_CHUNK_SIZE):
+            chunk = remainder + ''.join(
+                data[position:position + DECODE_CHUNK_SIZE].split())
+            usable = len(chunk) - len(chunk) % 4
+            chunk, remainder = chunk[:usable], chunk[usable:]
+            self.write_chunk(upload, chunk)
+            if file_format is None:
+                file_format = self.check_header(upload, complete=False)
+        if remainder:
+            self.write_chunk(upload, remainder + '=' * (-len(remainder) % 4))
+        if file_format is None:
+            file_format = self.check_header(upload, complete=True)
+        return file_format
+
+    def write_chunk(self, upload, chunk):
+        try:
+            upload.write(binascii.a2b_base64(chunk))
+        except binascii.Error:
+            self.fail('invalid_base64')
+
+    def check_header(self, upload, complete):
+        """
+        Формат по заголовку уже записанной части файла. Пока заголовок
+        не дописан, возвращает None; для полного файла - ошибку.
+        """
+        upload.flush()
+        position = upload.tell()
+        upload.seek(0)
+        try:
+            with Image.open(upload.file) as image:
+                file_format = image.format
+                width, height = image.size
+        except Image.DecompressionBombError:
+            self.fail('too_many_pixels', max_pixels=self.max_pixels)
+        except Exception:
+            if complete:
+                self.fail('invalid_format')
+            return None
+        finally:
+            upload.seek(position)
+
+        if file_format not in IMAGE_EXTENSIONS:
+            self.fail('invalid_format')
+        if width * height > self.max_pixels:
+            self.fail('too_many_pixels', max_pixels=self.max_pixels)
+        return file_format
@@ -1,40 +1,163 @@
+from django.conf import settings
+from django.db import connection
+from django.db.models import (Case, Count, Exists, IntegerField, OuterRef,
+                              Value, When)
 from django_filters.rest_framework import FilterSet, filters
 
-from recipes.models import Recipe, Tag
+from recipes.catalog import get_catalog
+from recipes.models import Recipe
+from recipes.search import search_recipes
 from users.models import User
 
 
+TAGS_MATCH_ANY = 'any'
+TAGS_MATCH_ALL = 'all'
+SCORE_ORDERINGS = {
+    'popular': 'popular_score',
+    'trending': 'trending_score',
+}
+
+
+def tag_choices():
+    return [
+        (slug, tag.name) for slug, tag in get_catalog().tags_by_slug.items()
+    ]
+
+
 class RecipeFilter(FilterSet):
     author = filters.ModelMultipleChoiceFilter(
         field_name='author__id',
         to_field_name='pk',
         queryset=User.objects.all()
     )
-    tags = filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all()
+    tags = filters.MultipleChoiceFilter(
+        choices=tag_choices,
+        method='filter_tags'
+    )
+    tags_match = filters.ChoiceFilter(
+        choices=(
+            (TAGS_MATCH_ANY, 'Любой из тегов'),
+            (TAGS_MATCH_ALL, 'Все теги'),
+        ),
+        method='filter_tags_match'
     )
     is_favorited = filters.BooleanFilter(
-        method='get_queryset_favorited'
+        method='filter_user_flag'
     )
     is_in_shopping_cart = filters.BooleanFilter(
-        method='get_queryset_shopping_cart'
+        method='filter_user_flag'
+    )
+    search = filters.CharFilter(
+        method='filter_search'
+    )
+    ordering = filters.ChoiceFilter(
+        choices=(
+            ('popular', 'Популярные'),
+            ('trending', 'Популярные за последние дни'),
+        ),
+        method='filter_ordering'
     )
 
     class Meta:
         model = Recipe
         fields = ('is_favorited', 'is_in_shopping_cart',)
 
-    def get_queryset_favorited(self, queryset, name, value):
-        return queryset.filter(recipe_is_favourite__user=self.request.user)
+    def filter_tags(self, queryset, name, value):
+        """
+        Отбор по тегам подзапросом к промежуточной таблице, без JOIN
+        и DISTINCT: рецепт попадает в выдачу один раз. По умолчанию
+        нужен любой из тегов, с tags_match=all - все сразу.
+        """
+        tags = get_catalog(self.request).tags_by_slug
+        tag_ids = {tags[slug].id for slug in value}
+        recipe_tags = Recipe.tags.through.objects.filter(tag_id__in=tag_ids)
+
+        if self.form.cleaned_data.get('tags_match') == TAGS_MATCH_ALL:
+            return queryset.filter(pk__in=recipe_tags.values(
+                'recipe_id'
+            ).annotate(
+                matched=Count('tag_id')
+            ).filter(matched=len(tag_ids)).values('recipe_id'))
+
+        return queryset.filter(
+            Exists(recipe_tags.filter(recipe_id=OuterRef('pk'))))
+
+    def filter_tags_match(self, queryset, name, value):
+        return queryset
 
-    def get_queryset_shopping_cart(self, queryset, name, value):
-        return queryset.filter(recipe_shopping_cart__user=self.request.user)
+    def filter_search(self, queryset, name, value):
+        """
+        Полнотекстовый поиск по названию, тексту и ингридиентам;
+        самые релевантные рецепты первыми, если не задан ordering.
+        """
+        return search_recipes(queryset, value).order_by(
+            '-search_rank', '-id')
+
+    def filter_ordering(self, queryset, name, value):
+        """
+        Порядок по рейтингу, заранее посчитанному командой
+        update_recipe_scores: запрос не агрегирует избранное и корзины.
+        """
+        return queryset.order_by(f'-{SCORE_ORDERINGS[value]}', '-id')
+
+    def filter_user_flag(self, queryset, name, value):
+        """
+        Отбор по флагу is_favorited или is_in_shopping_cart. Флаг берётся
+        из аннотации EXISTS, которую затем выводит сериализатор. У анонима
+        нет избранного и корзины: true даёт пустую выдачу, false - всю.
+        """
+        user = getattr(self.request, 'user', None)
+        if user is None or not user.is_authenticated:
+            return queryset.none() if value else queryset
+
+        if name not in queryset.query.annotations:
+            queryset = queryset.with_user_flags(user)
+        return queryset.filter(**{name: value})
 
 
 class IngredientFilter(FilterSet):
-    name = filters.CharFilter(
-        field_name='name',
-        lookup_expr='icontains'
-    )
+    """
+    Подсказки для редактора рецептов: сначала ингридиенты, название
+    которых начинается с запроса, затем содержащие его. Размер выдачи
+    задаётся параметром limit.
+    """
+
+    name = filters.CharFilter(method='filter_name')
+    # Строка, а не число: неверный limit заменяется значением по умолчанию.
+    limit = filters.CharFilter(method='filter_limit')
+
+    def get_limit(self):
+        try:
+            limit = int(self.data.get(
+                'limit', settings.INGREDIENT_SEARCH_LIMIT))
+        except (TypeError, ValueError):
+            limit = settings.INGREDIENT_SEARCH_LIMIT
+        return max(1, min(limit, settings.INGREDIENT_SEARCH_MAX_LIMIT))
+
+    def filter_limit(self, queryset, name, value):
+        """Без name - первые limit ингридиентов по алфавиту."""
+        if self.data.get('name'):
+            return queryset
+        return queryset.order_by('name', 'id')[:self.get_limit()]
+
+    def filter_name(self, queryset, name, value):
+        limit = self.get_limit()
+
+        if connection.vendor == 'postgresql':
+            return queryset.filter(name__icontains=value).annotate(
+                is_substring=Case(
+                    When(name__istartswith=value, then=Value(0)),
+                    default=Value(1),
+                    output_field=IntegerField()
+                )
+            ).order_by('is_substring', 'name')[:limit]
+
+        catalog = get_catalog(self.request)
+        ids = catalog.ingredient_index.search(value, limit)
+        return queryset.filter(pk__in=ids).order_by(
+            Case(
+                *[When(pk=pk, then=Value(position))
+                  for position, pk in enumerate(ids)],
+                output_field=IntegerField()
+            )
+        )
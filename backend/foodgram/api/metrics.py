@@ -0,0 +1,187 @@
+import re
+import threading
+from collections import Counter, defaultdict
+from time import perf_counter
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+IN_LIST = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def query_shape(sql):
+    """SQL без различий в длине списков IN (%s, %s, ...)."""
+    return IN_LIST.sub('(%s...)', sql)
+
+
+class QueryRecorder:
+    """
+    Обёртка execute_wrapper: считает запросы к БД, их время
+    и повторы одного и того же запроса.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += perf_counter() - started
+            self.count += 1
+            self.shapes[query_shape(sql)] += 1
+
+    def repeated(self, limit):
+        """Запросы, повторённые больше limit раз: признак N+1."""
+        return [
+            (shape, count) for shape, count in self.shapes.most_common()
+            if count > limit
+        ]
+
+
+class TimedSerializerMixin:
+    """
+    Время to_representation для подробно замеряемых запросов (см.
+    RequestMetricsMiddleware): попадает в serializer, а не в app.
+    Вложенные сериализаторы внутри внешнего не учитываются повторно.
+    """
+
+    def to_representation(self, instance):
+        request = self.context.get('request')
+        timings = getattr(request, 'request_timings', None)
+        if timings is None or timings.recorder is None:
+            return super().to_representation(instance)
+        with timings.serializing():
+            return super().to_representation(instance)
+
+
+SUMMED = (
+    ('response_size_bytes_total', 'size', 'Размер ответов.'),
+    ('sampled_requests_total', 'sampled',
+     'Запросы, для которых собраны подробные замеры.'),
+    ('db_queries_total', 'queries',
+     'Запросы к БД в подробно замеренных запросах.'),
+    ('db_duration_seconds_total', 'db',
+     'Время запросов к БД в подробно замеренных запросах.'),
+    ('serializer_duration_seconds_total', 'serializer',
+     'Время сериализаторов (to_representation) без БД.'),
+    ('app_duration_seconds_total', 'app',
+     'Время остального кода представлений без БД.'),
+    ('render_duration_seconds_total', 'render',
+     'Время рендеринга ответов.'),
+    ('repeated_queries_total', 'repeated',
+     'Запросы, где один и тот же SQL повторился слишком много раз (N+1).'),
+)
+
+
+def labels(view, method, **extra):
+    values = {'view': view, 'method': method, **extra}
+    escaped = ','.join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace('\\', '\\\\').replace('"', '\\"')
+        )
+        for name, value in values.items()
+    )
+    return f'{{{escaped}}}'
+
+
+class Registry:
+    """
+    Счётчики запросов по представлениям в памяти процесса. Каждый
+    процесс gunicorn отдаёт свои значения, как обычный экспортёр
+    Prometheus без общей памяти.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = Counter()
+            self.histograms = defaultdict(
+                lambda: [0] * (len(self.buckets) + 1))
+            self.sums = defaultdict(Counter)
+
+    def observe(self, view, method, status, duration, size, sample=None):
+        key = (view, method)
+        with self.lock:
+            self.requests[(view, method, str(status))] += 1
+            histogram = self.histograms[key]
+            for index, bound in enumerate(self.buckets):
+                if duration <= bound:
+                    histogram[index] += 1
+                    break
+            else:
+                histogram[-1] += 1
+            sums = self.sums[key]
+            sums['duration'] += duration
+            sums['size'] += size
+            if sample is not None:
+                sums['sampled'] += 1
+                sums.update(sample)
+
+    def render(self):
+        with self.lock:
+            lines = [
+                '# HELP foodgram_requests_total Запросы к приложению.',
+                '# TYPE foodgram_requests_total counter',
+            ]
+            lines += [
+                f'foodgram_requests_total{labels(view, method, status=status)}'
+                f' {count}'
+                for (view, method, status), count in sorted(
+                    self.requests.items())
+            ]
+            lines += [
+                '# HELP foodgram_request_duration_seconds Время ответа.',
+                '# TYPE foodgram_request_duration_seconds histogram',
+            ]
+            for (view, method), histogram in sorted(self.histograms.items()):
+                total = 0
+                bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+                for bound, count in zip(bounds, histogram):
+                    total += count
+                    lines.append(
+                        'foodgram_request_duration_seconds_bucket'
+                        f'{labels(view, method, le=bound)} {total}'
+                    )
+                lines.append(
+                    'foodgram_request_duration_seconds_sum'
+                    f'{labels(view, method)} '
+                    f'{self.sums[(view, method)]["duration"]:.6f}'
+                )
+                lines.append(
+                    'foodgram_request_duration_seconds_count'
+                    f'{labels(view, method)} {total}'
+                )
+            for name, field, description in SUMMED:
+                lines += [
+                    f'# HELP foodgram_{name} {description}',
+                    f'# TYPE foodgram_{name} counter',
+                ]
+                lines += [
+                    f'foodgram_{name}{labels(view, method)} '
+                    f'{round(sums[field], 6)}'
+                    for (view, method), sums in sorted(self.sums.items())
+                ]
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry(settings.REQUEST_METRICS_BUCKETS)
+
+
+def metrics(request):
+    """Счётчики в текстовом формате Prometheus."""
+    token = settings.METRICS_TOKEN
+    if token and not constant_time_compare(
+            request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
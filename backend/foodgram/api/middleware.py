@@ -0,0 +1,124 @@
+import logging
+import random
+from contextlib import ExitStack, contextmanager
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connections
+
+from .metrics import QueryRecorder, registry
+
+logger = logging.getLogger(__name__)
+
+
+class RequestTimings:
+    """Замеры одного запроса, которые дополняют хуки middleware."""
+
+    def __init__(self, sampled):
+        self.started = perf_counter()
+        self.recorder = QueryRecorder() if sampled else None
+        self.render_started = None
+        self.render = 0.0
+        self.serializer = 0.0
+        self.serializer_depth = 0
+
+    def rendered(self, response):
+        self.render = perf_counter() - self.render_started
+
+    @contextmanager
+    def serializing(self):
+        """
+        Время внешнего вызова сериализатора за вычетом запросов к БД,
+        которые он сделал (они уже учтены в db).
+        """
+        self.serializer_depth += 1
+        started = perf_counter()
+        db_started = self.recorder.duration
+        try:
+            yield
+        finally:
+            self.serializer_depth -= 1
+            if not self.serializer_depth:
+                self.serializer += (
+                    perf_counter() - started
+                    - (self.recorder.duration - db_started)
+                )
+
+
+class RequestMetricsMiddleware:
+    """
+    Время ответа, размер и статус каждого запроса по представлениям.
+    Доля REQUEST_METRICS_SAMPLE_RATE запросов замеряется подробно:
+    число и время запросов к БД, время сериализаторов, остального кода
+    представления и рендеринга,
+    повторы одного SQL больше REQUEST_METRICS_REPEATED_QUERIES раз.
+    Подробные замеры попадают в заголовок Server-Timing; все счётчики
+    отдаёт /metrics.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = RequestTimings(
+            random.random() < settings.REQUEST_METRICS_SAMPLE_RATE)
+        request.request_timings = timings
+        with ExitStack() as stack:
+            if timings.recorder is not None:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(timings.recorder))
+            response = self.get_response(request)
+        duration = perf_counter() - timings.started
+
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        if view == 'metrics':
+            return response
+        size = (
+            int(response.get('Content-Length', 0)) if response.streaming
+            else len(response.content)
+        )
+
+        sample = None
+        server_timing = [f'total;dur={duration * 1000:.1f}']
+        if timings.recorder is not None:
+            sample = self.sample(view, timings, duration)
+            server_timing += [
+                f'db;dur={sample["db"] * 1000:.1f};'
+                f'desc="{sample["queries"]} queries"',
+                f'serializer;dur={sample["serializer"] * 1000:.1f}',
+                f'app;dur={sample["app"] * 1000:.1f}',
+                f'render;dur={sample["render"] * 1000:.1f}',
+            ]
+        registry.observe(
+            view, request.method, response.status_code, duration, size,
+            sample
+        )
+        response['Server-Timing'] = ', '.join(server_timing)
+        return response
+
+    def process_template_response(self, request, response):
+        timings = request.request_timings
+        timings.render_started = perf_counter()
+        response.add_post_render_callback(timings.rendered)
+        return response
+
+    def sample(self, view, timings, duration):
+        recorder = timings.recorder
+        repeated = recorder.repeated(settings.REQUEST_METRICS_REPEATED_QUERIES)
+        for shape, count in repeated:
+            logger.warning(
+                'Возможный N+1 в %s: запрос повторён %s раз: %s',
+                view, count, shape[:500]
+            )
+        return {
+            'queries': recorder.count,
+            'db': recorder.duration,
+            'render': timings.render,
+            'serializer': timings.serializer,
+            'app': max(
+                duration - recorder.duration - timings.render
+                - timings.serializer, 0),
+            'repeated': len(repeated),
+        }
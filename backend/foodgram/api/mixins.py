@@ -1,4 +1,19 @@
-from rest_framework import mixins, viewsets
+from functools import partial
+from hashlib import md5
+
+from django.core.cache import cache
+from django.http import Http404
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework import mixins, status, viewsets
+from rest_framework.response import Response
+
+from . import cache as response_cache
+from recipes.catalog import get_catalog
+from recipes.models import Recipe
+
+# Наибольший id для AutoField (integer в PostgreSQL).
+MAX_RECIPE_ID = 2 ** 31 - 1
 
 
 class CreateListViewSet(mixins.CreateModelMixin, mixins.ListModelMixin,
@@ -30,3 +45,125 @@ class CreateDestroyListViewSet(
         viewsets.GenericViewSet):
 
     pass
+
+
+class CatalogViewSetMixin:
+    """
+    Справочник, который читается из снимка в памяти процесса.
+    Запросы с параметрами фильтрации идут обычным путём через БД.
+    """
+
+    catalog_section = None
+
+    def is_filtered(self):
+        filterset_class = getattr(self, 'filterset_class', None)
+        return filterset_class is not None and any(
+            name in self.request.query_params
+            for name in filterset_class.base_filters
+        )
+
+    def list(self, request, *args, **kwargs):
+        if self.is_filtered():
+            return super().list(request, *args, **kwargs)
+
+        catalog = get_catalog(self.request)
+        rows = getattr(catalog, self.catalog_section).values()
+        serializer = self.get_serializer(list(rows), many=True)
+        return Response(serializer.data)
+
+    def get_object(self):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        row = get_catalog(self.request).get(
+            self.catalog_section, self.kwargs[lookup_url_kwarg])
+        if row is None:
+            raise Http404
+        self.check_object_permissions(self.request, row)
+        return row
+
+
+class RecipeResponseCacheMixin:
+    """
+    Кэш ответов list и retrieve. В кэше лежит ответ без пользовательских
+    флагов; авторизованному пользователю флаги is_favorited и
+    is_in_shopping_cart накладываются одним запросом по id рецептов.
+    Запросы с фильтрами, зависящими от пользователя, идут мимо кэша.
+    """
+
+    cache_bypass_params = ('is_favorited', 'is_in_shopping_cart')
+
+    def list(self, request, *args, **kwargs):
+        if any(name in request.query_params
+               for name in self.cache_bypass_params):
+            return super().list(request, *args, **kwargs)
+        return self.cached_response(
+            partial(response_cache.list_key, request),
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        # pk из URL попадает в ключ кэша только как число.
+        try:
+            pk = int(kwargs[lookup_url_kwarg])
+        except ValueError:
+            raise Http404
+        if str(pk) != kwargs[lookup_url_kwarg] or not 0 < pk <= MAX_RECIPE_ID:
+            raise Http404
+        return self.cached_response(
+            partial(response_cache.detail_key, request, pk),
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def overlay_user_flags(self, data):
+        rows = response_cache.recipe_rows(data)
+        user = self.request.user
+        if not user.is_authenticated or not rows:
+            return
+        flags = {
+            pk: (is_favorited, is_in_shopping_cart)
+            for pk, is_favorited, is_in_shopping_cart
+            in Recipe.objects.filter(
+                pk__in=[row['id'] for row in rows]
+            ).with_user_flags(user).values_list(
+                'id', *response_cache.RECIPE_FLAGS)
+        }
+        for row in rows:
+            row['is_favorited'], row['is_in_shopping_cart'] = flags.get(
+                row['id'], (False, False))
+
+    def cached_response(self, get_key, view, request, *args, **kwargs):
+        """
+        get_key(create=False) может вернуть None: тогда ответ строится
+        заново, а версия и ключ создаются только для ответа 200.
+        """
+        key = get_key(create=False)
+        entry = None if key is None else cache.get(key)
+        if entry is None:
+            response = view(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            entry = response_cache.store(key or get_key(), response.data)
+            data = response.data
+        else:
+            data = entry['data']
+            self.overlay_user_flags(data)
+            response = Response(data)
+
+        flags = [
+            (row['is_favorited'], row['is_in_shopping_cart'])
+            for row in response_cache.recipe_rows(data)
+        ]
+        digest = md5(f'{entry["etag"]}:{flags}'.encode()).hexdigest()
+        etag = f'W/"{digest}"'
+        response['ETag'] = etag
+        patch_vary_headers(response, ('Authorization',))
+
+        last_modified = None
+        if not request.user.is_authenticated:
+            # Флаги пользователя меняются без изменения рецептов,
+            # поэтому дата изменения отдаётся только анониму.
+            last_modified = entry['modified']
+            response['Last-Modified'] = http_date(last_modified)
+        return get_conditional_response(
+            request, etag=etag, last_modified=last_modified,
+            response=response)
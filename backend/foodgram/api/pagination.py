@@ -0,0 +1,94 @@
+import json
+from collections import OrderedDict
+
+from django.db import connections
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+
+
+def estimate_count(queryset):
+    """
+    Оценка числа строк по плану запроса PostgreSQL вместо COUNT(*).
+    На других СУБД оценки нет, возвращается None.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class SeekPagination(CursorPagination):
+    """
+    Курсорная пагинация: следующая страница выбирается условием по id,
+    без OFFSET и без COUNT(*). С ?count=estimate в ответ добавляется
+    оценка общего числа записей.
+    """
+
+    ordering = '-id'
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = None
+        if request.query_params.get(self.count_query_param) == 'estimate':
+            self.count = estimate_count(queryset)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        fields = [
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]
+        if self.count is not None:
+            fields.insert(0, ('count', self.count))
+        return Response(OrderedDict(fields))
+
+
+class OptionalCursorPagination(PageNumberPagination):
+    """
+    Постраничная пагинация с переключением на курсорную:
+    ?pagination=cursor для первой страницы, далее ссылки next/previous
+    содержат параметр cursor. Курсор идёт только по id, поэтому при
+    другом порядке (?ordering=, ?search= по релевантности) страницы
+    выбираются по номеру.
+    """
+
+    cursor_pagination_class = SeekPagination
+    cursor_ordering = '-id'
+    mode_query_param = 'pagination'
+    ordering_query_params = ('ordering', 'search')
+
+    def use_cursor(self, request):
+        if any(param in request.query_params
+               for param in self.ordering_query_params):
+            return False
+        return (
+            self.cursor_pagination_class.cursor_query_param
+            in request.query_params
+            or request.query_params.get(self.mode_query_param) == 'cursor'
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        if self.use_cursor(request):
+            self.cursor_paginator = self.cursor_pagination_class()
+            self.cursor_paginator.ordering = self.cursor_ordering
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class SubscriptionPagination(OptionalCursorPagination):
+    cursor_ordering = '-subscribing_id'
@@ -0,0 +1,129 @@
+import csv
+from abc import ABC, abstractmethod
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFError, TTFont
+from reportlab.pdfgen import canvas
+from recipes.utils import Echo
+from rest_framework.renderers import BaseRenderer
+
+
+class ShoppingListRenderer(ABC, BaseRenderer):
+    """
+    Базовый потоковый рендерер списка покупок.
+    Документ отдаётся частями через stream(), render() используется
+    только для ответов с ошибками.
+    """
+
+    charset = 'utf-8'
+    filename = 'shopping_list'
+
+    @property
+    def content_type(self):
+        if self.charset is None:
+            return self.media_type
+        return f'{self.media_type}; charset={self.charset}'
+
+    def get_filename(self):
+        return f'{self.filename}.{self.format}'
+
+    def format_item(self, item):
+        return (f'{item["name"]}({item["measurement_unit"]}) - '
+                f'{item["total_amount"]}')
+
+    @abstractmethod
+    def stream(self, items):
+        """Части документа в байтах по строкам списка items."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        response = (renderer_context or {}).get('response')
+        if response is not None:
+            response['Content-Type'] = 'text/plain; charset=utf-8'
+
+        if isinstance(data, dict):
+            data = '\n'.join(f'{key}: {value}' for key, value in data.items())
+        return str(data).encode('utf-8')
+
+
+class ShoppingListTextRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, items):
+        for item in items:
+            yield f'{self.format_item(item)}\n'.encode(self.charset)
+
+
+class ShoppingListCSVRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    header = ('Ингредиент', 'Единица измерения', 'Количество')
+
+    def stream(self, items):
+        writer = csv.writer(Echo())
+        # BOM нужен, чтобы Excel открывал файл в UTF-8.
+        yield '\ufeff'.encode(self.charset)
+        yield writer.writerow(self.header).encode(self.charset)
+        for item in items:
+            yield writer.writerow((
+                item['name'],
+                item['measurement_unit'],
+                item['total_amount']
+            )).encode(self.charset)
+
+
+class ShoppingListPDFRenderer(ShoppingListRenderer):
+    """
+    PDF собирается постранично во временный файл, который уходит на диск
+    после spool_size байт, и отдаётся клиенту частями по chunk_size.
+    """
+
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    font_name = 'ShoppingList'
+    fallback_font_name = 'Helvetica'
+    title = 'Список покупок'
+    spool_size = 1024 * 1024
+    chunk_size = 64 * 1024
+    font_size = 12
+    margin = 50
+
+    def get_font(self):
+        if self.font_name in pdfmetrics.getRegisteredFontNames():
+            return self.font_name
+        try:
+            pdfmetrics.registerFont(
+                TTFont(self.font_name, settings.SHOPPING_LIST_PDF_FONT))
+        except (OSError, TTFError):
+            return self.fallback_font_name
+        return self.font_name
+
+    def stream(self, items):
+        font = self.get_font()
+        line_height = self.font_size * 1.5
+        _, height = A4
+
+        with SpooledTemporaryFile(max_size=self.spool_size) as buffer:
+            pdf = canvas.Canvas(buffer, pagesize=A4)
+            pdf.setTitle(self.title)
+            pdf.setFont(font, self.font_size + 4)
+            top = height - self.margin
+            pdf.drawString(self.margin, top, self.title)
+            position = top - line_height * 2
+
+            pdf.setFont(font, self.font_size)
+            for item in items:
+                if position < self.margin:
+                    pdf.showPage()
+                    pdf.setFont(font, self.font_size)
+                    position = top
+                pdf.drawString(self.margin, position, self.format_item(item))
+                position -= line_height
+            pdf.save()
+
+            buffer.seek(0)
+            yield from iter(lambda: buffer.read(self.chunk_size), b'')
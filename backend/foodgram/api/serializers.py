@@ -1,36 +1,67 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Manager
 from django.forms.models import model_to_dict
-from django.shortcuts import get_object_or_404
-from drf_extra_fields.fields import Base64ImageField
+from recipes.catalog import get_catalog
+from recipes.images import variant_urls
 from recipes.models import (Favourite, Ingredient, IngredientAmount, Recipe,
-                            ShoppingCart, Subscription, Tag)
+                            ShoppingCart, ShoppingCartIngredient, Subscription,
+                            Tag)
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
-from rest_framework.views import exceptions
 from users.models import User
 
+from .fields import Base64ImageField
+from .metrics import TimedSerializerMixin
 
-class UserSerializer(serializers.ModelSerializer):
+
+class UserListSerializer(serializers.ListSerializer):
+    """
+    Список пользователей: подписки текущего пользователя на всю
+    страницу выбираются одним запросом, анонимному - без запросов.
+    """
+
+    def to_representation(self, data):
+        users = list(data.all() if isinstance(data, Manager) else data)
+        viewer = self.context.get('request').user
+        subscribed = set()
+        if viewer.is_authenticated and users:
+            subscribed = set(Subscription.objects.filter(
+                user=viewer, subscribing__in=users
+            ).values_list('subscribing_id', flat=True))
+        for user in users:
+            user.is_subscribed = user.pk in subscribed
+        return super().to_representation(users)
+
+
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Сериализатор для модели User."""
 
     is_subscribed = serializers.SerializerMethodField()
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+
         user = self.context.get('request').user
+        if not user.is_authenticated:
+            return False
         return Subscription.objects.filter(user=user, subscribing=obj).exists()
 
     class Meta:
         model = User
         fields = ('id', 'username', 'email', 'first_name',
                   'last_name', 'is_subscribed')
+        list_serializer_class = UserListSerializer
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Tag
         fields = ('id', 'name', 'color', 'slug')
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Ingredient
         fields = ('id', 'name', 'measurement_unit')
@@ -43,7 +74,7 @@ class IngredientSerializer(serializers.ModelSerializer):
         ]
 
 
-class RecipeSrializer(serializers.ModelSerializer):
+class RecipeSrializer(TimedSerializerMixin, serializers.ModelSerializer):
     author = serializers.SlugRelatedField(
         slug_field='username', read_only=True
     )
@@ -54,25 +85,32 @@ class RecipeSrializer(serializers.ModelSerializer):
     tags = serializers.SerializerMethodField()
     author = serializers.SerializerMethodField()
     ingredients = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
+
         user = self.context.get('request').user
         if user.id:
             return obj.recipe_is_favourite.filter(user=user).exists()
         return False
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
+
         user = self.context.get('request').user
         if user.id:
             return obj.recipe_shopping_cart.filter(user=user).exists()
         return False
 
-    def get_tags(self, instance):
-        tags_recipes = []
-        for tags in instance.tags.all():
-            tags_recipes.append(model_to_dict(tags))
+    def get_image_variants(self, instance):
+        return variant_urls(
+            instance, self.context['request'].build_absolute_uri)
 
-        return tags_recipes
+    def get_tags(self, instance):
+        return [model_to_dict(tag) for tag in instance.tags.all()]
 
     def get_author(self, instance):
         return model_to_dict(
@@ -87,26 +125,17 @@ class RecipeSrializer(serializers.ModelSerializer):
         )
 
     def get_ingredients(self, instance):
-        ingredients_recipes = []
-        for ingredients in IngredientAmount.objects.filter(recipe=instance):
-            ingredient = model_to_dict(
-                Ingredient.objects.get(
-                    id=model_to_dict(ingredients)['ingredient']
-                )
-            )
-            amount = model_to_dict(ingredients)['amount']
-
-            ingredients_recipes.append(
-                dict(
-                    list(
-                        ingredient.items()
-                    ) + list(
-                        {'amount': amount}.items()
-                    )
-                )
-            )
-
-        return ingredients_recipes
+        catalog = get_catalog(self.context.get('request'))
+        ingredients_recipe = []
+        for ingredient_amount in instance.ingredientamount_set.all():
+            ingredient = catalog.get_ingredient(
+                ingredient_amount.ingredient_id)
+            ingredients_recipe.append({
+                **(ingredient._asdict() if ingredient is not None
+                   else model_to_dict(ingredient_amount.ingredient)),
+                'amount': ingredient_amount.amount
+            })
+        return ingredients_recipe
 
     class Meta:
         model = Recipe
@@ -116,6 +145,7 @@ class RecipeSrializer(serializers.ModelSerializer):
             'author',
             'ingredients',
             'image',
+            'image_variants',
             'name',
             'text',
             'cooking_time',
@@ -123,63 +153,147 @@ class RecipeSrializer(serializers.ModelSerializer):
             'is_in_shopping_cart'
         )
 
-    def create(self, validated_data):
-        if 'ingredients' not in self.initial_data:
-            raise exceptions.ValidationError(
-                'Нельзя создать рецепт без ингридиентов')
-
-        ingredients = self.initial_data.pop('ingredients')
-
-        if len(ingredients) == 0:
-            raise exceptions.ValidationError(
+    def parse_ingredients(self, ingredients):
+        """
+        Проверяет список ингридиентов целиком и возвращает
+        {ingredient_id: amount}. Все ненайденные id попадают в одну ошибку.
+        """
+        if not ingredients or not isinstance(ingredients, list):
+            raise serializers.ValidationError(
                 'Нельзя создать рецепт без ингридиентов')
 
-        current_ingredient = []
+        catalog = get_catalog(self.context.get('request'))
+        amounts = {}
+        missing = []
         for ingredient in ingredients:
-            ingredient_id = ingredient['id']
-            ingredient_amount = ingredient['amount']
+            if not isinstance(ingredient, dict):
+                raise serializers.ValidationError(
+                    'Невалидный список ингридиентов')
 
+            ingredient_amount = ingredient.get('amount')
             if (not isinstance(ingredient_amount, int)
                     or ingredient_amount < 1):
-
-                raise exceptions.ValidationError(
+                raise serializers.ValidationError(
                     'Невалидный список ингридиентов')
 
-            current_ingredient.append([get_object_or_404(
-                Ingredient.objects,
-                pk=ingredient_id
-            ), ingredient_amount])
-
-        tags_recipe = []
+            current_ingredient = catalog.get_ingredient(ingredient.get('id'))
+            if current_ingredient is None:
+                missing.append(ingredient.get('id'))
+                continue
+            if current_ingredient.id in amounts:
+                raise serializers.ValidationError(
+                    'Ингридиенты не должны повторяться')
+            amounts[current_ingredient.id] = ingredient_amount
 
+        if missing:
+            raise serializers.ValidationError(
+                f'Ингридиенты не найдены: {", ".join(map(str, missing))}')
+        return amounts
+
+    def parse_tags(self, tags):
+        """Проверяет список тегов целиком и возвращает их id."""
+        if not isinstance(tags, list):
+            raise serializers.ValidationError('Невалидный список тегов')
+
+        catalog = get_catalog(self.context.get('request'))
+        tags_recipe = [catalog.get_tag(tag_id) for tag_id in tags]
+        missing = [
+            tag_id for tag_id, tag in zip(tags, tags_recipe) if tag is None
+        ]
+        if missing:
+            raise serializers.ValidationError(
+                f'Теги не найдены: {", ".join(map(str, missing))}')
+        return list({tag.id: tag for tag in tags_recipe})
+
+    def validate(self, attrs):
+        errors = {}
+        if self.instance is None or 'ingredients' in self.initial_data:
+            try:
+                attrs['ingredients'] = self.parse_ingredients(
+                    self.initial_data.get('ingredients'))
+            except serializers.ValidationError as error:
+                errors['ingredients'] = error.detail
         if 'tags' in self.initial_data:
-            tags = self.initial_data.pop('tags')
-
-            for tag_id in tags:
-                tags_recipe.append(get_object_or_404(
-                    Tag.objects,
-                    pk=tag_id
-                ))
+            try:
+                attrs['tags'] = self.parse_tags(self.initial_data['tags'])
+            except serializers.ValidationError as error:
+                errors['tags'] = error.detail
+        if errors:
+            raise serializers.ValidationError(errors)
+        return attrs
+
+    def set_ingredients(self, recipe, amounts):
+        """
+        Приводит ингридиенты рецепта к amounts, изменяя только отличающиеся
+        строки, и переносит разницу в списки покупок.
+        """
+        current = {}
+        old_totals = {}
+        stale = []
+        for row in IngredientAmount.objects.filter(recipe=recipe):
+            old_totals[row.ingredient_id] = (
+                old_totals.get(row.ingredient_id, 0) + row.amount)
+            if row.ingredient_id in current:
+                stale.append(row.id)
+            else:
+                current[row.ingredient_id] = row
 
-        recipe = Recipe.objects.create(
-            author=self.context['request'].user, **validated_data)
+        stale.extend(
+            row.id for ingredient_id, row in current.items()
+            if ingredient_id not in amounts
+        )
+        changed = []
+        for ingredient_id, amount in amounts.items():
+            row = current.get(ingredient_id)
+            if row is not None and row.amount != amount:
+                row.amount = amount
+                changed.append(row)
+
+        added = [
+            ingredient_id for ingredient_id in amounts
+            if ingredient_id not in current
+        ]
+        # Снимок справочника мог устареть: удалённый ингридиент дал бы
+        # ошибку внешнего ключа вместо ответа 400.
+        missing = set(added) - set(Ingredient.objects.filter(
+            pk__in=added).values_list('pk', flat=True))
+        if missing:
+            raise serializers.ValidationError({
+                'ingredients': [
+                    'Ингридиенты не найдены: '
+                    f'{", ".join(map(str, sorted(missing)))}'
+                ]
+            })
+
+        if stale:
+            IngredientAmount.objects.filter(id__in=stale).delete()
+        if changed:
+            IngredientAmount.objects.bulk_update(changed, ['amount'])
+        IngredientAmount.objects.bulk_create(
+            IngredientAmount(
+                recipe=recipe,
+                ingredient_id=ingredient_id,
+                amount=amounts[ingredient_id]
+            )
+            for ingredient_id in added
+        )
 
-        recipe.tags.set(tags_recipe)
+        ShoppingCartIngredient.objects.update_recipe(
+            recipe, old_totals, new_totals=amounts)
 
-        ingredients_recipe = []
-        for num_ingredient in range(len(current_ingredient)):
-            ingredients_recipe.append(
-                IngredientAmount(
-                    ingredient=current_ingredient[num_ingredient][0],
-                    recipe=recipe,
-                    amount=current_ingredient[num_ingredient][1],
-                )
-            )
+    @transaction.atomic
+    def create(self, validated_data):
+        ingredients = validated_data.pop('ingredients')
+        tags = validated_data.pop('tags', [])
 
-        IngredientAmount.objects.bulk_create(ingredients_recipe)
+        recipe = Recipe.objects.create(
+            author=self.context['request'].user, **validated_data)
+        recipe.tags.set(tags)
+        self.set_ingredients(recipe, ingredients)
 
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         instance.image = validated_data.get('image', instance.image)
         instance.name = validated_data.get('name', instance.name)
@@ -187,67 +301,18 @@ class RecipeSrializer(serializers.ModelSerializer):
         instance.cooking_time = validated_data.get(
             'cooking_time', instance.cooking_time)
 
-        if 'ingredients' in self.initial_data:
-            ingredients = self.initial_data.pop('ingredients')
-
-            if len(ingredients) == 0:
-                raise exceptions.ValidationError(
-                    'Нельзя создать рецепт без ингридиентов')
-
-            current_ingredient = []
-            for ingredient in ingredients:
-                ingredient_id = ingredient['id']
-                ingredient_amount = ingredient['amount']
-
-                if (not isinstance(ingredient_amount, int)
-                        or ingredient_amount < 1):
-
-                    raise exceptions.ValidationError(
-                        'Невалидный список ингридиентов')
-
-                current_ingredient.append([get_object_or_404(
-                    Ingredient.objects,
-                    pk=ingredient_id
-                ), ingredient_amount])
-
-            recipe = Recipe.objects.get(id=instance.id)
+        if 'ingredients' in validated_data:
+            self.set_ingredients(instance, validated_data['ingredients'])
 
-            IngredientAmount.objects.filter(recipe=instance).delete()
-
-            ingredients_recipe = []
-            for num_ingredient in range(len(current_ingredient)):
-                if not IngredientAmount.objects.filter(
-                        ingredient=current_ingredient[num_ingredient][0],
-                        recipe=recipe,
-                        amount=current_ingredient[num_ingredient][1]).exists():
-
-                    ingredients_recipe.append(
-                        IngredientAmount(
-                            ingredient=current_ingredient[num_ingredient][0],
-                            recipe=recipe,
-                            amount=current_ingredient[num_ingredient][1],
-                        )
-                    )
-
-            IngredientAmount.objects.bulk_create(ingredients_recipe)
-
-        if 'tags' in self.initial_data:
-            tags = self.initial_data.pop('tags')
-            tags_recipe = []
-            for tag in tags:
-                current_tag = get_object_or_404(
-                    Tag.objects,
-                    pk=tag
-                )
-                tags_recipe.append(current_tag)
-
-            instance.tags.set(tags_recipe)
+        if 'tags' in validated_data:
+            instance.tags.set(validated_data['tags'])
 
         instance.save()
         return instance
 
 
-class SubscriptionSerializer(serializers.ModelSerializer):
+class SubscriptionSerializer(TimedSerializerMixin,
+                             serializers.ModelSerializer):
     user = serializers.SlugRelatedField(
         slug_field='username',
         read_only=True,
@@ -272,50 +337,49 @@ class SubscriptionSerializer(serializers.ModelSerializer):
         ]
 
 
-class SubscriptionListSerializer(serializers.ModelSerializer):
+class RecipeShortSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Краткая карточка рецепта для ленты подписок."""
+
+    image = serializers.ImageField(read_only=True)
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
-        model = Subscription
-        fields = ('email', 'recipes_count')
+        model = Recipe
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
 
-    def to_representation(self, instance):
+    def get_image_variants(self, instance):
+        return variant_urls(
+            instance, self.context['request'].build_absolute_uri)
 
-        recipes = []
-        for recipe in instance.subscribing.recipes.all():
 
-            if model_to_dict(recipe)['image']:
-                image = self.context.get('request').build_absolute_uri(
-                    model_to_dict(recipe)['image'].url)
-            else:
-                image = None
+class SubscriptionListSerializer(TimedSerializerMixin,
+                                 serializers.ModelSerializer):
+    """
+    Автор из подписок пользователя. Ожидает queryset из
+    SubscriptionViewSet: с превью рецептов в recipes_preview.
+    """
 
-            recipe_author = {
-                'id': model_to_dict(recipe)['id'],
-                'name': model_to_dict(recipe)['name'],
-                'image': image,
-                'cooking_time': model_to_dict(recipe)['cooking_time']
-            }
+    email = serializers.ReadOnlyField(source='subscribing.email')
+    id = serializers.ReadOnlyField(source='subscribing.id')
+    username = serializers.ReadOnlyField(source='subscribing.username')
+    first_name = serializers.ReadOnlyField(source='subscribing.first_name')
+    last_name = serializers.ReadOnlyField(source='subscribing.last_name')
+    is_subscribed = serializers.SerializerMethodField()
+    recipes = RecipeShortSerializer(
+        source='subscribing.recipes_preview', many=True, read_only=True)
+    recipes_count = serializers.ReadOnlyField(
+        source='subscribing.recipes_count')
 
-            recipes.append(recipe_author)
+    class Meta:
+        model = Subscription
+        fields = ('email', 'id', 'username', 'first_name', 'last_name',
+                  'is_subscribed', 'recipes', 'recipes_count')
 
-        return {
-            'email': instance.subscribing.email,
-            'id': instance.subscribing.id,
-            'username': instance.subscribing.username,
-            'first_name': instance.subscribing.first_name,
-            'last_name': instance.subscribing.last_name,
-            'is_subscribed': Subscription.objects.filter(
-                user=self.context.get('request').user,
-                subscribing=instance.subscribing
-            ).exists(),
-            'recipes': recipes,
-            'recipes_count': Recipe.objects.filter(
-                author=instance.subscribing
-            ).count()
-        }
+    def get_is_subscribed(self, obj):
+        return obj.user_id == self.context.get('request').user.id
 
 
-class FavouriteSerializer(serializers.ModelSerializer):
+class FavouriteSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     user = serializers.SlugRelatedField(
         slug_field='username',
         read_only=True,
@@ -344,7 +408,8 @@ class FavouriteSerializer(serializers.ModelSerializer):
         }
 
 
-class ShoppingCartSerializer(serializers.ModelSerializer):
+class ShoppingCartSerializer(TimedSerializerMixin,
+                             serializers.ModelSerializer):
 
     user = serializers.SlugRelatedField(
         slug_field='username',
@@ -365,3 +430,31 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
             ).build_absolute_uri(instance.image.url),
             'cooking_time': instance.cooking_time
         }
+
+
+class RecipeBatchSerializer(serializers.Serializer):
+    """Пакет id рецептов для добавления в список и удаления из него."""
+
+    add = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        max_length=settings.MAX_BATCH_SIZE,
+        default=list
+    )
+    remove = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        max_length=settings.MAX_BATCH_SIZE,
+        default=list
+    )
+
+    def validate(self, attrs):
+        if not attrs['add'] and not attrs['remove']:
+            raise serializers.ValidationError(
+                'Нужен хотя бы один id в add или remove')
+        both = set(attrs['add']) & set(attrs['remove'])
+        if both:
+            raise serializers.ValidationError(
+                f'Рецепты одновременно в add и remove: '
+                f'{", ".join(map(str, sorted(both)))}')
+        attrs['add'] = list(dict.fromkeys(attrs['add']))
+        attrs['remove'] = list(dict.fromkeys(attrs['remove']))
+        return attrs
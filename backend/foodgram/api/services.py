@@ -0,0 +1,113 @@
+from contextlib import nullcontext
+
+from django.db import connections, router, transaction
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import exceptions
+
+
+def insert_ignore_many(model, rows, returning):
+    """
+    Вставляет строки rows (словари значений полей) одним запросом
+    INSERT ... ON CONFLICT DO NOTHING RETURNING и возвращает значения
+    поля returning только у действительно добавленных строк: строки,
+    которые уже были или которые параллельно вставил другой запрос,
+    в ответ не попадают.
+    """
+    if not rows:
+        return []
+    using = router.db_for_write(model)
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    fields = [
+        field for field in model._meta.concrete_fields
+        if not field.primary_key
+    ]
+    columns = ', '.join(quote(field.column) for field in fields)
+    values = []
+    params = []
+    for row in rows:
+        instance = model(**row)
+        values.append('({})'.format(', '.join(['%s'] * len(fields))))
+        params += [
+            field.get_db_prep_save(
+                field.pre_save(instance, add=True), connection=connection)
+            for field in fields
+        ]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {quote(model._meta.db_table)} ({columns}) '
+            f'VALUES {", ".join(values)} ON CONFLICT DO NOTHING '
+            f'RETURNING {quote(model._meta.get_field(returning).column)}',
+            params
+        )
+        return [value for value, in cursor.fetchall()]
+
+
+def insert_ignore(model, **values):
+    """
+    Вставляет строку одним запросом INSERT ... ON CONFLICT DO NOTHING.
+    Возвращает True, если строка добавлена, и False, если такая уже есть:
+    повторный запрос не превращается в IntegrityError.
+    """
+    return bool(insert_ignore_many(model, [values], model._meta.pk.name))
+
+
+def delete_returning(model, returning, **lookup):
+    """
+    Удаляет строки по lookup одним DELETE ... RETURNING и возвращает
+    значения поля returning удалённых строк. Строку, которую успел
+    удалить параллельный запрос, вернёт только он.
+    """
+    using = router.db_for_write(model)
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    pk = quote(model._meta.pk.column)
+    sql, params = model.objects.using(using).filter(
+        **lookup).order_by().values('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {quote(model._meta.db_table)} '
+            f'WHERE {pk} IN ({sql}) '
+            f'RETURNING {quote(model._meta.get_field(returning).column)}',
+            params
+        )
+        return [value for value, in cursor.fetchall()]
+
+
+def delete_existing(model, **lookup):
+    """Удаляет строку одним DELETE; True, если она была."""
+    deleted, _ = model.objects.filter(**lookup).delete()
+    return deleted > 0
+
+
+def atomic_if(condition):
+    """Транзакция нужна, только если за изменением следуют другие."""
+    return transaction.atomic() if condition else nullcontext()
+
+
+def toggle_relation(request, model, lookup, data=None, messages=None,
+                    on_add=None, on_remove=None):
+    """
+    Общая логика эндпоинтов добавления и удаления связи пользователя
+    с рецептом или автором: POST - 201 или 400, если связь уже есть,
+    DELETE - 204 или 400, если связи нет. Проверка и изменение
+    выполняются одним запросом, поэтому двойное нажатие безопасно.
+    """
+    if request.method == 'POST':
+        with atomic_if(on_add is not None):
+            if not insert_ignore(model, **lookup):
+                raise exceptions.ValidationError(messages['exists'])
+            if on_add is not None:
+                on_add()
+        return Response(data, status=status.HTTP_201_CREATED)
+
+    if request.method == 'DELETE':
+        with atomic_if(on_remove is not None):
+            if not delete_existing(model, **lookup):
+                raise exceptions.ValidationError(messages['missing'])
+            if on_remove is not None:
+                on_remove()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    return Response(status=status.HTTP_400_BAD_REQUEST)
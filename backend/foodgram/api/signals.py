@@ -0,0 +1,63 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from recipes.images import variants_ready
+from recipes.models import IngredientAmount, Recipe
+from users.models import User
+
+from .authentication import forget_token, forget_user
+from .cache import invalidate_recipes
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def reset_recipe_responses(sender, instance, **kwargs):
+    invalidate_recipes([instance.pk])
+
+
+@receiver(variants_ready, sender=Recipe)
+def reset_recipe_image_responses(sender, pk, **kwargs):
+    invalidate_recipes([pk])
+
+
+@receiver(post_save, sender=IngredientAmount)
+@receiver(post_delete, sender=IngredientAmount)
+def reset_ingredient_amount_responses(sender, instance, **kwargs):
+    invalidate_recipes([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def reset_recipe_tags_responses(sender, instance, action, reverse, pk_set,
+                                **kwargs):
+    """Состав тегов рецепта меняется без сохранения самого рецепта."""
+    if not reverse:
+        if action.startswith('post_'):
+            invalidate_recipes([instance.pk])
+    elif action == 'pre_clear':
+        invalidate_recipes(
+            instance.recipe_set.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove'):
+        invalidate_recipes(pk_set)
+
+
+@receiver(post_save, sender=User)
+def reset_author_responses(sender, instance, created, update_fields,
+                           **kwargs):
+    """Данные автора входят в карточку рецепта; вход в систему - нет."""
+    if created or update_fields == frozenset(('last_login',)):
+        return
+    invalidate_recipes(
+        Recipe.objects.filter(author=instance).values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    """Выход из системы удаляет токен: он больше не должен работать."""
+    forget_token(instance.key, instance.user_id)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_changed_user(sender, instance, **kwargs):
+    forget_user(instance.pk)
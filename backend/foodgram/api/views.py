@@ -1,8 +1,12 @@
-from django.forms.models import model_to_dict
-from django.http import HttpResponse
+from hashlib import md5
+
+from django.db import transaction
+from django.db.models import OuterRef, Prefetch, Subquery
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import status
 from rest_framework.decorators import action
 from rest_framework.filters import SearchFilter
 from rest_framework.permissions import (IsAuthenticated,
@@ -12,136 +16,217 @@ from rest_framework.views import exceptions
 from rest_framework.viewsets import ModelViewSet
 from users.models import User
 
+from .cache import get_versions
 from .filters import IngredientFilter, RecipeFilter
-from .mixins import RetrieveListViewSet
+from .mixins import (CatalogViewSetMixin, RecipeResponseCacheMixin,
+                     RetrieveListViewSet)
+from .pagination import OptionalCursorPagination, SubscriptionPagination
 from .permissions import IsAuthorOrAuthenticatedCreateOrReadOnly
+from .renderers import (ShoppingListCSVRenderer, ShoppingListPDFRenderer,
+                        ShoppingListTextRenderer)
 from .serializers import (FavouriteSerializer, IngredientSerializer,
-                          RecipeSrializer, ShoppingCartSerializer,
-                          SubscriptionListSerializer, SubscriptionSerializer,
-                          TagSerializer)
-from recipes.models import (Favourite, Ingredient, IngredientAmount, Recipe,
-                            ShoppingCart, Subscription, Tag)
-
-
-class RecipeViewSet(ModelViewSet):
+                          RecipeBatchSerializer, RecipeSrializer,
+                          ShoppingCartSerializer, SubscriptionListSerializer,
+                          SubscriptionSerializer, TagSerializer)
+from .services import delete_returning, insert_ignore_many, toggle_relation
+from recipes.catalog import get_catalog
+from recipes.counters import increment
+from recipes.models import (Favourite, Ingredient, Recipe, ShoppingCart,
+                            ShoppingCartIngredient, Subscription, Tag)
+
+
+def shopping_list_etag(request, *args, **kwargs):
+    """
+    Слабый ETag списка покупок из версий в кэше: итоги пользователя
+    меняют его версию, правки ингридиентов - версию справочника.
+    Повторное скачивание не требует ни сборки документа, ни запросов к БД.
+    """
+    versions = get_versions(
+        *ShoppingCartIngredient.objects.version_keys(request.user.id))
+    digest = md5(
+        f'{request.accepted_renderer.format}:'
+        f'{get_catalog(request).version}:'
+        f'{":".join(versions)}'.encode()
+    ).hexdigest()
+    return f'W/"{digest}"'
+
+
+class RecipeViewSet(RecipeResponseCacheMixin, ModelViewSet):
     """Вью для работы с рецептами."""
 
-    queryset = Recipe.objects.all()
     serializer_class = RecipeSrializer
     permission_classes = (IsAuthorOrAuthenticatedCreateOrReadOnly,)
+    pagination_class = OptionalCursorPagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
+    def get_queryset(self):
+        """
+        Страница рецептов собирается за фиксированное число запросов:
+        автор через JOIN, теги и количества ингридиентов через prefetch
+        (сами ингридиенты берутся из справочника в памяти),
+        флаги избранного и списка покупок через подзапросы EXISTS.
+        """
+        return Recipe.objects.select_related('author').prefetch_related(
+            'tags', 'ingredientamount_set'
+        ).with_user_flags(self.request.user)
+
     @action(detail=True, methods=['POST', 'DELETE'])
     def favorite(self, request, pk):
         recipe = get_object_or_404(Recipe, id=pk)
-
-        if request.method == 'POST':
-            if Favourite.objects.filter(
-                    user=request.user,
-                    recipe=recipe).exists():
-                raise exceptions.ValidationError('Рецепт уже в избранном')
-
-            serializer = FavouriteSerializer(
-                recipe,
-                context={'request': request}
-            )
-            Favourite.objects.filter(recipe=recipe).create(
-                user=request.user, recipe=recipe)
-
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-
-        if request.method == 'DELETE':
-            if not Favourite.objects.filter(
-                    user=request.user,
-                    recipe=recipe).exists():
-                raise exceptions.ValidationError('Рецепт не в избранном')
-
-            Favourite.objects.filter(user=request.user, recipe=recipe).delete()
-
-            return Response(status=status.HTTP_204_NO_CONTENT)
-
-        return Response(status=status.HTTP_400_BAD_REQUEST)
+        counter = Recipe.objects.filter(pk=recipe.pk)
+        return toggle_relation(
+            request,
+            Favourite,
+            {'user': request.user, 'recipe': recipe},
+            data=FavouriteSerializer(
+                recipe, context={'request': request}).data,
+            messages={
+                'exists': 'Рецепт уже в избранном',
+                'missing': 'Рецепт не в избранном',
+            },
+            on_add=lambda: increment(counter, 'favorites_count'),
+            on_remove=lambda: increment(counter, 'favorites_count', -1)
+        )
 
     @action(detail=True, methods=['POST', 'DELETE'])
     def shopping_cart(self, request, pk):
         user = request.user
         recipe = get_object_or_404(Recipe, id=pk)
+        return toggle_relation(
+            request,
+            ShoppingCart,
+            {'user': user, 'recipe': recipe},
+            data=ShoppingCartSerializer(
+                recipe, context={'request': request}).data,
+            messages={
+                'exists': 'Рецепт уже в списке покупок',
+                'missing': 'Рецепт не в списке покупок',
+            },
+            on_add=lambda: ShoppingCartIngredient.objects.add_recipe(
+                user, recipe),
+            on_remove=lambda: ShoppingCartIngredient.objects.remove_recipe(
+                user, recipe)
+        )
 
-        if request.method == 'POST':
-            if ShoppingCart.objects.filter(user=user, recipe=recipe).exists():
-                raise exceptions.ValidationError('Рецепт уже в списке покупок')
-
-            serializer = ShoppingCartSerializer(
-                recipe, context={'request': request})
-            ShoppingCart.objects.filter(recipe=recipe).create(
-                user=request.user, recipe=recipe)
-
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-
-        if request.method == 'DELETE':
-            if not ShoppingCart.objects.filter(
-                    user=user,
-                    recipe=recipe).exists():
-                raise exceptions.ValidationError('Рецепт не в списке покупок')
-
-            ShoppingCart.objects.filter(user=user, recipe=recipe).delete()
-
-            return Response(status=status.HTTP_204_NO_CONTENT)
+    def toggle_batch(self, request, model, on_change=None):
+        """
+        Пакетно добавляет рецепты в избранное или список покупок и убирает
+        из него в одной транзакции. Существующие рецепты читаются одним
+        запросом, вставка и удаление - по одному запросу с RETURNING:
+        в on_change попадают только строки, которые изменил этот запрос,
+        а не параллельный.
+        """
+        serializer = RecipeBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        add = serializer.validated_data['add']
+        remove = serializer.validated_data['remove']
+        user = request.user
 
-        return Response(status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic():
+            found = set(
+                Recipe.objects.filter(
+                    pk__in=add + remove).values_list('pk', flat=True)
+            )
+            added = set(insert_ignore_many(
+                model,
+                [{'user': user, 'recipe_id': pk} for pk in add if pk in found],
+                returning='recipe'
+            ))
+            removed = set(delete_returning(
+                model, 'recipe', user=user,
+                recipe_id__in=[pk for pk in remove if pk in found]
+            )) if remove else set()
+            if on_change is not None and (added or removed):
+                on_change(user, sorted(added), sorted(removed))
+
+        results = [
+            {
+                'id': pk,
+                'action': 'add',
+                'status': ('not_found' if pk not in found
+                           else 'added' if pk in added else 'exists')
+            }
+            for pk in add
+        ] + [
+            {
+                'id': pk,
+                'action': 'remove',
+                'status': ('not_found' if pk not in found
+                           else 'removed' if pk in removed else 'absent')
+            }
+            for pk in remove
+        ]
+        return Response({'results': results})
+
+    @action(
+        detail=False,
+        methods=['POST'],
+        url_path='favorite/batch',
+        permission_classes=(IsAuthenticated,)
+    )
+    def favorite_batch(self, request):
+        def count_favorites(user, added, removed):
+            increment(Recipe.objects.filter(pk__in=added), 'favorites_count')
+            increment(
+                Recipe.objects.filter(pk__in=removed), 'favorites_count', -1)
+
+        return self.toggle_batch(
+            request, Favourite, on_change=count_favorites)
+
+    @action(
+        detail=False,
+        methods=['POST'],
+        url_path='shopping_cart/batch',
+        permission_classes=(IsAuthenticated,)
+    )
+    def shopping_cart_batch(self, request):
+        return self.toggle_batch(
+            request, ShoppingCart,
+            on_change=ShoppingCartIngredient.objects.change_recipes
+        )
 
-    @action(detail=False, methods=['GET', ])
+    @action(
+        detail=False,
+        methods=['GET', ],
+        permission_classes=(IsAuthenticated,),
+        renderer_classes=(
+            ShoppingListTextRenderer,
+            ShoppingListCSVRenderer,
+            ShoppingListPDFRenderer
+        )
+    )
+    @method_decorator(condition(etag_func=shopping_list_etag))
     def download_shopping_cart(self, request):
-        user = request.user
-        shopping_carts = ShoppingCart.objects.filter(user=user)
-
-        ingredients_recipe = {}
-        for shopping_cart in shopping_carts:
-            recipe = shopping_cart.recipe
-
-            for ingredient_amount in IngredientAmount.objects.filter(
-                recipe=recipe
-            ):
-                amount = ingredient_amount.amount
-
-                measurement_unit = model_to_dict(
-                    Ingredient.objects.get(
-                        id=ingredient_amount.ingredient.id
-                    )
-                )['measurement_unit']
-                if (ingredient_amount.ingredient.name in
-                        ingredients_recipe.keys()):
-
-                    ingredients_recipe[
-                        ingredient_amount.ingredient.name
-                    ][1] += amount
-                else:
-                    ingredients_recipe[ingredient_amount.ingredient.name] = [
-                        measurement_unit, amount]
-
-        shopping_list = ''
-        for ingredient in ingredients_recipe.keys():
-            shopping_list += (f'{ingredient}'
-                              f'({ingredients_recipe[ingredient][0]}) - '
-                              f'{ingredients_recipe[ingredient][1]}\n')
-
-        return HttpResponse(
-            shopping_list,
-            content_type='text/plain; charset=utf8'
+        """
+        Список покупок в формате txt, csv или pdf (?format=).
+        Строки читаются из БД курсором и сразу уходят клиенту.
+        """
+        renderer = request.accepted_renderer
+        shopping_list = ShoppingCartIngredient.objects.shopping_list(
+            request.user)
+
+        response = StreamingHttpResponse(
+            renderer.stream(shopping_list.iterator()),
+            content_type=renderer.content_type
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="{renderer.get_filename()}"'
         )
+        return response
 
 
-class TagViewSet(RetrieveListViewSet):
+class TagViewSet(CatalogViewSetMixin, RetrieveListViewSet):
     """Вью для работы с тегами."""
 
     queryset = Tag.objects.all()
     permission_classes = (IsAuthenticatedOrReadOnly, )
     pagination_class = None
     serializer_class = TagSerializer
+    catalog_section = 'tags'
 
 
-class IngredientViewSet(RetrieveListViewSet):
+class IngredientViewSet(CatalogViewSetMixin, RetrieveListViewSet):
     """Вью для работы с ингридиентами."""
 
     queryset = Ingredient.objects.all()
@@ -150,6 +235,7 @@ class IngredientViewSet(RetrieveListViewSet):
     pagination_class = None
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
+    catalog_section = 'ingredients'
 
 
 class SubscriptionViewSet(ModelViewSet):
@@ -157,43 +243,69 @@ class SubscriptionViewSet(ModelViewSet):
 
     serializer_class = SubscriptionListSerializer
     permission_classes = (IsAuthenticated, )
+    pagination_class = SubscriptionPagination
     filter_backends = (SearchFilter,)
     search_fields = ('=subscribing__username',)
 
+    def get_recipes_limit(self):
+        recipes_limit = self.request.query_params.get('recipes_limit')
+        if recipes_limit is None:
+            return None
+        try:
+            recipes_limit = int(recipes_limit)
+        except ValueError:
+            recipes_limit = 0
+        if recipes_limit < 1:
+            raise exceptions.ValidationError(
+                {'recipes_limit': 'Ожидается целое положительное число.'})
+        return recipes_limit
+
     def get_queryset(self):
+        """
+        Лента подписок за фиксированное число запросов: число рецептов
+        берётся из счётчика автора, превью рецептов всех авторов страницы
+        загружается одним prefetch с ограничением recipes_limit на автора.
+        """
+        recipes = Recipe.objects.order_by('-id')
+        recipes_limit = self.get_recipes_limit()
+        if recipes_limit is not None:
+            recipes = recipes.filter(pk__in=Subquery(
+                Recipe.objects.filter(
+                    author=OuterRef('author')
+                ).order_by('-id').values('pk')[:recipes_limit]
+            ))
+
         return Subscription.objects.filter(
             user=self.request.user
+        ).select_related('subscribing').order_by(
+            '-subscribing'
+        ).prefetch_related(
+            Prefetch(
+                'subscribing__recipes',
+                queryset=recipes,
+                to_attr='recipes_preview'
+            )
         )
 
     def retrieve(self, request, pk):
         user = request.user
         subscribing = get_object_or_404(User, id=pk)
 
-        if request.method == 'POST':
-            if user == subscribing:
-                raise exceptions.ValidationError(
-                    'Нельзя подписаться на самого себя')
-
-            if Subscription.objects.filter(subscribing=subscribing).exists():
-                raise exceptions.ValidationError(
-                    'Вы уже подписаны на этого пользователя')
-
-            serializer = SubscriptionSerializer(
-                subscribing, context={'request': request})
-            Subscription.objects.filter(subscribing=subscribing).create(
-                user=request.user, subscribing=subscribing)
-
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-
-        if request.method == 'DELETE':
-            if not Subscription.objects.filter(
-                    subscribing=subscribing).exists():
-
-                raise exceptions.ValidationError(
-                    'Вы не подписаны на этого пользователя')
-
-            Subscription.objects.filter(subscribing=subscribing).delete()
-
-            return Response(status=status.HTTP_204_NO_CONTENT)
-
-        return Response(status=status.HTTP_400_BAD_REQUEST)
+        if request.method == 'POST' and user == subscribing:
+            raise exceptions.ValidationError(
+                'Нельзя подписаться на самого себя')
+
+        counter = User.objects.filter(pk=subscribing.pk)
+        return toggle_relation(
+            request,
+            Subscription,
+            {'user': user, 'subscribing': subscribing},
+            data=SubscriptionSerializer(
+                subscribing, context={'request': request}).data,
+            messages={
+                'exists': 'Вы уже подписаны на этого пользователя',
+                'missing': 'Вы не подписаны на этого пользователя',
+            },
+            on_add=lambda: increment(counter, 'subscribers_count'),
+            on_remove=lambda: increment(counter, 'subscribers_count', -1)
+        )
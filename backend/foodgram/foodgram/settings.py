@@ -40,6 +40,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -89,6 +90,16 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='foodgram'),
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -131,6 +142,7 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'backend_static')
 
 MEDIA_URL = '/backend_media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'backend_media')
+DEFAULT_FILE_STORAGE = 'recipes.storage.ContentAddressedStorage'
 
 REST_FRAMEWORK = {
 
@@ -139,7 +151,8 @@ REST_FRAMEWORK = {
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
+        'api.authentication.CachedJWTAuthentication',
     ),
 
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
@@ -158,6 +171,9 @@ DJOSER = {
     }
 }
 
+AUTH_CACHE_TIMEOUT = int(os.getenv('AUTH_CACHE_TIMEOUT', default=60))
+AUTH_CACHE_SIZE = int(os.getenv('AUTH_CACHE_SIZE', default=10000))
+
 # JWT settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1),
@@ -184,3 +200,41 @@ MAX_LENGTH_NAME_RECIPE = 16
 MIN_COOKING_TIME = 1
 
 MIN_AMOUNT = 1
+
+MAX_BATCH_SIZE = 100
+
+INGREDIENT_SEARCH_LIMIT = 20
+INGREDIENT_SEARCH_MAX_LIMIT = 100
+
+RECIPE_SEARCH_CONFIG = os.getenv('RECIPE_SEARCH_CONFIG', default='russian')
+
+# Справочник ингридиентов для load_ingredients; в контейнере каталог
+# data/ монтируется в /app/data (см. docker-compose).
+INGREDIENTS_PATH = os.getenv(
+    'INGREDIENTS_PATH',
+    default=os.path.join(BASE_DIR, '..', '..', 'data', 'ingredients.csv')
+)
+
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+RECIPE_RESPONSE_CACHE_TIMEOUT = int(os.getenv(
+    'RECIPE_RESPONSE_CACHE_TIMEOUT', default=600))
+
+IMAGE_VARIANT_WIDTHS = (320, 640, 1280)
+IMAGE_VARIANT_FORMATS = ('webp', 'jpeg')
+IMAGE_VARIANT_WORKERS = int(os.getenv('IMAGE_VARIANT_WORKERS', default=2))
+
+IMAGE_UPLOAD_MAX_BYTES = int(os.getenv(
+    'IMAGE_UPLOAD_MAX_BYTES', default=10 * 1024 * 1024))
+IMAGE_UPLOAD_MAX_PIXELS = int(os.getenv(
+    'IMAGE_UPLOAD_MAX_PIXELS', default=40_000_000))
+
+REQUEST_METRICS_SAMPLE_RATE = float(os.getenv(
+    'REQUEST_METRICS_SAMPLE_RATE', default=0.1))
+REQUEST_METRICS_REPEATED_QUERIES = int(os.getenv(
+    'REQUEST_METRICS_REPEATED_QUERIES', default=5))
+REQUEST_METRICS_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', default='')
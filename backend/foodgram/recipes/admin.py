@@ -1,14 +1,88 @@
 from django.contrib import admin
 from django.forms.models import BaseInlineFormSet
 
+from .counters import reconcile
 from .models import (Favourite, Ingredient, IngredientAmount, Recipe,
-                     ShoppingCart, Subscription, Tag)
+                     ShoppingCart, ShoppingCartIngredient, Subscription, Tag,
+                     User)
+from .search import search_recipes
 
 admin.site.register(Tag)
 admin.site.register(Ingredient)
-admin.site.register(Subscription)
-admin.site.register(Favourite)
-admin.site.register(ShoppingCart)
+
+
+class CounterSyncAdmin(admin.ModelAdmin):
+    """
+    Правки из админки пересчитывают счётчики затронутых строк:
+    counter_model и поле counter_field, по которому строки связаны.
+    """
+
+    counter_model = None
+    counter_field = None
+
+    def affected(self, obj, form=None):
+        pks = {getattr(obj, f'{self.counter_field}_id')}
+        if form is not None:
+            pks.add(form.initial.get(self.counter_field))
+        return pks - {None}
+
+    def save_model(self, request, obj, form, change):
+        pks = self.affected(obj, form)
+        super().save_model(request, obj, form, change)
+        reconcile(self.counter_model, pks)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        reconcile(self.counter_model, self.affected(obj))
+
+    def delete_queryset(self, request, queryset):
+        pks = set(queryset.values_list(self.counter_field, flat=True))
+        super().delete_queryset(request, queryset)
+        reconcile(self.counter_model, pks)
+
+
+@admin.register(Favourite)
+class FavouriteAdmin(CounterSyncAdmin):
+    counter_model = Recipe
+    counter_field = 'recipe'
+
+
+@admin.register(Subscription)
+class SubscriptionAdmin(CounterSyncAdmin):
+    counter_model = User
+    counter_field = 'subscribing'
+
+
+@admin.register(ShoppingCart)
+class ShoppingCartAdmin(admin.ModelAdmin):
+    """Правки корзин из админки пересобирают итоги их владельцев."""
+
+    def save_model(self, request, obj, form, change):
+        users = {obj.user_id, form.initial.get('user')} - {None}
+        super().save_model(request, obj, form, change)
+        ShoppingCartIngredient.objects.rebuild(users)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        ShoppingCartIngredient.objects.rebuild([obj.user_id])
+
+    def delete_queryset(self, request, queryset):
+        users = set(queryset.values_list('user_id', flat=True))
+        super().delete_queryset(request, queryset)
+        ShoppingCartIngredient.objects.rebuild(users)
+
+
+@admin.register(ShoppingCartIngredient)
+class ShoppingCartIngredientAdmin(admin.ModelAdmin):
+    list_display = ('user', 'ingredient', 'total_amount')
+    list_select_related = ('user', 'ingredient')
+    search_fields = ('user__username',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
 
 
 class RequiredInlineFormSet(BaseInlineFormSet):
@@ -27,7 +101,7 @@ class RecipeIngredient(admin.TabularInline):
 
 @admin.register(Recipe)
 class IngredientAdmin(admin.ModelAdmin):
-    list_display = ('name', 'author')
+    list_display = ('name', 'author', 'in_favorites')
     list_display_links = ('name',)
     list_filter = ('name', 'author__username', 'tags')
     search_fields = ('name',)
@@ -35,6 +109,26 @@ class IngredientAdmin(admin.ModelAdmin):
 
     readonly_fields = ('in_favorites',)
 
+    def save_model(self, request, obj, form, change):
+        authors = {obj.author_id, form.initial.get('author')} - {None}
+        super().save_model(request, obj, form, change)
+        if change:
+            reconcile(User, authors)
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        ShoppingCartIngredient.objects.rebuild(
+            ShoppingCart.objects.filter(recipe=form.instance).values_list(
+                'user_id', flat=True)
+        )
+
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск тем же полнотекстовым индексом, что и в API."""
+        if not search_term:
+            return queryset, False
+        return search_recipes(queryset, search_term), False
+
     def in_favorites(self, obj):
-        return Favourite.objects.filter(recipe=obj).count()
+        return obj.favorites_count
     in_favorites.short_description = 'В избранном у пользователей'
+    in_favorites.admin_order_field = 'favorites_count'
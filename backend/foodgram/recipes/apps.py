@@ -1,5 +1,12 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class RecipesConfig(AppConfig):
     name = 'recipes'
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401
+
+        post_migrate.connect(signals.create_search_indexes, sender=self)
+        post_migrate.connect(signals.backfill_shopping_lists, sender=self)
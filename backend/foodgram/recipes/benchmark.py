@@ -0,0 +1,20 @@
+from math import ceil
+from statistics import median
+from time import perf_counter
+
+
+def measure(query, repeat):
+    """Медианное время вызова query в миллисекундах за repeat повторов."""
+    timings = []
+    for _ in range(repeat):
+        started = perf_counter()
+        query()
+        timings.append((perf_counter() - started) * 1000)
+    return median(timings)
+
+
+def percentile(values, percent):
+    """Перцентиль по ближайшему рангу: percent=95 даёт p95."""
+    ordered = sorted(values)
+    rank = max(1, ceil(percent / 100 * len(ordered)))
+    return ordered[rank - 1]
@@ -0,0 +1,104 @@
+from typing import NamedTuple
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Ingredient, Tag
+from .search import IngredientPrefixIndex
+
+CATALOG_VERSION_KEY = 'recipes:catalog:version'
+
+
+class TagRow(NamedTuple):
+    id: int
+    name: str
+    color: str
+    slug: str
+
+
+class IngredientRow(NamedTuple):
+    id: int
+    name: str
+    measurement_unit: str
+
+
+class Catalog:
+    """
+    Снимок справочников тегов и ингридиентов в памяти процесса.
+    Строки неизменяемы, поэтому снимок безопасно делить между потоками.
+    """
+
+    def __init__(self, version, tags, ingredients):
+        self.version = version
+        self.tags = {tag.id: tag for tag in tags}
+        self.tags_by_slug = {tag.slug: tag for tag in tags}
+        self.ingredients = {
+            ingredient.id: ingredient for ingredient in ingredients
+        }
+        self.ingredient_index = IngredientPrefixIndex(
+            (ingredient.id, ingredient.name) for ingredient in ingredients
+        )
+
+    @classmethod
+    def load(cls, version):
+        return cls(
+            version,
+            tags=[
+                TagRow(*row) for row in Tag.objects.values_list(
+                    'id', 'name', 'color', 'slug')
+            ],
+            ingredients=[
+                IngredientRow(*row) for row in Ingredient.objects.values_list(
+                    'id', 'name', 'measurement_unit')
+            ]
+        )
+
+    def get(self, section, pk):
+        """Строка справочника section ('tags' или 'ingredients') по id."""
+        try:
+            return getattr(self, section).get(int(pk))
+        except (TypeError, ValueError):
+            return None
+
+    def get_tag(self, pk):
+        return self.get('tags', pk)
+
+    def get_ingredient(self, pk):
+        return self.get('ingredients', pk)
+
+
+_snapshot = {}
+
+
+def get_catalog(request=None):
+    """
+    Актуальный снимок справочников. Версия хранится в кэше Django,
+    поэтому при общем кэше (memcached) изменение в одном процессе
+    сбрасывает снимки во всех; кэш в памяти процесса - recipes.W001.
+    С request снимок запоминается на запросе: версия читается из кэша
+    один раз за запрос, а не для каждого рецепта в выдаче.
+    """
+    if request is not None:
+        # У запроса DRF атрибуты читаются из исходного HttpRequest.
+        request = getattr(request, '_request', request)
+        if getattr(request, '_catalog', None) is None:
+            request._catalog = get_catalog()
+        return request._catalog
+
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, uuid4().hex, timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+
+    catalog = _snapshot.get('catalog')
+    if catalog is None or catalog.version != version:
+        catalog = Catalog.load(version)
+        _snapshot['catalog'] = catalog
+    return catalog
+
+
+def invalidate_catalog():
+    transaction.on_commit(
+        lambda: cache.set(CATALOG_VERSION_KEY, uuid4().hex, timeout=None)
+    )
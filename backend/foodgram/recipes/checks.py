@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core import checks
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@checks.register(checks.Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Версии справочника, кэша ответов и списков покупок живут в кэше
+    Django. Кэш в памяти процесса не виден другим воркерам и командам
+    manage.py, и их изменения не доходят до работающего сервера.
+    """
+    backend = settings.CACHES['default']['BACKEND']
+    if settings.DEBUG or backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [
+        checks.Warning(
+            f'Кэш {backend} не общий для процессов: изменения справочников '
+            f'и рецептов из других воркеров и команд manage.py не сбросят '
+            f'снимки и кэш ответов работающего сервера.',
+            hint=('Задайте CACHE_BACKEND и CACHE_LOCATION общего кэша, '
+                  'например memcached из docker-compose.'),
+            id='recipes.W001',
+        )
+    ]
@@ -0,0 +1,63 @@
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Favourite, Recipe, Subscription, User
+
+
+def increment(queryset, field, delta=1):
+    """Атомарно прибавляет delta к счётчику field у строк queryset."""
+    if delta:
+        queryset.update(**{field: F(field) + delta})
+
+
+def count_of(queryset, field):
+    """Число строк queryset, ссылающихся полем field на внешнюю строку."""
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef('pk')}).order_by().values(
+                field
+            ).annotate(total=Count('pk')).values('total'),
+            output_field=IntegerField()
+        ),
+        0
+    )
+
+
+COUNTERS = (
+    (Recipe, 'favorites_count', lambda: count_of(
+        Favourite.objects.all(), 'recipe')),
+    (User, 'recipes_count', lambda: count_of(
+        Recipe.objects.all(), 'author')),
+    (User, 'subscribers_count', lambda: count_of(
+        Subscription.objects.all(), 'subscribing')),
+)
+
+
+def find_drift(model, field, expression, pks=None):
+    """Строки, где счётчик разошёлся с данными: (pk, сохранено, ожидается)."""
+    queryset = model.objects.all()
+    if pks is not None:
+        queryset = queryset.filter(pk__in=pks)
+    return queryset.annotate(
+        expected=expression()
+    ).exclude(
+        **{field: F('expected')}
+    ).order_by('pk').values_list('pk', field, 'expected')
+
+
+def reconcile(model=None, pks=None):
+    """
+    Пересчитывает разошедшиеся счётчики; model и pks сужают проверку.
+    Возвращает число исправленных значений.
+    """
+    fixed = 0
+    for counter_model, field, expression in COUNTERS:
+        if model is not None and counter_model is not model:
+            continue
+        drifted = [pk for pk, _, _ in find_drift(
+            counter_model, field, expression, pks)]
+        if drifted:
+            counter_model.objects.filter(pk__in=drifted).update(
+                **{field: expression()})
+            fixed += len(drifted)
+    return fixed
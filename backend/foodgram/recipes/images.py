@@ -0,0 +1,149 @@
+import logging
+import os
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.dispatch import Signal
+from PIL import Image
+
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+VARIANTS_DIR = 'recipes/variants'
+PILLOW_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+variants_ready = Signal()
+
+_pool = {}
+
+
+def get_executor():
+    """Общий пул потоков процесса; создаётся при первой загрузке."""
+    executor = _pool.get('executor')
+    if executor is None:
+        executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_VARIANT_WORKERS,
+            thread_name_prefix='image-variants'
+        )
+        _pool['executor'] = executor
+    return executor
+
+
+def variant_name(name, width, file_format):
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return f'{VARIANTS_DIR}/{stem}_{width}.{file_format}'
+
+
+def render_variants(name):
+    """
+    Уменьшенные копии изображения name для каждой ширины из
+    IMAGE_VARIANT_WIDTHS, не больше исходной, во всех форматах
+    IMAGE_VARIANT_FORMATS: {'source': name, format: {width: имя файла}}.
+    """
+    with default_storage.open(name, 'rb') as file:
+        original = Image.open(file)
+        original.load()
+    if original.mode not in ('RGB', 'RGBA'):
+        original = original.convert('RGBA')
+
+    variants = {'source': name}
+    widths = [
+        width for width in settings.IMAGE_VARIANT_WIDTHS
+        if width < original.width
+    ] or [original.width]
+    for width in widths:
+        height = max(1, round(original.height * width / original.width))
+        resized = original.resize((width, height), Image.LANCZOS)
+        for file_format in settings.IMAGE_VARIANT_FORMATS:
+            pillow_format, params = PILLOW_FORMATS[file_format]
+            image = resized
+            if pillow_format == 'JPEG' and image.mode != 'RGB':
+                image = image.convert('RGB')
+            buffer = BytesIO()
+            image.save(buffer, pillow_format, **params)
+
+            variants.setdefault(file_format, {})[str(width)] = (
+                default_storage.save(
+                    variant_name(name, width, file_format),
+                    ContentFile(buffer.getvalue())
+                ))
+    return variants
+
+
+def build_variants(pk, name, reuse=True):
+    """
+    Строит копии и сохраняет их в рецепт, если изображение
+    за это время не заменили. Для изображения, которое уже есть
+    у другого рецепта, берёт готовые копии, если не задано reuse=False.
+    """
+    try:
+        variants = None
+        if reuse:
+            variants = Recipe.objects.filter(
+                image=name, image_variants__source=name
+            ).values_list('image_variants', flat=True).first()
+        if variants is None:
+            variants = render_variants(name)
+        updated = Recipe.objects.filter(pk=pk, image=name).update(
+            image_variants=variants)
+        if updated:
+            variants_ready.send(sender=Recipe, pk=pk, variants=variants)
+        return variants
+    except Exception:
+        logger.exception('Не удалось построить копии изображения %s', name)
+        return None
+    finally:
+        connections.close_all()
+
+
+def schedule_variants(recipe):
+    """После коммита отправляет построение копий в фоновый пул."""
+    if not recipe.image:
+        return
+    pk, name = recipe.pk, recipe.image.name
+    transaction.on_commit(
+        lambda: get_executor().submit(build_variants, pk, name))
+
+
+def image_references():
+    """
+    Счётчик ссылок на файлы: {имя: число рецептов}. Учитываются
+    исходные изображения и построенные для них копии.
+    """
+    references = Counter()
+    for image, variants in Recipe.objects.values_list(
+            'image', 'image_variants').iterator():
+        if image:
+            references[image] += 1
+        for file_format in settings.IMAGE_VARIANT_FORMATS:
+            references.update(
+                (variants or {}).get(file_format, {}).values())
+    return references
+
+
+def variant_urls(recipe, build_url=None):
+    """
+    Ссылки на готовые копии: {format: {width: url}}. Пустой словарь,
+    пока копии для текущего изображения не построены.
+    """
+    variants = recipe.image_variants or {}
+    if not recipe.image or variants.get('source') != recipe.image.name:
+        return {}
+    build_url = build_url or (lambda url: url)
+    return {
+        file_format: {
+            width: build_url(default_storage.url(name))
+            for width, name in variants[file_format].items()
+        }
+        for file_format in settings.IMAGE_VARIANT_FORMATS
+        if file_format in variants
+    }
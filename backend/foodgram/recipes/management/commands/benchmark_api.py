@@ -0,0 +1,228 @@
+import json
+import tracemalloc
+from time import perf_counter
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from recipes.benchmark import percentile
+from recipes.catalog import get_catalog
+from recipes.models import Ingredient, Recipe
+from users.models import User
+
+PERCENTILES = (50, 95, 99)
+
+
+def scenarios(recipe, tags, search, query):
+    """Основные эндпоинты: (название, путь)."""
+    tag_filter = '&'.join(f'tags={slug}' for slug in tags)
+    return (
+        ('recipes', '/api/recipes/'),
+        ('recipes?page=5', '/api/recipes/?page=5'),
+        ('recipe', f'/api/recipes/{recipe}/'),
+        ('recipes?tags', f'/api/recipes/?{tag_filter}'),
+        ('recipes?is_favorited', '/api/recipes/?is_favorited=1'),
+        ('recipes?search', f'/api/recipes/?search={query}'),
+        ('subscriptions', '/api/users/subscriptions/?recipes_limit=3'),
+        ('download_shopping_cart', '/api/recipes/download_shopping_cart/'),
+        ('ingredients?name', f'/api/ingredients/?name={search}'),
+    )
+
+
+class Command(BaseCommand):
+    help = ('Прогоняет основные эндпоинты API через тестовый клиент '
+            'Django в этом процессе и выводит p50/p95/p99, число '
+            'запросов к БД и пик памяти на запрос. Результат можно '
+            'сохранить как базовый и сравнивать с ним следующие прогоны.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=50,
+            help='Сколько запросов сделать к каждому эндпоинту.'
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=3,
+            help='Сколько запросов сделать до замеров.'
+        )
+        parser.add_argument(
+            '--user',
+            help=('Email пользователя, от имени которого идут запросы; '
+                  'по умолчанию - с наибольшим числом подписок.')
+        )
+        parser.add_argument(
+            '--only',
+            nargs='+',
+            help='Прогнать только эндпоинты с этими названиями.'
+        )
+        parser.add_argument(
+            '--cold',
+            action='store_true',
+            help='Очищать кэш перед каждым запросом.'
+        )
+        parser.add_argument(
+            '--save',
+            metavar='PATH',
+            help='Сохранить результат в JSON как базовый.'
+        )
+        parser.add_argument(
+            '--compare',
+            metavar='PATH',
+            help='Сравнить с сохранённым базовым результатом.'
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=20,
+            help='Допустимый рост p95 при сравнении, в процентах.'
+        )
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['warmup'] < 0:
+            raise CommandError('Число запросов должно быть положительным.')
+
+        user = self.get_user(options['user'])
+        recipe = Recipe.objects.order_by('-favorites_count', '-id').first()
+        ingredient = Ingredient.objects.order_by('name').first()
+        if recipe is None or ingredient is None:
+            raise CommandError(
+                'В базе нет рецептов; заполните её командой '
+                'generate_fake_data.')
+        token, _ = Token.objects.get_or_create(user=user)
+        client = Client(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+        selected = [
+            (name, path) for name, path in scenarios(
+                recipe.pk,
+                list(get_catalog().tags_by_slug)[:2],
+                ingredient.name[:2],
+                recipe.name
+            )
+            if not options['only'] or name in options['only']
+        ]
+        if not selected:
+            raise CommandError('Ни один эндпоинт не выбран.')
+
+        results = {}
+        for name, path in selected:
+            results[name] = self.run(client, path, options)
+            self.report(name, results[name])
+
+        baseline = {
+            'created': timezone.now().isoformat(),
+            'vendor': connection.vendor,
+            'recipes': Recipe.objects.count(),
+            'users': User.objects.count(),
+            'requests': options['requests'],
+            'cold': options['cold'],
+            'results': results,
+        }
+        if options['save']:
+            with open(options['save'], 'w', encoding='utf-8') as file:
+                json.dump(baseline, file, ensure_ascii=False, indent=2)
+            self.stdout.write(f'Результат сохранён в {options["save"]}.')
+        if options['compare']:
+            self.compare(options['compare'], results, options['threshold'])
+
+    def get_user(self, email):
+        users = User.objects.all()
+        if email:
+            users = users.filter(email=email)
+        user = users.annotate(
+            subscriptions=Count('subscriber')
+        ).order_by('-subscriptions', 'pk').first()
+        if user is None:
+            raise CommandError('Пользователь не найден.')
+        return user
+
+    def request(self, client, path, cold):
+        if cold:
+            cache.clear()
+        response = client.get(path)
+        if response.status_code != 200:
+            raise CommandError(
+                f'{path}: ответ {response.status_code}.')
+        if response.streaming:
+            # Потоковый ответ собирается только при чтении: без этого
+            # замер не включил бы ни запросы, ни рендеринг документа.
+            for _ in response.streaming_content:
+                pass
+        return response
+
+    def run(self, client, path, options):
+        """Замеры одного эндпоинта: время, запросы к БД и память."""
+        for _ in range(options['warmup']):
+            self.request(client, path, options['cold'])
+
+        timings = []
+        queries = []
+        for _ in range(options['requests']):
+            with CaptureQueriesContext(connection) as context:
+                started = perf_counter()
+                self.request(client, path, options['cold'])
+                timings.append((perf_counter() - started) * 1000)
+            queries.append(len(context.captured_queries))
+
+        # tracemalloc замедляет выполнение, поэтому память меряется
+        # отдельным проходом и не влияет на время.
+        peaks = []
+        for _ in range(min(options['requests'], 10)):
+            tracemalloc.start()
+            try:
+                self.request(client, path, options['cold'])
+                peaks.append(tracemalloc.get_traced_memory()[1])
+            finally:
+                tracemalloc.stop()
+
+        result = {
+            f'p{value}': round(percentile(timings, value), 3)
+            for value in PERCENTILES
+        }
+        result['queries'] = max(queries)
+        result['memory_kb'] = round(percentile(peaks, 50) / 1024, 1)
+        return result
+
+    def report(self, name, result):
+        self.stdout.write(
+            f'{name:<24} '
+            + ' '.join(
+                f'p{value} {result[f"p{value}"]:8.2f} мс'
+                for value in PERCENTILES
+            )
+            + f'  запросов {result["queries"]:3}'
+            f'  память {result["memory_kb"]:8.1f} КБ'
+        )
+
+    def compare(self, path, results, threshold):
+        try:
+            with open(path, encoding='utf-8') as file:
+                baseline = json.load(file)['results']
+        except (OSError, ValueError, KeyError) as error:
+            raise CommandError(f'Не удалось прочитать {path}: {error}')
+
+        regressions = []
+        for name, result in results.items():
+            base = baseline.get(name)
+            if base is None:
+                continue
+            change = (result['p95'] / base['p95'] - 1) * 100
+            self.stdout.write(
+                f'{name:<24} p95 {base["p95"]:8.2f} -> '
+                f'{result["p95"]:8.2f} мс ({change:+.0f}%), запросов '
+                f'{base["queries"]} -> {result["queries"]}'
+            )
+            if change > threshold or result['queries'] > base['queries']:
+                regressions.append(name)
+        if regressions:
+            raise CommandError(
+                f'Хуже базового результата: {", ".join(regressions)}.')
+        self.stdout.write(self.style.SUCCESS('Регрессий нет.'))
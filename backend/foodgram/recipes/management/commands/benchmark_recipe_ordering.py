@@ -0,0 +1,70 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from recipes.benchmark import measure
+from recipes.models import Recipe
+
+
+def aggregated_popular():
+    """Популярность на лету: JOIN с избранным и корзинами и GROUP BY."""
+    return Recipe.objects.annotate(
+        score=(Count('recipe_is_favourite', distinct=True)
+               + Count('recipe_shopping_cart', distinct=True))
+    ).order_by('-score', '-id')
+
+
+def aggregated_trending(days):
+    """Упрощённый trending на лету: события окна без затухания."""
+    since = timezone.now() - timedelta(days=days)
+    return Recipe.objects.annotate(
+        score=(
+            Count('recipe_is_favourite', distinct=True,
+                  filter=Q(recipe_is_favourite__created__gte=since))
+            + Count('recipe_shopping_cart', distinct=True,
+                    filter=Q(recipe_shopping_cart__created__gte=since))
+        )
+    ).order_by('-score', '-id')
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает выдачу первой страницы в порядке popular и '
+            'trending по заранее посчитанному рейтингу и по агрегату '
+            'на лету.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Сколько раз повторить каждый замер.'
+        )
+        parser.add_argument(
+            '--window-days',
+            type=int,
+            default=7,
+            help='Окно trending для агрегата на лету.'
+        )
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat должен быть положительным.')
+
+        page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+        variants = (
+            ('popular, рейтинг',
+             Recipe.objects.order_by('-popular_score', '-id')),
+            ('popular, на лету', aggregated_popular()),
+            ('trending, рейтинг',
+             Recipe.objects.order_by('-trending_score', '-id')),
+            ('trending, на лету',
+             aggregated_trending(options['window_days'])),
+        )
+        self.stdout.write(f'Рецептов: {Recipe.objects.count()}')
+        for title, queryset in variants:
+            page = measure(
+                lambda: list(queryset[:page_size]), options['repeat'])
+            self.stdout.write(f'{title:<18} страница {page:8.2f} мс')
@@ -0,0 +1,73 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+
+from recipes.benchmark import measure
+from recipes.models import IngredientAmount, Recipe
+from recipes.search import (WORD, match_substrings, search_recipes,
+                            search_supported)
+
+
+def default_queries():
+    """Название рецепта и самый частый ингридиент из текущей БД."""
+    recipe = Recipe.objects.order_by('-id').values_list(
+        'name', flat=True).first()
+    ingredient = IngredientAmount.objects.values(
+        'ingredient__name'
+    ).annotate(uses=Count('id')).order_by('-uses').values_list(
+        'ingredient__name', flat=True).first()
+    return [query for query in (recipe, ingredient) if query]
+
+
+class Command(BaseCommand):
+    help = ('Замеряет поиск рецептов на текущей БД: первая страница и '
+            'подсчёт по полнотекстовому индексу и через icontains. Для '
+            'замеров на 100 тысячах рецептов заполните базу командой '
+            'generate_fake_data --recipes 100000.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--query',
+            nargs='+',
+            dest='queries',
+            help=('Поисковые запросы; по умолчанию название рецепта '
+                  'и частый ингридиент.')
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Сколько раз повторить каждый замер.'
+        )
+
+    def handle(self, *args, **options):
+        if not search_supported():
+            raise CommandError(
+                f'Полнотекстовый индекс для {connection.vendor} не ведётся.')
+        if options['repeat'] < 1:
+            raise CommandError('--repeat должен быть положительным.')
+        queries = options['queries'] or default_queries()
+        if not queries:
+            raise CommandError('В базе нет рецептов.')
+
+        page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+        self.stdout.write(f'Рецептов: {Recipe.objects.count()}')
+        for query in queries:
+            words = WORD.findall(query)
+            variants = (
+                ('индекс', search_recipes(
+                    Recipe.objects.all(), query
+                ).order_by('-search_rank', '-id')),
+                ('icontains', Recipe.objects.filter(
+                    pk__in=match_substrings(Recipe, words))),
+            )
+            self.stdout.write(f'Запрос "{query}":')
+            for title, queryset in variants:
+                page = measure(
+                    lambda: list(queryset[:page_size]), options['repeat'])
+                count = measure(queryset.count, options['repeat'])
+                self.stdout.write(
+                    f'  {title:<10} страница {page:8.2f} мс, '
+                    f'count {count:8.2f} мс, найдено {queryset.count()}'
+                )
@@ -0,0 +1,67 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.http import QueryDict
+
+from api.filters import TAGS_MATCH_ALL, TAGS_MATCH_ANY, RecipeFilter
+from recipes.benchmark import measure
+from recipes.catalog import get_catalog
+from recipes.models import Recipe
+
+
+def join_filter(slugs):
+    """Прежний вариант фильтра: JOIN по тегам и DISTINCT."""
+    return Recipe.objects.filter(tags__slug__in=slugs).distinct()
+
+
+def subquery_filter(slugs, match):
+    data = QueryDict(mutable=True)
+    data.setlist('tags', slugs)
+    data['tags_match'] = match
+    filterset = RecipeFilter(data=data, queryset=Recipe.objects.all())
+    if not filterset.is_valid():
+        raise CommandError(filterset.errors)
+    return filterset.qs
+
+
+class Command(BaseCommand):
+    help = ('Замеряет время фильтра рецептов по тегам на текущей БД: '
+            'первая страница и подсчёт для JOIN + DISTINCT и подзапросов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tags',
+            nargs='+',
+            help='Слаги тегов; по умолчанию первые два из справочника.'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Сколько раз повторить каждый замер.'
+        )
+
+    def handle(self, *args, **options):
+        slugs = options['tags'] or list(get_catalog().tags_by_slug)[:2]
+        if not slugs:
+            raise CommandError('В базе нет тегов.')
+        if options['repeat'] < 1:
+            raise CommandError('--repeat должен быть положительным.')
+
+        variants = (
+            ('join + distinct', lambda: join_filter(slugs)),
+            ('exists, any', lambda: subquery_filter(slugs, TAGS_MATCH_ANY)),
+            ('in, all', lambda: subquery_filter(slugs, TAGS_MATCH_ALL)),
+        )
+        page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+        self.stdout.write(
+            f'Рецептов: {Recipe.objects.count()}, теги: {", ".join(slugs)}')
+
+        for title, build in variants:
+            queryset = build()
+            page = measure(
+                lambda: list(queryset[:page_size]), options['repeat'])
+            count = measure(queryset.count, options['repeat'])
+            self.stdout.write(
+                f'{title:<16} страница {page:8.2f} мс, '
+                f'count {count:8.2f} мс, найдено {queryset.count()}'
+            )
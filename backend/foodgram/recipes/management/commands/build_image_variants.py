@@ -0,0 +1,50 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recipes.images import build_variants
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Строит уменьшенные копии изображений рецептов, у которых '
+            'их ещё нет или они построены для прежнего изображения.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Перестроить копии у всех рецептов.'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.IMAGE_VARIANT_WORKERS,
+            help='Число потоков обработки.'
+        )
+
+    def handle(self, *args, **options):
+        pending = [
+            (pk, image, not options['all'])
+            for pk, image, variants in Recipe.objects.exclude(
+                image=''
+            ).exclude(image=None).values_list(
+                'pk', 'image', 'image_variants'
+            ).iterator()
+            if options['all'] or (variants or {}).get('source') != image
+        ]
+
+        if options['workers'] > 1:
+            with ThreadPoolExecutor(
+                    max_workers=options['workers']) as executor:
+                results = list(executor.map(
+                    lambda job: build_variants(*job), pending))
+        else:
+            results = [build_variants(*job) for job in pending]
+
+        failed = results.count(None)
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано изображений: {len(pending) - failed}, '
+            f'с ошибкой: {failed}.'
+        ))
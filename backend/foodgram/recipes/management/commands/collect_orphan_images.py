@@ -0,0 +1,71 @@
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from recipes.images import image_references
+
+IMAGES_DIR = 'recipes'
+
+
+def stored_files(directory):
+    """Все файлы каталога хранилища, включая вложенные."""
+    directories, files = default_storage.listdir(directory)
+    for name in files:
+        yield f'{directory}/{name}'
+    for name in directories:
+        yield from stored_files(f'{directory}/{name}')
+
+
+class Command(BaseCommand):
+    help = ('Удаляет изображения рецептов и их копии, на которые '
+            'не ссылается ни один рецепт.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только найти файлы без ссылок, ничего не удаляя.'
+        )
+        parser.add_argument(
+            '--min-age-hours',
+            type=float,
+            default=24,
+            help=('Не трогать файлы моложе этого возраста: их могли '
+                  'только что загрузить для ещё не сохранённого рецепта.')
+        )
+
+    def handle(self, *args, **options):
+        if options['min_age_hours'] < 0:
+            raise CommandError('--min-age-hours не может быть отрицательным.')
+        if not default_storage.exists(IMAGES_DIR):
+            self.stdout.write(self.style.SUCCESS('Изображений нет.'))
+            return
+
+        started = timezone.now()
+        threshold = started - timedelta(hours=options['min_age_hours'])
+        references = image_references()
+        orphans = [
+            name for name in stored_files(IMAGES_DIR)
+            if not references[name]
+            and default_storage.get_modified_time(name) < threshold
+        ]
+
+        if options['check']:
+            for name in orphans:
+                self.stdout.write(name)
+            if orphans:
+                raise CommandError(
+                    f'Файлов без ссылок: {len(orphans)}. '
+                    f'Запустите команду без --check, чтобы удалить их.'
+                )
+            self.stdout.write(self.style.SUCCESS('Файлов без ссылок нет.'))
+            return
+
+        for name in orphans:
+            default_storage.delete(name)
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено файлов: {len(orphans)}, '
+            f'используется файлов: {len(references)}.'
+        ))
@@ -0,0 +1,254 @@
+import random
+from datetime import timedelta
+from itertools import islice
+from time import perf_counter
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from api.cache import invalidate_recipes
+from recipes.catalog import invalidate_catalog
+from recipes.counters import reconcile
+from recipes.models import (Favourite, Ingredient, IngredientAmount, Recipe,
+                            ShoppingCart, ShoppingCartIngredient, Subscription,
+                            Tag)
+from recipes.search import update_search_index
+from users.models import User
+
+TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+)
+DISHES = (
+    'Борщ', 'Щи', 'Солянка', 'Окрошка', 'Плов', 'Пельмени', 'Блины',
+    'Сырники', 'Омлет', 'Запеканка', 'Рагу', 'Гуляш', 'Котлеты',
+    'Оладьи', 'Винегрет', 'Шарлотка', 'Вареники', 'Голубцы',
+)
+EVENTS_WINDOW = timedelta(days=14)
+
+
+def last_pk(model):
+    return model.objects.order_by('-pk').values_list(
+        'pk', flat=True).first() or 0
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическими пользователями, рецептами, '
+            'избранным, корзинами и подписками для нагрузочных замеров.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=100,
+            help='Сколько пользователей создать.'
+        )
+        parser.add_argument(
+            '--recipes',
+            type=int,
+            default=1000,
+            help='Сколько рецептов создать.'
+        )
+        parser.add_argument(
+            '--ingredients-per-recipe',
+            type=int,
+            default=8,
+            help='Наибольшее число ингридиентов в рецепте.'
+        )
+        parser.add_argument(
+            '--favorites',
+            type=int,
+            default=20,
+            help='Сколько рецептов каждый пользователь добавит в избранное.'
+        )
+        parser.add_argument(
+            '--cart',
+            type=int,
+            default=5,
+            help='Сколько рецептов у каждого пользователя в корзине.'
+        )
+        parser.add_argument(
+            '--subscriptions',
+            type=int,
+            default=10,
+            help='На сколько авторов подписан каждый пользователь.'
+        )
+        parser.add_argument(
+            '--ingredients',
+            default=settings.INGREDIENTS_PATH,
+            help='Справочник для load_ingredients, если ингридиентов нет.'
+        )
+        parser.add_argument(
+            '--prefix',
+            default='fake',
+            help='Начало логинов созданных пользователей.'
+        )
+        parser.add_argument(
+            '--password',
+            default='fake-password',
+            help='Пароль всех созданных пользователей.'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Зерно генератора: одинаковое даёт одинаковые данные.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Размер пакета для bulk_create.'
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть положительным.')
+        if options['users'] < 1:
+            raise CommandError('Нужен хотя бы один пользователь.')
+        if min(options['recipes'], options['favorites'], options['cart'],
+               options['subscriptions']) < 0:
+            raise CommandError('Количества не могут быть отрицательными.')
+
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        self.created = {}
+        started = perf_counter()
+
+        if not Ingredient.objects.exists():
+            call_command(
+                'load_ingredients', options['ingredients'],
+                stdout=self.stdout
+            )
+        ingredients = list(Ingredient.objects.values_list('pk', flat=True))
+        if not ingredients:
+            raise CommandError('Справочник ингридиентов пуст.')
+
+        with transaction.atomic():
+            tags = self.create_tags()
+            users = self.create_users(
+                options['prefix'], options['users'], options['password'])
+            recipes = self.create_recipes(users, tags, options['recipes'])
+            self.create_amounts(
+                recipes, ingredients, options['ingredients_per_recipe'])
+            self.create_events(Favourite, users, recipes, options['favorites'])
+            self.create_events(ShoppingCart, users, recipes, options['cart'])
+            self.create_subscriptions(users, options['subscriptions'])
+            update_search_index(recipes)
+
+            ShoppingCartIngredient.objects.rebuild(
+                users=self.new_users, batch_size=self.batch_size)
+            reconcile()
+            invalidate_catalog()
+            invalidate_recipes([])
+        call_command('update_recipe_scores', stdout=self.stdout)
+
+        summary = ', '.join(
+            f'{model._meta.verbose_name_plural}: {count}'
+            for model, count in self.created.items()
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано за {perf_counter() - started:.2f} с. {summary}.'))
+
+    def bulk_create(self, model, objects):
+        """Создаёт объекты пакетами, не собирая их в один список."""
+        objects = iter(objects)
+        while True:
+            batch = list(islice(objects, self.batch_size))
+            if not batch:
+                break
+            model.objects.bulk_create(batch)
+            self.created[model] = self.created.get(model, 0) + len(batch)
+
+    def created_at(self):
+        return self.now - self.random.random() * EVENTS_WINDOW
+
+    def create_tags(self):
+        Tag.objects.bulk_create(
+            [
+                Tag(name=name, color=color, slug=slug)
+                for name, color, slug in TAGS
+            ],
+            ignore_conflicts=True
+        )
+        return list(Tag.objects.values_list('pk', flat=True))
+
+    def create_users(self, prefix, count, password):
+        offset = User.objects.filter(username__startswith=prefix).count()
+        before = last_pk(User)
+        usernames = [
+            f'{prefix}{number}' for number in range(offset, offset + count)]
+        password = make_password(password)
+        self.bulk_create(User, (
+            User(
+                username=username,
+                email=f'{username}@example.com',
+                first_name=self.random.choice(('Анна', 'Иван', 'Мария')),
+                last_name=self.random.choice(('Иванова', 'Петров')),
+                password=password
+            )
+            for username in usernames
+        ))
+        self.new_users = User.objects.filter(
+            pk__gt=before, username__startswith=prefix)
+        return list(self.new_users.values_list('pk', flat=True))
+
+    def create_recipes(self, users, tags, count):
+        before = last_pk(Recipe)
+        self.bulk_create(Recipe, (
+            Recipe(
+                author_id=self.random.choice(users),
+                name=self.random.choice(DISHES),
+                text=' '.join(self.random.choices(DISHES, k=20)),
+                cooking_time=self.random.randint(5, 180)
+            )
+            for _ in range(count)
+        ))
+        recipes = list(Recipe.objects.filter(
+            pk__gt=before, author__in=self.new_users
+        ).values_list('pk', flat=True))
+        self.bulk_create(Recipe.tags.through, (
+            Recipe.tags.through(recipe_id=recipe, tag_id=tag)
+            for recipe in recipes
+            for tag in self.random.sample(
+                tags, self.random.randint(1, len(tags)))
+        ))
+        return recipes
+
+    def create_amounts(self, recipes, ingredients, limit):
+        limit = max(1, min(limit, len(ingredients)))
+        self.bulk_create(IngredientAmount, (
+            IngredientAmount(
+                recipe_id=recipe,
+                ingredient_id=ingredient,
+                amount=self.random.randint(1, 500)
+            )
+            for recipe in recipes
+            for ingredient in self.random.sample(
+                ingredients, self.random.randint(1, limit))
+        ))
+
+    def create_events(self, model, users, recipes, per_user):
+        per_user = min(per_user, len(recipes))
+        self.bulk_create(model, (
+            model(user_id=user, recipe_id=recipe, created=self.created_at())
+            for user in users
+            for recipe in self.random.sample(recipes, per_user)
+        ))
+
+    def create_subscriptions(self, users, per_user):
+        per_user = min(per_user, len(users) - 1)
+        self.bulk_create(Subscription, (
+            Subscription(user_id=user, subscribing_id=author)
+            for user in users
+            for author in [
+                other for other in self.random.sample(users, per_user + 1)
+                if other != user
+            ][:per_user]
+        ))
@@ -0,0 +1,249 @@
+import csv
+import json
+import os
+from itertools import islice
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from recipes.catalog import invalidate_catalog
+from recipes.models import Ingredient, IngredientAmount
+from recipes.search import update_search_index_on_commit
+from recipes.utils import Echo
+
+READ_SIZE = 64 * 1024
+
+
+def read_csv(file):
+    for line_number, row in enumerate(csv.reader(file), start=1):
+        if not row:
+            continue
+        if len(row) != 2:
+            raise CommandError(
+                f'Строка {line_number}: ожидается "название,единица".')
+        yield row[0], row[1]
+
+
+def read_json(file):
+    """Читает массив объектов по частям, не загружая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    for chunk in iter(lambda: file.read(READ_SIZE), ''):
+        buffer += chunk
+        while True:
+            buffer = buffer.lstrip(' \t\r\n,[')
+            if not buffer or buffer.startswith(']'):
+                break
+            try:
+                item, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                break
+            buffer = buffer[end:]
+            try:
+                yield item['name'], item['measurement_unit']
+            except (KeyError, TypeError):
+                raise CommandError(f'Невалидный ингридиент: {item!r}')
+    if buffer.strip(' \t\r\n]'):
+        raise CommandError('Файл JSON оборван или повреждён.')
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+}
+
+
+class LineStream:
+    """Файлоподобная обёртка над генератором строк для COPY."""
+
+    def __init__(self, lines):
+        self._lines = lines
+        self._buffer = ''
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            try:
+                self._buffer += next(self._lines)
+            except StopIteration:
+                break
+        if size < 0:
+            size = len(self._buffer)
+        chunk = self._buffer[:size]
+        self._buffer = self._buffer[len(chunk):]
+        return chunk
+
+
+class Command(BaseCommand):
+    help = ('Загружает справочник ингридиентов из CSV или JSON '
+            'пакетными вставками (COPY на PostgreSQL).')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default=settings.INGREDIENTS_PATH,
+            help=('Путь к ingredients.csv или ingredients.json; '
+                  'по умолчанию INGREDIENTS_PATH.')
+        )
+        parser.add_argument(
+            '--format',
+            choices=READERS,
+            help='Формат файла; по умолчанию определяется по расширению.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Размер пакета для bulk_create.'
+        )
+        parser.add_argument(
+            '--upsert',
+            action='store_true',
+            help=('Обновить написание существующих ингридиентов, '
+                  'совпадающих с файлом без учёта регистра и пробелов.')
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Выполнить загрузку и откатить транзакцию.'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or os.path.splitext(
+            path)[1].lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError(
+                f'Неизвестный формат "{file_format}", укажите --format.')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть положительным.')
+
+        self.started = perf_counter()
+        self.stats = {'read': 0, 'created': 0, 'updated': 0}
+
+        try:
+            with open(path, encoding='utf-8', newline='') as file:
+                rows = self.normalize(READERS[file_format](file))
+                with transaction.atomic():
+                    if options['upsert']:
+                        self.upsert(rows, options['batch_size'])
+                    elif connection.vendor == 'postgresql':
+                        self.copy(rows)
+                    else:
+                        self.insert(rows, options['batch_size'])
+                    invalidate_catalog()
+                    if options['dry_run']:
+                        transaction.set_rollback(True)
+        except OSError as error:
+            raise CommandError(f'Не удалось прочитать {path}: {error}')
+
+        self.report(options['dry_run'])
+
+    def normalize(self, rows):
+        for name, measurement_unit in rows:
+            self.stats['read'] += 1
+            yield name.strip(), measurement_unit.strip()
+
+    def progress(self):
+        elapsed = perf_counter() - self.started
+        self.stdout.write(
+            f'Обработано {self.stats["read"]} строк, '
+            f'{self.stats["read"] / elapsed:.0f} строк/с'
+        )
+
+    def insert(self, rows, batch_size):
+        before = Ingredient.objects.count()
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            Ingredient.objects.bulk_create(
+                [
+                    Ingredient(name=name, measurement_unit=measurement_unit)
+                    for name, measurement_unit in batch
+                ],
+                ignore_conflicts=True
+            )
+            self.progress()
+        self.stats['created'] = Ingredient.objects.count() - before
+
+    def copy(self, rows):
+        table = connection.ops.quote_name(Ingredient._meta.db_table)
+        writer = csv.writer(Echo())
+        lines = (writer.writerow(row) for row in rows)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMPORARY TABLE ingredients_load '
+                '(name text, measurement_unit text) ON COMMIT DROP'
+            )
+            cursor.copy_expert(
+                'COPY ingredients_load FROM STDIN WITH (FORMAT csv)',
+                LineStream(lines)
+            )
+            self.progress()
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                f'SELECT DISTINCT name, measurement_unit '
+                f'FROM ingredients_load '
+                f'ON CONFLICT ON CONSTRAINT unique_ingredient DO NOTHING'
+            )
+            self.stats['created'] = cursor.rowcount
+
+    def upsert(self, rows, batch_size):
+        existing = {}
+        exact = set()
+        for ingredient in Ingredient.objects.all().iterator():
+            key = (ingredient.name.strip().casefold(),
+                   ingredient.measurement_unit.strip().casefold())
+            existing.setdefault(key, ingredient)
+            exact.add((ingredient.name, ingredient.measurement_unit))
+
+        seen = set()
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            created = []
+            updated = []
+            for name, measurement_unit in batch:
+                key = (name.casefold(), measurement_unit.casefold())
+                if key in seen or (name, measurement_unit) in exact:
+                    seen.add(key)
+                    continue
+                seen.add(key)
+                ingredient = existing.get(key)
+                if ingredient is None:
+                    created.append(Ingredient(
+                        name=name, measurement_unit=measurement_unit))
+                else:
+                    ingredient.name = name
+                    ingredient.measurement_unit = measurement_unit
+                    updated.append(ingredient)
+            Ingredient.objects.bulk_create(created, ignore_conflicts=True)
+            Ingredient.objects.bulk_update(
+                updated, ['name', 'measurement_unit'])
+            # bulk_update не шлёт post_save: документы рецептов
+            # с переименованными ингридиентами пересобираются здесь.
+            update_search_index_on_commit(
+                IngredientAmount.objects.filter(
+                    ingredient__in=updated
+                ).values_list('recipe_id', flat=True).distinct()
+            )
+            self.stats['created'] += len(created)
+            self.stats['updated'] += len(updated)
+            self.progress()
+
+    def report(self, dry_run):
+        elapsed = perf_counter() - self.started
+        stats = self.stats
+        skipped = stats['read'] - stats['created'] - stats['updated']
+        message = (
+            f'Прочитано {stats["read"]}, добавлено {stats["created"]}, '
+            f'обновлено {stats["updated"]}, пропущено {skipped} '
+            f'за {elapsed:.2f} с ({stats["read"] / elapsed:.0f} строк/с).'
+        )
+        if dry_run:
+            message += ' Пробный запуск: изменения откатены.'
+        self.stdout.write(self.style.SUCCESS(message))
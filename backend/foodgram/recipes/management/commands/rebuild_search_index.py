@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from recipes.models import Recipe
+from recipes.search import (SEARCH_TABLES, prune_search_index,
+                            search_supported, update_search_index)
+
+
+class Command(BaseCommand):
+    help = ('Пересобирает полнотекстовый индекс рецептов или сверяет '
+            'его с таблицей рецептов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сверить число документов, ничего не изменяя.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько рецептов индексировать за раз.'
+        )
+
+    def handle(self, *args, **options):
+        if not search_supported():
+            raise CommandError(
+                f'Полнотекстовый индекс для {connection.vendor} не ведётся.')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть положительным.')
+
+        if options['check']:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'SELECT count(*) FROM '
+                    f'{SEARCH_TABLES[connection.vendor][0]}')
+                indexed = cursor.fetchone()[0]
+            recipes = Recipe.objects.count()
+            if indexed != recipes:
+                raise CommandError(
+                    f'В индексе {indexed} документов, рецептов {recipes}. '
+                    f'Запустите команду без --check, чтобы пересобрать.'
+                )
+            self.stdout.write(self.style.SUCCESS('Индекс совпадает.'))
+            return
+
+        prune_search_index()
+        ids = list(Recipe.objects.order_by('pk').values_list('pk', flat=True))
+        for start in range(0, len(ids), options['batch_size']):
+            update_search_index(ids[start:start + options['batch_size']])
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано рецептов: {len(ids)}.'))
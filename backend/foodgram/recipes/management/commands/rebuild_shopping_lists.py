@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.models import IngredientAmount, ShoppingCartIngredient
+
+
+class Command(BaseCommand):
+    help = ('Пересобирает итоги списков покупок или сверяет их '
+            'с живым агрегатом по корзинам.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сверить итоги, ничего не изменяя.'
+        )
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='users',
+            help='id пользователя; можно указать несколько раз.'
+        )
+
+    def handle(self, *args, **options):
+        users = options['users']
+
+        if not options['check']:
+            ShoppingCartIngredient.objects.rebuild(users)
+            self.stdout.write(self.style.SUCCESS('Итоги пересобраны.'))
+            return
+
+        expected = {
+            (user, ingredient): total_amount
+            for user, ingredient, total_amount
+            in IngredientAmount.objects.shopping_totals(users).iterator()
+        }
+        stored = ShoppingCartIngredient.objects.all()
+        if users is not None:
+            stored = stored.filter(user__in=users)
+        actual = {
+            (user, ingredient): total_amount
+            for user, ingredient, total_amount in stored.values_list(
+                'user_id', 'ingredient_id', 'total_amount').iterator()
+        }
+
+        mismatches = sorted(
+            key for key in expected.keys() | actual.keys()
+            if expected.get(key) != actual.get(key)
+        )
+        for user, ingredient in mismatches:
+            self.stdout.write(
+                f'user={user} ingredient={ingredient}: '
+                f'ожидается {expected.get((user, ingredient))}, '
+                f'сохранено {actual.get((user, ingredient))}'
+            )
+        if mismatches:
+            raise CommandError(
+                f'Расхождений: {len(mismatches)}. '
+                f'Запустите команду без --check, чтобы пересобрать итоги.'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Итоги совпадают ({len(actual)} строк).'))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.counters import COUNTERS, find_drift, reconcile
+
+
+class Command(BaseCommand):
+    help = ('Сверяет денормализованные счётчики рецептов и пользователей '
+            'с данными и исправляет расхождения.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сверить счётчики, ничего не изменяя.'
+        )
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            fixed = reconcile()
+            self.stdout.write(self.style.SUCCESS(
+                f'Исправлено счётчиков: {fixed}.'))
+            return
+
+        mismatches = 0
+        for model, field, expression in COUNTERS:
+            for pk, stored, expected in find_drift(model, field, expression):
+                mismatches += 1
+                self.stdout.write(
+                    f'{model._meta.model_name}={pk} {field}: '
+                    f'ожидается {expected}, сохранено {stored}'
+                )
+        if mismatches:
+            raise CommandError(
+                f'Расхождений: {mismatches}. '
+                f'Запустите команду без --check, чтобы исправить счётчики.'
+            )
+        self.stdout.write(self.style.SUCCESS('Счётчики совпадают.'))
@@ -0,0 +1,99 @@
+from collections import defaultdict
+from datetime import timedelta
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from api.cache import invalidate_recipes
+from recipes.counters import count_of, find_drift
+from recipes.models import Favourite, Recipe, ShoppingCart
+
+
+def popular_score():
+    """Сколько раз рецепт добавили в избранное и в списки покупок."""
+    return (count_of(Favourite.objects.all(), 'recipe')
+            + count_of(ShoppingCart.objects.all(), 'recipe'))
+
+
+def trending_scores(since, now, half_life):
+    """
+    Рейтинг за окно: каждое добавление в избранное или список покупок
+    весит 0.5 ** (возраст / half_life), старые события затухают.
+    """
+    scores = defaultdict(float)
+    for model in (Favourite, ShoppingCart):
+        events = model.objects.filter(created__gte=since).values_list(
+            'recipe_id', 'created').order_by()
+        for recipe_id, created in events.iterator():
+            age = (now - created) / half_life
+            scores[recipe_id] += 0.5 ** max(age, 0)
+    return scores
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает рейтинги рецептов для ?ordering=popular '
+            'и ?ordering=trending. Запускается периодически, например '
+            'из cron.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--window-days',
+            type=int,
+            default=7,
+            help='За сколько дней учитывать события в trending.'
+        )
+        parser.add_argument(
+            '--half-life-hours',
+            type=float,
+            default=24,
+            help='Через сколько часов вес события в trending падает вдвое.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Размер пакета для bulk_update.'
+        )
+
+    def handle(self, *args, **options):
+        if options['window_days'] < 1 or options['half_life_hours'] <= 0:
+            raise CommandError(
+                'Окно и период полураспада должны быть положительными.')
+
+        started = perf_counter()
+        now = timezone.now()
+        scores = trending_scores(
+            now - timedelta(days=options['window_days']),
+            now,
+            timedelta(hours=options['half_life_hours'])
+        )
+
+        with transaction.atomic():
+            popular = [
+                pk for pk, _, _ in find_drift(
+                    Recipe, 'popular_score', popular_score).iterator()
+            ]
+            for start in range(0, len(popular), options['batch_size']):
+                Recipe.objects.filter(
+                    pk__in=popular[start:start + options['batch_size']]
+                ).update(popular_score=popular_score())
+
+            Recipe.objects.filter(trending_score__gt=0).update(
+                trending_score=0)
+            Recipe.objects.bulk_update(
+                [
+                    Recipe(pk=pk, trending_score=score)
+                    for pk, score in scores.items()
+                ],
+                ['trending_score'],
+                batch_size=options['batch_size']
+            )
+            invalidate_recipes([])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Популярность обновлена у {len(popular)} рецептов, '
+            f'trending - у {len(scores)} '
+            f'за {perf_counter() - started:.2f} с.'
+        ))
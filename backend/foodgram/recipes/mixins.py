@@ -0,0 +1,21 @@
+class DenormalizedFieldsMixin:
+    """
+    Модель с денормализованными полями denormalized_fields: счётчиками,
+    рейтингами и т.п. Они пишутся только точечными UPDATE, поэтому save()
+    существующего объекта не перезаписывает их значениями,
+    прочитанными раньше.
+    """
+
+    denormalized_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (not self._state.adding and not kwargs.get('force_insert')
+                and kwargs.get('update_fields') is None):
+            skipped = (set(self.denormalized_fields)
+                       | self.get_deferred_fields())
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in skipped
+                and field.attname not in skipped
+            ]
+        super().save(*args, **kwargs)
@@ -1,13 +1,23 @@
+from itertools import islice
+from uuid import uuid4
+
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import connections, models, transaction
+from django.utils import timezone
 
+from .mixins import DenormalizedFieldsMixin
 from .validators import validate_color, validate_name
 
 
 User = get_user_model()
 
+SHOPPING_LIST_VERSION_KEY = 'recipes:shopping_list:{}:version'
+# Строк итогов в одном INSERT: 3 параметра на строку.
+SHOPPING_LIST_BATCH_SIZE = 300
+
 
 class Tag(models.Model):
     """Модель тегов."""
@@ -66,7 +76,30 @@ class Ingredient(models.Model):
         return self.name
 
 
-class Recipe(models.Model):
+class RecipeQuerySet(models.QuerySet):
+
+    def with_user_flags(self, user):
+        """
+        Аннотирует is_favorited и is_in_shopping_cart подзапросами EXISTS;
+        для анонимного пользователя оба флага - константа False.
+        """
+        if not user.is_authenticated:
+            return self.annotate(
+                is_favorited=models.Value(
+                    False, output_field=models.BooleanField()),
+                is_in_shopping_cart=models.Value(
+                    False, output_field=models.BooleanField())
+            )
+
+        return self.annotate(
+            is_favorited=models.Exists(Favourite.objects.filter(
+                user=user, recipe=models.OuterRef('pk'))),
+            is_in_shopping_cart=models.Exists(ShoppingCart.objects.filter(
+                user=user, recipe=models.OuterRef('pk')))
+        )
+
+
+class Recipe(DenormalizedFieldsMixin, models.Model):
     """Модель рецептов."""
 
     author = models.ForeignKey(
@@ -84,6 +117,7 @@ class Recipe(models.Model):
         upload_to='recipes/',
         null=True,
         default=None,
+        db_index=True,
         verbose_name='Изображение'
     )
 
@@ -101,6 +135,35 @@ class Recipe(models.Model):
         ],
         verbose_name='Время приготовления'
     )
+    favorites_count = models.IntegerField(
+        default=0,
+        db_index=True,
+        editable=False,
+        verbose_name='В избранном у пользователей'
+    )
+    popular_score = models.IntegerField(
+        default=0,
+        db_index=True,
+        editable=False,
+        verbose_name='Популярность'
+    )
+    trending_score = models.FloatField(
+        default=0,
+        db_index=True,
+        editable=False,
+        verbose_name='Рейтинг за последние дни'
+    )
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Уменьшенные копии изображения'
+    )
+
+    objects = RecipeQuerySet.as_manager()
+    denormalized_fields = (
+        'favorites_count', 'popular_score', 'trending_score', 'image_variants'
+    )
 
     class Meta:
         verbose_name = 'Рецепт'
@@ -111,6 +174,40 @@ class Recipe(models.Model):
         return self.name
 
 
+class IngredientAmountQuerySet(models.QuerySet):
+
+    def recipe_totals(self, recipe):
+        """Количество каждого ингридиента рецепта: {ingredient_id: amount}."""
+        return self.recipes_totals([recipe])
+
+    def recipes_totals(self, recipes):
+        """Суммарное количество ингридиентов нескольких рецептов."""
+        return dict(
+            self.filter(recipe__in=recipes).values('ingredient_id').annotate(
+                total_amount=models.Sum('amount')
+            ).values_list('ingredient_id', 'total_amount')
+        )
+
+    def shopping_totals(self, users=None):
+        """
+        Живой агрегат списков покупок по строкам корзин:
+        (user_id, ingredient_id, total_amount).
+        """
+        # Условия на корзину задаются одним filter(): второй вызов
+        # по многозначной связи добавил бы ещё один JOIN и умножил
+        # количества на число корзин с рецептом.
+        if users is None:
+            queryset = self.filter(recipe__recipe_shopping_cart__isnull=False)
+        else:
+            queryset = self.filter(
+                recipe__recipe_shopping_cart__user__in=users)
+        return queryset.values_list(
+            'recipe__recipe_shopping_cart__user_id', 'ingredient_id'
+        ).annotate(
+            total_amount=models.Sum('amount')
+        ).order_by()
+
+
 class IngredientAmount(models.Model):
     """Модель ингридиентов рецепта."""
 
@@ -132,6 +229,8 @@ class IngredientAmount(models.Model):
         verbose_name='Величина'
     )
 
+    objects = IngredientAmountQuerySet.as_manager()
+
     def __str__(self):
         return self.ingredient.name
 
@@ -186,6 +285,12 @@ class Favourite(models.Model):
         help_text='Рецепт в избранном у пользователя'
     )
 
+    created = models.DateTimeField(
+        default=timezone.now,
+        db_index=True,
+        verbose_name='Добавлен в избранное'
+    )
+
     class Meta:
         constraints = [
             models.UniqueConstraint(
@@ -215,6 +320,12 @@ class ShoppingCart(models.Model):
         help_text='Рецепт в списке покупок у пользователя'
     )
 
+    created = models.DateTimeField(
+        default=timezone.now,
+        db_index=True,
+        verbose_name='Добавлен в список покупок'
+    )
+
     class Meta:
         constraints = [
             models.UniqueConstraint(
@@ -224,3 +335,197 @@ class ShoppingCart(models.Model):
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Списки покупок'
         ordering = ('recipe',)
+
+
+class ShoppingCartIngredientQuerySet(models.QuerySet):
+
+    @staticmethod
+    def version_keys(user_id):
+        """Ключи версий списка покупок: общий и пользователя."""
+        return [
+            SHOPPING_LIST_VERSION_KEY.format('all'),
+            SHOPPING_LIST_VERSION_KEY.format(user_id),
+        ]
+
+    @staticmethod
+    def touch(users=None):
+        """
+        После коммита меняет версии списков покупок пользователей users
+        (id). Без users или для выборки QuerySet меняется общая версия.
+        """
+        if users is None or isinstance(users, models.QuerySet):
+            keys = [SHOPPING_LIST_VERSION_KEY.format('all')]
+        else:
+            keys = [SHOPPING_LIST_VERSION_KEY.format(user) for user in users]
+        transaction.on_commit(
+            lambda: cache.set_many(
+                dict.fromkeys(keys, uuid4().hex), timeout=None)
+        )
+
+    def shopping_list(self, user):
+        """Список покупок пользователя, отсортированный по названию."""
+        return self.filter(user=user).values(
+            'total_amount',
+            name=models.F('ingredient__name'),
+            measurement_unit=models.F('ingredient__measurement_unit')
+        ).order_by('name', 'measurement_unit')
+
+    def apply_changes(self, users, changes):
+        """
+        Прибавляет к итогам пользователей users изменения changes
+        вида {ingredient_id: delta}. Обнулившиеся строки удаляются.
+
+        Строки пишутся одним INSERT ... ON CONFLICT DO UPDATE, поэтому
+        одновременные изменения одного списка складываются, а не падают
+        на уникальном ограничении. Порядок строк фиксирован, чтобы
+        параллельные транзакции не блокировали друг друга крест-накрест.
+        """
+        changes = {
+            ingredient: delta for ingredient, delta in changes.items() if delta
+        }
+        users = list(users)
+        if not changes or not users:
+            return
+
+        rows = iter(sorted(
+            (user, ingredient, delta)
+            for user in users
+            for ingredient, delta in changes.items()
+        ))
+        connection = connections[self.db]
+        quote = connection.ops.quote_name
+        table = quote(self.model._meta.db_table)
+        total = quote(self.model._meta.get_field('total_amount').column)
+        columns = ', '.join(
+            quote(self.model._meta.get_field(name).column)
+            for name in ('user', 'ingredient', 'total_amount')
+        )
+        unique = ', '.join(
+            quote(self.model._meta.get_field(name).column)
+            for name in ('user', 'ingredient')
+        )
+
+        self.touch(users)
+        with transaction.atomic(using=self.db):
+            with connection.cursor() as cursor:
+                while True:
+                    batch = list(islice(rows, SHOPPING_LIST_BATCH_SIZE))
+                    if not batch:
+                        break
+                    cursor.execute(
+                        f'INSERT INTO {table} ({columns}) VALUES '
+                        + ', '.join(['(%s, %s, %s)'] * len(batch))
+                        + f' ON CONFLICT ({unique}) DO UPDATE SET '
+                        f'{total} = {table}.{total} + excluded.{total}',
+                        [value for row in batch for value in row]
+                    )
+            self.filter(
+                user__in=users, ingredient__in=changes, total_amount__lte=0
+            ).delete()
+
+    def add_recipe(self, user, recipe):
+        self.apply_changes(
+            [user.id], IngredientAmount.objects.recipe_totals(recipe))
+
+    def remove_recipe(self, user, recipe):
+        self.apply_changes(
+            [user.id],
+            {
+                ingredient: -amount for ingredient, amount
+                in IngredientAmount.objects.recipe_totals(recipe).items()
+            }
+        )
+
+    def change_recipes(self, user, added=(), removed=()):
+        """
+        Переносит в итоги пользователя пакетное изменение корзины:
+        рецепты added добавлены, removed - убраны.
+        """
+        added_totals = IngredientAmount.objects.recipes_totals(
+            added) if added else {}
+        removed_totals = IngredientAmount.objects.recipes_totals(
+            removed) if removed else {}
+        self.apply_changes(
+            [user.id],
+            {
+                ingredient: (added_totals.get(ingredient, 0)
+                             - removed_totals.get(ingredient, 0))
+                for ingredient in added_totals.keys() | removed_totals.keys()
+            }
+        )
+
+    def update_recipe(self, recipe, old_totals, new_totals=None):
+        """Переносит изменение состава рецепта в списки покупок."""
+        if new_totals is None:
+            new_totals = IngredientAmount.objects.recipe_totals(recipe)
+        self.apply_changes(
+            ShoppingCart.objects.filter(recipe=recipe).values_list(
+                'user_id', flat=True),
+            {
+                ingredient: (new_totals.get(ingredient, 0)
+                             - old_totals.get(ingredient, 0))
+                for ingredient in new_totals.keys() | old_totals.keys()
+            }
+        )
+
+    def discard_recipe(self, recipe):
+        """Убирает удаляемый рецепт из списков покупок."""
+        self.update_recipe(recipe, IngredientAmount.objects.recipe_totals(
+            recipe), new_totals={})
+
+    def rebuild(self, users=None, batch_size=1000):
+        """Пересобирает итоги с нуля по живому агрегату."""
+        self.touch(users)
+        with transaction.atomic():
+            rows = self.all() if users is None else self.filter(
+                user__in=users)
+            rows.delete()
+            totals = (
+                self.model(
+                    user_id=user,
+                    ingredient_id=ingredient,
+                    total_amount=total_amount
+                )
+                for user, ingredient, total_amount
+                in IngredientAmount.objects.shopping_totals(users).iterator()
+            )
+            while True:
+                batch = list(islice(totals, batch_size))
+                if not batch:
+                    break
+                self.bulk_create(batch)
+
+
+class ShoppingCartIngredient(models.Model):
+    """
+    Итоги списка покупок: сколько каждого ингридиента нужно пользователю.
+    Поддерживаются инкрементально при изменении корзины и рецептов.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Ингридиент'
+    )
+    total_amount = models.IntegerField(
+        verbose_name='Общее количество'
+    )
+
+    objects = ShoppingCartIngredientQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_cart_ingredient'
+            ),
+        ]
+        verbose_name = 'Ингридиент списка покупок'
+        verbose_name_plural = 'Ингридиенты списков покупок'
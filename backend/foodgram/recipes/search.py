@@ -0,0 +1,216 @@
+import re
+import threading
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+
+class IngredientPrefixIndex:
+    """
+    Отсортированный индекс названий ингридиентов в памяти процесса.
+    Используется для подсказок там, где нет триграммного индекса БД.
+    """
+
+    def __init__(self, rows):
+        self._entries = sorted((name.casefold(), pk) for pk, name in rows)
+        self._keys = [key for key, _ in self._entries]
+
+    def search(self, query, limit):
+        """
+        id ингридиентов: сначала совпадения по началу названия,
+        затем по подстроке, внутри групп - по алфавиту.
+        """
+        query = query.strip().casefold()
+        found = []
+
+        position = bisect_left(self._keys, query)
+        while (len(found) < limit and position < len(self._keys)
+               and self._keys[position].startswith(query)):
+            found.append(self._entries[position][1])
+            position += 1
+
+        for key, pk in self._entries:
+            if len(found) >= limit:
+                break
+            if query in key and not key.startswith(query):
+                found.append(pk)
+
+        return found
+
+
+SEARCH_TABLES = {
+    'postgresql': ('recipes_recipe_search', 'recipe_id'),
+    'sqlite': ('recipes_recipe_fts', 'rowid'),
+}
+SEARCH_INDEX_STATEMENTS = {
+    'postgresql': (
+        'CREATE TABLE IF NOT EXISTS recipes_recipe_search ('
+        'recipe_id integer PRIMARY KEY '
+        'REFERENCES recipes_recipe (id) ON DELETE CASCADE, '
+        'document tsvector NOT NULL)',
+        'CREATE INDEX IF NOT EXISTS recipes_recipe_search_document '
+        'ON recipes_recipe_search USING gin (document)',
+    ),
+    'sqlite': (
+        'CREATE VIRTUAL TABLE IF NOT EXISTS recipes_recipe_fts '
+        'USING fts5(name, ingredients, text, tokenize = unicode61)',
+    ),
+}
+# Вес совпадений: название важнее ингридиентов, ингридиенты - текста.
+POSTGRES_DOCUMENT = (
+    "setweight(to_tsvector(%(config)s::regconfig, recipe.name), 'A') || "
+    "setweight(to_tsvector(%(config)s::regconfig, "
+    "coalesce(string_agg(ingredient.name, ' '), '')), 'B') || "
+    "setweight(to_tsvector(%(config)s::regconfig, recipe.text), 'C')"
+)
+SQLITE_WEIGHTS = (10.0, 5.0, 1.0)
+RECIPE_INGREDIENTS = (
+    'FROM recipes_recipe recipe '
+    'LEFT JOIN recipes_ingredientamount amount '
+    'ON amount.recipe_id = recipe.id '
+    'LEFT JOIN recipes_ingredient ingredient '
+    'ON ingredient.id = amount.ingredient_id '
+)
+SQLITE_BATCH_SIZE = 500
+WORD = re.compile(r'\w+')
+
+_pending = threading.local()
+
+
+def search_supported():
+    return connection.vendor in SEARCH_TABLES
+
+
+def update_search_index(recipe_ids):
+    """
+    Пересобирает поисковые документы рецептов recipe_ids из названия,
+    текста и ингридиентов. Удалённые рецепты пропадают из индекса.
+    """
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids or not search_supported():
+        return
+    with transaction.atomic(), connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                'DELETE FROM recipes_recipe_search '
+                'WHERE recipe_id = ANY(%(ids)s)',
+                {'ids': recipe_ids}
+            )
+            cursor.execute(
+                f'INSERT INTO recipes_recipe_search (recipe_id, document) '
+                f'SELECT recipe.id, {POSTGRES_DOCUMENT} '
+                f'{RECIPE_INGREDIENTS}'
+                f'WHERE recipe.id = ANY(%(ids)s) GROUP BY recipe.id',
+                {'ids': recipe_ids, 'config': settings.RECIPE_SEARCH_CONFIG}
+            )
+            return
+        for start in range(0, len(recipe_ids), SQLITE_BATCH_SIZE):
+            batch = recipe_ids[start:start + SQLITE_BATCH_SIZE]
+            placeholders = ', '.join(['%s'] * len(batch))
+            cursor.execute(
+                f'DELETE FROM recipes_recipe_fts '
+                f'WHERE rowid IN ({placeholders})',
+                batch
+            )
+            cursor.execute(
+                f'INSERT INTO recipes_recipe_fts '
+                f'(rowid, name, ingredients, text) '
+                f'SELECT recipe.id, recipe.name, '
+                f"coalesce(group_concat(ingredient.name, ' '), ''), "
+                f'recipe.text {RECIPE_INGREDIENTS}'
+                f'WHERE recipe.id IN ({placeholders}) GROUP BY recipe.id',
+                batch
+            )
+
+
+def prune_search_index():
+    """Удаляет документы рецептов, которых больше нет."""
+    table, key = SEARCH_TABLES[connection.vendor]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} WHERE {key} NOT IN '
+            f'(SELECT id FROM recipes_recipe)'
+        )
+
+
+def update_search_index_on_commit(recipe_ids):
+    """
+    Документы собираются после коммита, когда записаны ингридиенты.
+    id копятся до коммита, и индекс обновляется одним пакетом, сколько
+    бы строк рецепта ни изменилось в транзакции. После отката id
+    остаются до следующего коммита: документ всё равно строится
+    по текущим данным.
+    """
+    pending = getattr(_pending, 'ids', None)
+    if pending is None:
+        pending = _pending.ids = set()
+    pending.update(recipe_ids)
+    transaction.on_commit(flush_search_index)
+
+
+def flush_search_index():
+    recipe_ids = getattr(_pending, 'ids', None)
+    _pending.ids = set()
+    if recipe_ids:
+        update_search_index(sorted(recipe_ids))
+
+
+def match_substrings(model, words):
+    """id рецептов, где каждое слово есть в названии, тексте или составе."""
+    matched = model.objects.all()
+    for word in words:
+        matched = matched.filter(
+            Q(name__icontains=word) | Q(text__icontains=word)
+            | Q(ingredientamount__ingredient__name__icontains=word)
+        )
+    return matched.values('pk')
+
+
+def search_recipes(queryset, query):
+    """
+    Рецепты, подходящие под запрос, с релевантностью в search_rank.
+    PostgreSQL ищет по tsvector с русской морфологией, SQLite - по FTS5
+    с поиском по началу слов, остальные БД - через icontains.
+    """
+    words = WORD.findall(query)
+    if not words:
+        return queryset.annotate(
+            search_rank=Value(0.0, output_field=FloatField()))
+
+    if connection.vendor == 'sqlite':
+        # bm25 считается только в запросе, где таблица FTS5 соединена
+        # с рецептами: коррелированный подзапрос повторял бы MATCH
+        # для каждой строки.
+        weights = ', '.join(str(weight) for weight in SQLITE_WEIGHTS)
+        return queryset.extra(
+            select={
+                'search_rank': f'-bm25(recipes_recipe_fts, {weights})'},
+            tables=['recipes_recipe_fts'],
+            where=[
+                'recipes_recipe_fts.rowid = recipes_recipe.id',
+                'recipes_recipe_fts MATCH %s',
+            ],
+            params=[' '.join(f'"{word}"*' for word in words)]
+        )
+
+    if connection.vendor != 'postgresql':
+        return queryset.filter(
+            pk__in=match_substrings(queryset.model, words)
+        ).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    tsquery = 'websearch_to_tsquery(%s::regconfig, %s)'
+    params = (settings.RECIPE_SEARCH_CONFIG, query)
+    return queryset.filter(pk__in=RawSQL(
+        f'SELECT recipe_id FROM recipes_recipe_search '
+        f'WHERE document @@ {tsquery}',
+        params
+    )).annotate(search_rank=RawSQL(
+        f'SELECT ts_rank_cd(document, {tsquery}) '
+        f'FROM recipes_recipe_search '
+        f'WHERE recipe_id = recipes_recipe.id',
+        params,
+        output_field=FloatField()
+    ))
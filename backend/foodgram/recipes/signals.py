@@ -0,0 +1,130 @@
+import logging
+
+from django.db import DatabaseError, connection
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .catalog import invalidate_catalog
+from .counters import increment
+from .images import schedule_variants
+from .models import (Ingredient, IngredientAmount, Recipe, ShoppingCart,
+                     ShoppingCartIngredient, Tag, User)
+from .search import SEARCH_INDEX_STATEMENTS, update_search_index_on_commit
+
+logger = logging.getLogger(__name__)
+
+POSTGRES_SEARCH_INDEXES = (
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS recipes_ingredient_name_trgm '
+    'ON recipes_ingredient USING gin (UPPER(name::text) gin_trgm_ops)',
+)
+RECIPE_TAG_INDEXES = (
+    'CREATE INDEX IF NOT EXISTS recipes_recipe_tags_tag_recipe '
+    'ON recipes_recipe_tags (tag_id, recipe_id)',
+)
+
+
+def create_search_indexes(sender, using='default', **kwargs):
+    """
+    Триграммный индекс для поиска ингридиентов по началу и подстроке
+    названия. Выражение совпадает с тем, что Django строит для
+    istartswith/icontains, поэтому индекс используется планировщиком.
+
+    Составной индекс (tag_id, recipe_id) покрывает фильтр рецептов
+    по тегам: подзапрос читает только индекс.
+
+    Полнотекстовый индекс рецептов: таблица с tsvector и GIN-индексом
+    на PostgreSQL, виртуальная таблица FTS5 на SQLite.
+    """
+    statements = RECIPE_TAG_INDEXES + SEARCH_INDEX_STATEMENTS.get(
+        connection.vendor, ())
+    if connection.vendor == 'postgresql':
+        statements += POSTGRES_SEARCH_INDEXES
+    try:
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+    except DatabaseError:
+        logger.warning('Не удалось создать поисковые индексы',
+                       exc_info=True)
+
+
+def backfill_shopping_lists(sender, **kwargs):
+    """
+    Корзины, собранные до появления таблицы итогов, после migrate
+    переносятся в неё один раз, иначе их списки покупок будут пустыми.
+    """
+    try:
+        if (ShoppingCart.objects.exists()
+                and not ShoppingCartIngredient.objects.exists()):
+            logger.info('Итоги списков покупок пусты, пересборка по корзинам')
+            ShoppingCartIngredient.objects.rebuild()
+    except DatabaseError:
+        logger.warning('Не удалось заполнить итоги списков покупок',
+                       exc_info=True)
+
+
+@receiver(pre_delete, sender=Recipe)
+def discard_recipe_from_shopping_lists(sender, instance, **kwargs):
+    ShoppingCartIngredient.objects.discard_recipe(instance)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def reset_catalog(sender, **kwargs):
+    invalidate_catalog()
+
+
+@receiver(post_save, sender=Recipe)
+def count_created_recipe(sender, instance, created, **kwargs):
+    if created:
+        increment(User.objects.filter(pk=instance.author_id), 'recipes_count')
+
+
+@receiver(post_delete, sender=Recipe)
+def count_deleted_recipe(sender, instance, **kwargs):
+    increment(
+        User.objects.filter(pk=instance.author_id), 'recipes_count', -1)
+
+
+@receiver(pre_delete, sender=User)
+def uncount_deleted_user(sender, instance, **kwargs):
+    """Избранное и подписки пользователя удаляются каскадом без сигналов."""
+    increment(
+        Recipe.objects.filter(recipe_is_favourite__user=instance),
+        'favorites_count', -1
+    )
+    increment(
+        User.objects.filter(subscribing__user=instance),
+        'subscribers_count', -1
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def build_image_variants(sender, instance, **kwargs):
+    """Новое изображение уменьшается в фоне, ответ не ждёт обработки."""
+    if instance.image and instance.image.name != (
+            instance.image_variants or {}).get('source'):
+        schedule_variants(instance)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def reindex_recipe(sender, instance, **kwargs):
+    update_search_index_on_commit([instance.pk])
+
+
+@receiver(post_save, sender=IngredientAmount)
+@receiver(post_delete, sender=IngredientAmount)
+def reindex_ingredient_amount(sender, instance, **kwargs):
+    update_search_index_on_commit([instance.recipe_id])
+
+
+@receiver(post_save, sender=Ingredient)
+def reindex_renamed_ingredient(sender, instance, created, **kwargs):
+    """Название ингридиента входит в документы всех его рецептов."""
+    if not created:
+        update_search_index_on_commit(IngredientAmount.objects.filter(
+            ingredient=instance).values_list('recipe_id', flat=True))
@@ -0,0 +1,53 @@
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+class AlreadyStoredError(Exception):
+    """Файл с таким содержимым уже есть в хранилище."""
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранилище, в котором имя файла - sha256 содержимого:
+    recipes/ab/abcdef....png. Повторная загрузка того же изображения
+    не пишет файл заново, а возвращает имя уже сохранённого, поэтому
+    по одному имени ссылаются несколько рецептов и файл никогда не
+    меняется. Файлы без ссылок удаляет команда collect_orphan_images;
+    при повторной загрузке время изменения файла обновляется, чтобы
+    она не удалила файл, который снова стал нужен.
+    """
+
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(
+            directory, digest[:2], f'{digest}{extension}'
+        ).replace('\\', '/')
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.content_name(name, content)
+        try:
+            return super().save(name, content, max_length)
+        except AlreadyStoredError:
+            os.utime(self.path(name))
+            return name
+
+    def get_available_name(self, name, max_length=None):
+        if self.exists(name):
+            raise AlreadyStoredError(name)
+        return name
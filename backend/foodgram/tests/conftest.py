@@ -0,0 +1,107 @@
+import pytest
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.test import APIClient
+
+from api.authentication import credentials
+from recipes import images
+from recipes.counters import reconcile
+from recipes.models import (Favourite, Ingredient, IngredientAmount, Recipe,
+                            ShoppingCart, ShoppingCartIngredient, Tag)
+from users.models import User
+
+
+class InlineExecutor:
+    """Пул без потоков: уменьшенные копии в тестах не строятся."""
+
+    def submit(self, function, *args):
+        return None
+
+
+@pytest.fixture(autouse=True)
+def isolated(monkeypatch, settings, tmp_path):
+    """
+    Тест идёт внутри транзакции, которая откатывается, поэтому
+    колбэки on_commit выполняются сразу. Кэши очищаются, файлы
+    пишутся во временный каталог.
+    """
+    settings.MEDIA_ROOT = str(tmp_path)
+    cache.clear()
+    credentials.clear()
+    monkeypatch.setattr(
+        transaction, 'on_commit', lambda func, using=None: func())
+    monkeypatch.setattr(images, 'get_executor', InlineExecutor)
+
+
+@pytest.fixture
+def users(db):
+    return [
+        User.objects.create_user(
+            username=f'user{index}',
+            email=f'user{index}@foodgram.ru',
+            password='Passw0rd!',
+            first_name='Имя',
+            last_name='Фамилия'
+        )
+        for index in range(3)
+    ]
+
+
+@pytest.fixture
+def tags(db):
+    return [
+        Tag.objects.create(name=name, color=f'#00000{index}', slug=slug)
+        for index, (name, slug) in enumerate(
+            (('Завтрак', 'breakfast'), ('Обед', 'lunch'), ('Ужин', 'dinner')))
+    ]
+
+
+@pytest.fixture
+def ingredients(db):
+    return [
+        Ingredient.objects.create(
+            name=f'ингридиент {index}', measurement_unit='г')
+        for index in range(6)
+    ]
+
+
+@pytest.fixture
+def recipes(users, tags, ingredients):
+    """
+    Восемь рецептов двух авторов: у i-го рецепта i % 3 + 1 тегов и
+    i % 4 + 1 ингридиентов с количеством j + 1.
+    Третий пользователь добавил первые четыре в избранное и корзину.
+    """
+    recipes = []
+    for index in range(8):
+        recipe = Recipe.objects.create(
+            author=users[index % 2],
+            name=f'Рецепт {index}',
+            text='Описание',
+            cooking_time=10,
+            image='recipes/image.png'
+        )
+        recipe.tags.set(tags[:index % 3 + 1])
+        IngredientAmount.objects.bulk_create(
+            IngredientAmount(
+                recipe=recipe, ingredient=ingredient, amount=position + 1)
+            for position, ingredient in enumerate(
+                ingredients[:index % 4 + 1])
+        )
+        recipes.append(recipe)
+    for recipe in recipes[:4]:
+        Favourite.objects.create(user=users[2], recipe=recipe)
+        ShoppingCart.objects.create(user=users[2], recipe=recipe)
+    ShoppingCartIngredient.objects.rebuild()
+    reconcile()
+    return recipes
+
+
+@pytest.fixture
+def client_for():
+    def make(user=None):
+        client = APIClient()
+        if user is not None:
+            client.force_authenticate(user)
+        return client
+    return make
@@ -0,0 +1,15 @@
+import os
+
+from foodgram.settings import *  # noqa: F401,F403
+
+# Тесты по умолчанию идут на SQLite в памяти; для прогона на PostgreSQL
+# задайте DB_ENGINE и остальные переменные окружения, как для сервера.
+if 'DB_ENGINE' not in os.environ:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': ':memory:',
+        }
+    }
+
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
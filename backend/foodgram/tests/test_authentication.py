@@ -0,0 +1,110 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.authentication import AUTH_VERSION_KEY, ExpiringLRUCache
+from users.models import User
+
+URL = '/api/users/me/'
+
+
+def token_client(user):
+    token = Token.objects.create(user=user)
+    return APIClient(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+
+def jwt_client(user, lifetime=None):
+    token = AccessToken.for_user(user)
+    if lifetime is not None:
+        token.set_exp(lifetime=lifetime)
+    return APIClient(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+
+def user_queries(client):
+    with CaptureQueriesContext(connection) as queries:
+        assert client.get(URL).status_code == 200
+    return [
+        query['sql'] for query in queries
+        if 'authtoken_token' in query['sql']
+        or 'FROM "users_user" WHERE "users_user"."id"' in query['sql']
+    ]
+
+
+def test_cache_hit_skips_user_lookup(users):
+    for client in (token_client(users[0]), jwt_client(users[1])):
+        assert client.get(URL).status_code == 200
+        assert user_queries(client) == []
+
+
+def test_user_change_resets_cache(users):
+    client = token_client(users[0])
+    client.get(URL)
+
+    users[0].first_name = 'Новое'
+    users[0].save()
+
+    assert client.get(URL).json()['first_name'] == 'Новое'
+
+
+def test_logout_revokes_token(users):
+    client = token_client(users[0])
+    client.get(URL)
+
+    assert client.post('/api/auth/token/logout/').status_code == 204
+    assert client.get(URL).status_code == 401
+
+
+def test_inactive_user_rejected(users):
+    clients = [token_client(users[0]), jwt_client(users[0])]
+    for client in clients:
+        client.get(URL)
+
+    users[0].is_active = False
+    users[0].save()
+
+    for client in clients:
+        assert client.get(URL).status_code == 401
+
+
+def test_revocation_in_other_process(users):
+    """
+    Другой процесс выключил пользователя: запись в этом процессе
+    осталась, но версия в общем кэше уже другая.
+    """
+    clients = [token_client(users[0]), jwt_client(users[0])]
+    for client in clients:
+        client.get(URL)
+
+    User.objects.filter(pk=users[0].pk).update(is_active=False)
+    cache.set(AUTH_VERSION_KEY.format(users[0].pk), 'other', timeout=None)
+
+    for client in clients:
+        assert client.get(URL).status_code == 401
+
+
+def test_expired_jwt_rejected_despite_cache(users):
+    assert jwt_client(users[0]).get(URL).status_code == 200
+
+    client = jwt_client(users[0], lifetime=-timedelta(seconds=1))
+    assert client.get(URL).status_code == 401
+    assert APIClient(HTTP_AUTHORIZATION='Bearer x.y.z').get(
+        URL).status_code == 401
+
+
+def test_lru_eviction_and_expiry():
+    credentials = ExpiringLRUCache(2, 60)
+    credentials.set('a', (1,))
+    credentials.set('b', (2,))
+    credentials.get('a')
+    credentials.set('c', (3,))
+    assert credentials.get('b') is None
+    assert credentials.get('a') == (1,)
+
+    credentials = ExpiringLRUCache(2, -1)
+    credentials.set('a', (1,))
+    assert credentials.get('a') is None
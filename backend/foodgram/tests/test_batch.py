@@ -0,0 +1,125 @@
+import pytest
+from django.core.management import call_command
+
+from api import views
+from recipes.models import (Favourite, Recipe, ShoppingCart,
+                            ShoppingCartIngredient)
+
+FAVORITE_BATCH = '/api/recipes/favorite/batch/'
+CART_BATCH = '/api/recipes/shopping_cart/batch/'
+
+
+def statuses(response):
+    return {
+        (row['id'], row['action']): row['status']
+        for row in response.json()['results']
+    }
+
+
+def check_consistency():
+    call_command('rebuild_shopping_lists', '--check')
+    call_command('reconcile_counters', '--check')
+
+
+def test_cart_batch_statuses_and_totals(recipes, users, client_for,
+                                        django_assert_max_num_queries):
+    client = client_for(users[2])
+    payload = {
+        'add': [recipes[5].id, recipes[6].id, recipes[0].id, 999],
+        'remove': [recipes[1].id, recipes[7].id],
+    }
+    with django_assert_max_num_queries(12):
+        response = client.post(CART_BATCH, payload, format='json')
+
+    assert response.status_code == 200, response.content
+    assert statuses(response) == {
+        (recipes[5].id, 'add'): 'added',
+        (recipes[6].id, 'add'): 'added',
+        (recipes[0].id, 'add'): 'exists',
+        (999, 'add'): 'not_found',
+        (recipes[1].id, 'remove'): 'removed',
+        (recipes[7].id, 'remove'): 'absent',
+    }
+    assert set(ShoppingCart.objects.filter(user=users[2]).values_list(
+        'recipe_id', flat=True)) == {
+            recipes[index].id for index in (0, 2, 3, 5, 6)}
+    check_consistency()
+
+
+def test_favorite_batch_counts(recipes, users, client_for):
+    client = client_for(users[2])
+    response = client.post(
+        FAVORITE_BATCH,
+        {'add': [recipes[6].id], 'remove': [recipes[0].id]},
+        format='json'
+    )
+
+    assert statuses(response) == {
+        (recipes[6].id, 'add'): 'added',
+        (recipes[0].id, 'remove'): 'removed',
+    }
+    assert Recipe.objects.get(pk=recipes[6].pk).favorites_count == 1
+    assert Recipe.objects.get(pk=recipes[0].pk).favorites_count == 0
+    check_consistency()
+
+
+@pytest.mark.parametrize('payload', [
+    {},
+    {'add': [], 'remove': []},
+    {'add': [1], 'remove': [1]},
+    {'add': [0]},
+])
+def test_batch_validation(users, client_for, payload):
+    response = client_for(users[2]).post(
+        FAVORITE_BATCH, payload, format='json')
+
+    assert response.status_code == 400
+
+
+def test_batch_requires_authentication(client_for):
+    response = client_for().post(FAVORITE_BATCH, {'add': [1]}, format='json')
+
+    assert response.status_code == 401
+
+
+def test_batch_skips_rows_changed_concurrently(recipes, users, client_for,
+                                               monkeypatch):
+    """
+    Одиночный запрос успевает добавить рецепт между чтением и вставкой
+    пакета: пакет не должен второй раз учесть его ингридиенты и счётчик.
+    """
+    user = users[2]
+    recipe = recipes[6]
+    insert = views.insert_ignore_many
+
+    def insert_after_concurrent_toggle(model, rows, returning):
+        client_for(user).post(f'/api/recipes/{recipe.id}/shopping_cart/')
+        client_for(user).post(f'/api/recipes/{recipe.id}/favorite/')
+        return insert(model, rows, returning)
+
+    monkeypatch.setattr(
+        views, 'insert_ignore_many', insert_after_concurrent_toggle)
+    for url in (CART_BATCH, FAVORITE_BATCH):
+        response = client_for(user).post(
+            url, {'add': [recipe.id]}, format='json')
+        assert statuses(response) == {(recipe.id, 'add'): 'exists'}
+
+    assert Recipe.objects.get(pk=recipe.pk).favorites_count == 1
+    assert Favourite.objects.filter(user=user, recipe=recipe).count() == 1
+    check_consistency()
+
+
+def test_batch_remove_twice_subtracts_once(recipes, users, client_for):
+    client = client_for(users[2])
+    before = dict(ShoppingCartIngredient.objects.filter(
+        user=users[2]).values_list('ingredient_id', 'total_amount'))
+
+    for expected in ('removed', 'absent'):
+        response = client.post(
+            CART_BATCH, {'remove': [recipes[3].id]}, format='json')
+        assert statuses(response) == {(recipes[3].id, 'remove'): expected}
+
+    after = dict(ShoppingCartIngredient.objects.filter(
+        user=users[2]).values_list('ingredient_id', 'total_amount'))
+    assert after != before
+    check_consistency()
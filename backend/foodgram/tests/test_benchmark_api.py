@@ -0,0 +1,22 @@
+import io
+import json
+
+from django.core.management import call_command
+
+
+def test_benchmark_reads_streaming_export(recipes, users, tmp_path):
+    path = tmp_path / 'base.json'
+
+    call_command(
+        'benchmark_api', '--requests', '2', '--warmup', '1',
+        '--user', users[2].email,
+        '--only', 'download_shopping_cart', 'recipe',
+        '--save', str(path), stdout=io.StringIO()
+    )
+
+    results = json.loads(path.read_text(encoding='utf-8'))['results']
+    # Токен уже в кэше после прогрева, ETag берётся из версий в кэше:
+    # единственный запрос - сам список покупок при чтении ответа.
+    assert results['download_shopping_cart']['queries'] == 1
+    assert results['download_shopping_cart']['p95'] > 0
+    assert set(results) == {'download_shopping_cart', 'recipe'}
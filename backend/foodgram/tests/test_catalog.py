@@ -0,0 +1,44 @@
+from django.core.cache import cache
+
+from recipes.catalog import CATALOG_VERSION_KEY, get_catalog
+from recipes.checks import check_shared_cache
+from recipes.models import Ingredient
+
+
+def test_catalog_follows_version_from_another_process(ingredients):
+    catalog = get_catalog()
+    assert get_catalog() is catalog
+
+    # Другой процесс с тем же кэшем добавил ингридиент и сменил версию.
+    Ingredient.objects.bulk_create(
+        [Ingredient(name='новый', measurement_unit='шт')])
+    ingredient = Ingredient.objects.get(name='новый')
+    assert get_catalog().get_ingredient(ingredient.id) is None
+    cache.set(CATALOG_VERSION_KEY, 'other-process', timeout=None)
+
+    assert get_catalog().get_ingredient(ingredient.id).name == 'новый'
+
+
+def test_catalog_endpoints_see_saved_rows(tags, client_for):
+    client = client_for()
+    assert len(client.get('/api/tags/').json()) == 3
+
+    tags[0].name = 'Полдник'
+    tags[0].save()
+    names = [tag['name'] for tag in client.get('/api/tags/').json()]
+    assert 'Полдник' in names
+    assert client.get('/api/recipes/', {'tags': 'nope'}).status_code == 400
+
+
+def test_process_local_cache_warning(settings):
+    settings.DEBUG = False
+    settings.CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+    assert [error.id for error in check_shared_cache(None)] == [
+        'recipes.W001']
+
+    settings.CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+        'LOCATION': 'memcached:11211',
+    }}
+    assert check_shared_cache(None) == []
@@ -0,0 +1,81 @@
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from recipes.models import Favourite, Recipe
+from users.models import User
+
+
+def check_counters():
+    call_command('reconcile_counters', '--check')
+
+
+def test_fixture_counters(recipes, users):
+    check_counters()
+    assert Recipe.objects.get(pk=recipes[0].pk).favorites_count == 1
+    assert User.objects.get(pk=users[0].pk).recipes_count == 4
+
+
+def test_stale_instance_save_keeps_counter(recipes, users, client_for):
+    stale = Recipe.objects.get(pk=recipes[0].pk)
+    client_for(users[0]).post(f'/api/recipes/{recipes[0].id}/favorite/')
+
+    stale.name = 'Новое название'
+    stale.save()
+
+    assert Recipe.objects.get(pk=recipes[0].pk).favorites_count == 2
+    check_counters()
+
+
+def test_recipe_create_and_delete_update_author(recipes, users, tags,
+                                                ingredients, client_for):
+    client = client_for(users[0])
+    response = client.post('/api/recipes/', {
+        'name': 'Сырники',
+        'text': 'Описание',
+        'cooking_time': 5,
+        'tags': [tags[0].id],
+        'ingredients': [{'id': ingredients[0].id, 'amount': 2}],
+    }, format='json')
+    assert response.status_code == 201, response.content
+    assert User.objects.get(pk=users[0].pk).recipes_count == 5
+
+    client.delete(f'/api/recipes/{response.json()["id"]}/')
+    assert User.objects.get(pk=users[0].pk).recipes_count == 4
+    check_counters()
+
+
+def test_subscriptions_update_subscribers_count(users, client_for):
+    client = client_for(users[2])
+    for author in users[:2]:
+        client.post(f'/api/users/{author.id}/subscribe/')
+    client.delete(f'/api/users/{users[0].id}/subscribe/')
+
+    assert User.objects.get(pk=users[0].pk).subscribers_count == 0
+    assert User.objects.get(pk=users[1].pk).subscribers_count == 1
+    check_counters()
+
+
+def test_user_delete_releases_counters(recipes, users, client_for):
+    client_for(users[2]).post(f'/api/users/{users[0].id}/subscribe/')
+
+    users[2].delete()
+
+    assert Recipe.objects.get(pk=recipes[0].pk).favorites_count == 0
+    assert User.objects.get(pk=users[0].pk).subscribers_count == 0
+    check_counters()
+
+
+def test_check_reports_drift_and_reconcile_fixes_it(recipes, users):
+    # Прямая вставка обходит обновление счётчика.
+    Favourite.objects.bulk_create([Favourite(user=users[1],
+                                             recipe=recipes[0])])
+    Recipe.objects.filter(pk=recipes[1].pk).update(favorites_count=9)
+
+    with pytest.raises(CommandError, match='Расхождений: 2'):
+        check_counters()
+    call_command('reconcile_counters')
+
+    check_counters()
+    assert Recipe.objects.get(pk=recipes[0].pk).favorites_count == 2
+    assert Recipe.objects.get(pk=recipes[1].pk).favorites_count == 1
@@ -0,0 +1,93 @@
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+
+from recipes.models import Favourite
+from recipes.signals import create_search_indexes
+
+URL = '/api/recipes/'
+
+
+def names(response):
+    assert response.status_code == 200, response.content
+    return sorted(row['name'] for row in response.json()['results'])
+
+
+def test_any_tag_returns_each_recipe_once(recipes, client_for):
+    ids = []
+    for page in (1, 2):
+        data = client_for().get(URL, {
+            'tags': ['breakfast', 'lunch', 'dinner'], 'page': page}).json()
+        ids.extend(row['id'] for row in data['results'])
+
+    assert data['count'] == 8
+    assert sorted(ids) == sorted(recipe.id for recipe in recipes)
+
+
+@pytest.mark.parametrize('params, expected', [
+    ({'tags': ['lunch', 'dinner']}, [1, 2, 4, 5, 7]),
+    ({'tags': ['lunch', 'dinner'], 'tags_match': 'all'}, [2, 5]),
+    ({'tags': ['lunch'], 'tags_match': 'all'}, [1, 2, 4, 5, 7]),
+])
+def test_tag_match_modes(recipes, client_for, params, expected):
+    response = client_for().get(URL, params)
+
+    assert response.json()['count'] == len(expected)
+    assert names(response) == sorted(
+        f'Рецепт {index}' for index in expected)[:6]
+
+
+@pytest.mark.parametrize('params', [
+    {'tags_match': 'some'},
+    {'tags': 'brunch'},
+])
+def test_invalid_tag_parameters(recipes, client_for, params):
+    assert client_for().get(URL, params).status_code == 400
+
+
+@pytest.mark.parametrize('params, expected', [
+    ({'is_favorited': 1}, [0, 1, 2, 3, 4]),
+    ({'is_favorited': 'false'}, [5, 6, 7]),
+    ({'is_favorited': 'true', 'is_in_shopping_cart': 0}, [4]),
+    ({'is_in_shopping_cart': 1, 'tags': 'dinner'}, [2]),
+])
+def test_user_flag_values(recipes, users, client_for, params, expected):
+    """Рецепты 0-3 в избранном и корзине, рецепт 4 только в избранном."""
+    Favourite.objects.create(user=users[2], recipe=recipes[4])
+
+    response = client_for(users[2]).get(URL, params)
+
+    assert names(response) == [f'Рецепт {index}' for index in expected]
+    assert all(
+        row['is_favorited'] == (row['id'] in {
+            recipe.id for recipe in recipes[:5]})
+        for row in response.json()['results']
+    )
+
+
+@pytest.mark.parametrize('value, count', [(1, 0), (0, 8)])
+def test_user_flag_values_for_anonymous(recipes, client_for, value, count):
+    response = client_for().get(URL, {'is_favorited': value})
+
+    assert response.status_code == 200
+    assert response.json()['count'] == count
+
+
+def test_composite_tag_index(db):
+    create_search_indexes(sender=None)
+
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(
+            cursor, 'recipes_recipe_tags')
+    index = constraints['recipes_recipe_tags_tag_recipe']
+    assert index['columns'] == ['tag_id', 'recipe_id']
+
+
+def test_benchmark_tag_filter(recipes):
+    output = StringIO()
+
+    call_command('benchmark_tag_filter', '--repeat', '1', stdout=output)
+
+    assert 'exists, any' in output.getvalue()
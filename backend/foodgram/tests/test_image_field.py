@@ -0,0 +1,93 @@
+import base64
+import io
+import os
+import tracemalloc
+
+import pytest
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+
+from api.fields import DECODE_CHUNK_SIZE, Base64ImageField
+
+
+def encode(image, file_format='PNG'):
+    buffer = io.BytesIO()
+    image.save(buffer, file_format)
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def noise(width, height):
+    """Шум плохо сжимается, поэтому файл получается крупным."""
+    return Image.frombytes(
+        'RGB', (width, height), os.urandom(width * height * 3))
+
+
+def test_decodes_data_uri_and_unpadded_base64():
+    field = Base64ImageField()
+
+    upload = field.to_internal_value(
+        'data:image/png;base64,' + encode(noise(50, 40)))
+    assert upload.name.endswith('.png')
+    assert Image.open(upload.temporary_file_path()).size == (50, 40)
+
+    upload = field.to_internal_value(
+        encode(noise(30, 20), 'JPEG').rstrip('='))
+    assert upload.name.endswith('.jpg')
+    assert field.to_internal_value('') is None
+
+
+def test_rejects_oversized_payload_before_decoding(monkeypatch):
+    field = Base64ImageField(max_bytes=1000)
+    monkeypatch.setattr(field, 'decode', pytest.fail)
+
+    with pytest.raises(ValidationError, match='1000 байт'):
+        field.to_internal_value(encode(noise(100, 100)))
+
+
+def test_rejects_too_many_pixels_after_first_chunk(monkeypatch):
+    field = Base64ImageField(max_pixels=1000)
+    data = encode(noise(1000, 1000))
+    assert len(data) > 10 * DECODE_CHUNK_SIZE
+    chunks = []
+    write_chunk = field.write_chunk
+    monkeypatch.setattr(
+        field, 'write_chunk',
+        lambda upload, chunk: (chunks.append(chunk),
+                               write_chunk(upload, chunk))
+    )
+
+    with pytest.raises(ValidationError, match='пикселей'):
+        field.to_internal_value(data)
+    assert len(chunks) == 1
+
+
+@pytest.mark.parametrize('data', [
+    base64.b64encode(b'not an image' * 100).decode(),
+    encode(Image.new('RGB', (10, 10)), 'BMP'),
+])
+def test_rejects_invalid_format(data):
+    with pytest.raises(ValidationError, match='Поддерживаются'):
+        Base64ImageField().to_internal_value(data)
+
+
+@pytest.mark.parametrize('data', ['!!!not base64', 42])
+def test_rejects_invalid_base64(data):
+    with pytest.raises(ValidationError, match='base64'):
+        Base64ImageField().to_internal_value(data)
+
+
+def test_peak_memory_is_bounded_by_chunks():
+    """Изображение около 6 МБ декодируется с пиком памяти до 1 МБ."""
+    data = encode(noise(1600, 1200))
+    assert len(data) > 7_000_000
+    field = Base64ImageField()
+
+    tracemalloc.start()
+    try:
+        upload = field.to_internal_value(data)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert upload.size > 5_000_000
+    assert peak < 16 * DECODE_CHUNK_SIZE, peak
@@ -0,0 +1,203 @@
+import base64
+import io
+
+import pytest
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from PIL import Image
+
+from recipes import images
+from recipes.models import Recipe
+
+
+class RecordingExecutor:
+    """Пул без потоков: задачи копятся и выполняются тестом."""
+
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, function, *args):
+        self.jobs.append((function, args))
+
+    def run(self):
+        jobs, self.jobs = self.jobs, []
+        return [function(*args) for function, args in jobs]
+
+
+@pytest.fixture
+def executor(monkeypatch):
+    executor = RecordingExecutor()
+    monkeypatch.setattr(images, 'get_executor', lambda: executor)
+    # Соединение с тестовой БД закрывать нельзя.
+    monkeypatch.setattr(images.connections, 'close_all', lambda: None)
+    return executor
+
+
+def png(width, height, color=(200, 10, 10)):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), color).save(buffer, 'PNG')
+    return ('data:image/png;base64,'
+            + base64.b64encode(buffer.getvalue()).decode())
+
+
+@pytest.fixture
+def create_recipe(users, tags, ingredients, client_for):
+    client = client_for(users[0])
+
+    def create(image):
+        response = client.post('/api/recipes/', {
+            'name': 'Сырники',
+            'text': 'Описание',
+            'cooking_time': 5,
+            'image': image,
+            'tags': [tags[0].id],
+            'ingredients': [{'id': ingredients[0].id, 'amount': 2}],
+        }, format='json')
+        assert response.status_code == 201, response.content
+        return response.json()
+    return create
+
+
+def test_variants_built_in_background(create_recipe, executor, client_for):
+    data = create_recipe(png(1500, 1000))
+    assert data['image_variants'] == {}
+
+    variants, = executor.run()
+    assert set(variants['webp']) == {'320', '640', '1280'}
+    assert set(variants['jpeg']) == {'320', '640', '1280'}
+    with default_storage.open(variants['webp']['320']) as file:
+        assert Image.open(file).size == (320, 213)
+
+    urls = client_for().get(
+        f'/api/recipes/{data["id"]}/').json()['image_variants']
+    assert urls['webp']['320'].startswith(
+        'http://testserver/backend_media/recipes/variants/')
+    assert urls['jpeg']['1280'].endswith('.jpeg')
+
+
+def test_small_image_keeps_own_width(create_recipe, executor):
+    create_recipe(png(200, 100))
+
+    variants, = executor.run()
+
+    assert list(variants['webp']) == ['200']
+
+
+def test_text_edit_keeps_variants(create_recipe, executor, users,
+                                  client_for):
+    recipe_id = create_recipe(png(400, 300))['id']
+    variants, = executor.run()
+
+    client_for(users[0]).patch(
+        f'/api/recipes/{recipe_id}/', {'text': 'Новое'}, format='json')
+
+    assert executor.jobs == []
+    assert Recipe.objects.get(pk=recipe_id).image_variants == variants
+
+
+def test_new_image_hides_stale_variants(create_recipe, executor, users,
+                                        client_for):
+    recipe_id = create_recipe(png(400, 300))['id']
+    executor.run()
+
+    response = client_for(users[0]).patch(
+        f'/api/recipes/{recipe_id}/', {'image': png(100, 50)}, format='json')
+
+    assert response.json()['image_variants'] == {}
+    variants, = executor.run()
+    assert list(variants['webp']) == ['100']
+
+
+def test_backfill_command(create_recipe, executor):
+    recipe_id = create_recipe(png(400, 300))['id']
+    executor.jobs.clear()
+
+    call_command('build_image_variants', '--workers', '1')
+
+    recipe = Recipe.objects.get(pk=recipe_id)
+    assert recipe.image_variants['source'] == recipe.image.name
+    assert set(recipe.image_variants['webp']) == {'320'}
+
+
+def stored_names(directory='recipes'):
+    directories, files = default_storage.listdir(directory)
+    names = {f'{directory}/{name}' for name in files}
+    for name in directories:
+        names |= stored_names(f'{directory}/{name}')
+    return names
+
+
+def collect(*args):
+    call_command('collect_orphan_images', '--min-age-hours', '0', *args,
+                 stdout=io.StringIO())
+
+
+def test_identical_uploads_share_one_file(create_recipe, executor):
+    image = png(400, 300)
+    first, second = create_recipe(image), create_recipe(image)
+
+    names = {
+        Recipe.objects.get(pk=data['id']).image.name
+        for data in (first, second)
+    }
+    variants = executor.run()
+
+    name, = names
+    assert name in stored_names()
+    assert len(stored_names() - stored_names('recipes/variants')) == 1
+    assert variants[0] == variants[1]
+
+
+def test_collect_keeps_files_referenced_by_any_recipe(
+        create_recipe, executor, users, client_for):
+    image = png(400, 300)
+    first, second = create_recipe(image), create_recipe(image)
+    variants = executor.run()[0]
+    shared = stored_names()
+    client = client_for(users[0])
+
+    client.patch(f'/api/recipes/{first["id"]}/', {'image': png(100, 50)},
+                 format='json')
+    executor.run()
+    collect()
+    assert shared <= stored_names()
+
+    client.patch(f'/api/recipes/{second["id"]}/', {'image': png(100, 50)},
+                 format='json')
+    executor.run()
+    collect()
+    assert not shared & stored_names()
+    assert not default_storage.exists(variants['webp']['320'])
+    for data in (first, second):
+        recipe = Recipe.objects.get(pk=data['id'])
+        assert default_storage.exists(recipe.image.name)
+        assert default_storage.exists(recipe.image_variants['webp']['100'])
+    collect('--check')
+
+
+def test_check_deletes_nothing(create_recipe, executor, users, client_for):
+    recipe_id = create_recipe(png(400, 300))['id']
+    executor.run()
+    client_for(users[0]).patch(
+        f'/api/recipes/{recipe_id}/', {'image': png(100, 50)}, format='json')
+    executor.run()
+    before = stored_names()
+
+    with pytest.raises(CommandError, match='Файлов без ссылок: 3'):
+        collect('--check')
+
+    assert stored_names() == before
+
+
+def test_collect_skips_recent_files(create_recipe, executor, users,
+                                    client_for):
+    recipe_id = create_recipe(png(400, 300))['id']
+    executor.run()
+    client_for(users[0]).patch(
+        f'/api/recipes/{recipe_id}/', {'image': png(100, 50)}, format='json')
+    before = stored_names()
+
+    call_command('collect_orphan_images', stdout=io.StringIO())
+
+    assert stored_names() == before
@@ -0,0 +1,39 @@
+import pytest
+
+from recipes.models import Ingredient
+
+URL = '/api/ingredients/'
+
+
+@pytest.fixture
+def autocomplete(ingredients):
+    Ingredient.objects.bulk_create([
+        Ingredient(name=name, measurement_unit='г')
+        for name in ('сахар', 'сахарная пудра', 'ванильный сахар', 'соль')
+    ])
+
+
+def names(response):
+    assert response.status_code == 200, response.content
+    return [row['name'] for row in response.json()]
+
+
+def test_full_list_without_parameters(autocomplete, client_for):
+    assert len(names(client_for().get(URL))) == 10
+
+
+def test_limit_without_name(autocomplete, client_for):
+    assert names(client_for().get(URL, {'limit': 2})) == [
+        'ванильный сахар', 'ингридиент 0']
+
+
+def test_prefix_matches_first(autocomplete, client_for):
+    assert names(client_for().get(URL, {'name': 'сах'})) == [
+        'сахар', 'сахарная пудра', 'ванильный сахар']
+    assert names(client_for().get(URL, {'name': 'Сах', 'limit': 1})) == [
+        'сахар']
+
+
+def test_invalid_limit_falls_back_to_default(autocomplete, client_for):
+    assert len(names(client_for().get(URL, {'limit': 'abc'}))) == 10
+    assert len(names(client_for().get(URL, {'limit': 0}))) == 1
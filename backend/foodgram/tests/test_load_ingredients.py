@@ -0,0 +1,56 @@
+import json
+
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from recipes import search
+from recipes.catalog import get_catalog
+from recipes.models import Ingredient
+
+
+def test_load_bundled_catalog(db):
+    call_command('load_ingredients', '--dry-run')
+    assert not Ingredient.objects.exists()
+
+    call_command('load_ingredients')
+    count = Ingredient.objects.count()
+    assert count > 2000
+    assert len(get_catalog().ingredients) == count
+
+    call_command('load_ingredients')
+    assert Ingredient.objects.count() == count
+
+
+def test_load_path_from_setting(db, settings, tmp_path):
+    path = tmp_path / 'ingredients.json'
+    path.write_text(json.dumps([
+        {'name': ' соль ', 'measurement_unit': 'г'},
+        {'name': 'мука', 'measurement_unit': 'кг'},
+    ]), encoding='utf-8')
+    settings.INGREDIENTS_PATH = str(path)
+
+    call_command('load_ingredients')
+
+    assert set(Ingredient.objects.values_list('name', flat=True)) == {
+        'соль', 'мука'}
+
+
+def test_load_missing_file(db, tmp_path):
+    with pytest.raises(CommandError):
+        call_command('load_ingredients', str(tmp_path / 'missing.csv'))
+
+
+def test_upsert_reindexes_renamed_ingredients(recipes, ingredients, tmp_path,
+                                              monkeypatch):
+    """Ингридиент 3 есть только в рецептах 3 и 7."""
+    reindexed = []
+    monkeypatch.setattr(search, 'update_search_index', reindexed.extend)
+    path = tmp_path / 'ingredients.csv'
+    path.write_text('ИНГРИДИЕНТ 3,г\nсоль,г\n', encoding='utf-8')
+
+    call_command('load_ingredients', str(path), '--upsert')
+
+    assert get_catalog().get_ingredient(ingredients[3].id).name == (
+        'ИНГРИДИЕНТ 3')
+    assert sorted(reindexed) == [recipes[3].id, recipes[7].id]
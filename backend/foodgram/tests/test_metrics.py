@@ -0,0 +1,59 @@
+import re
+
+import pytest
+
+from api.metrics import registry
+
+
+@pytest.fixture
+def sampled(settings):
+    settings.REQUEST_METRICS_SAMPLE_RATE = 1
+    settings.METRICS_TOKEN = ''
+    registry.reset()
+
+
+def server_timing(response):
+    return {
+        name: float(duration)
+        for name, duration in re.findall(
+            r'(\w+);dur=([\d.]+)', response['Server-Timing'])
+    }
+
+
+def test_server_timing_splits_serializer_time(sampled, recipes, users,
+                                              client_for):
+    response = client_for(users[2]).get('/api/recipes/')
+
+    timing = server_timing(response)
+    assert set(timing) == {'total', 'db', 'serializer', 'app', 'render'}
+    assert timing['serializer'] > 0
+    assert (timing['db'] + timing['serializer'] + timing['app']
+            + timing['render']) <= timing['total'] + 0.5
+
+
+def test_nested_serializers_are_counted_once(sampled, recipes, users,
+                                             client_for):
+    """Подписки сериализуют вложенные рецепты внутри внешнего вызова."""
+    client = client_for(users[2])
+    client.post(f'/api/users/{users[0].id}/subscribe/')
+
+    timing = server_timing(client.get('/api/users/subscriptions/'))
+    assert 0 < timing['serializer'] <= timing['total'] - timing['db']
+
+
+def test_metrics_export_serializer_time(sampled, recipes, client_for):
+    client_for().get('/api/recipes/')
+
+    body = client_for().get('/metrics').content.decode()
+    match = re.search(
+        r'foodgram_serializer_duration_seconds_total'
+        r'\{view="api:recipes-list",method="GET"\} ([\d.]+)', body)
+    assert match and float(match.group(1)) > 0
+
+
+def test_unsampled_requests_report_only_total(settings, recipes, client_for):
+    settings.REQUEST_METRICS_SAMPLE_RATE = 0
+
+    response = client_for().get('/api/recipes/')
+
+    assert set(server_timing(response)) == {'total'}
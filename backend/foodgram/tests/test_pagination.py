@@ -0,0 +1,75 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import Subscription
+from users.models import User
+
+RECIPES_URL = '/api/recipes/'
+SUBSCRIPTIONS_URL = '/api/users/subscriptions/'
+
+
+def names(data, field='name'):
+    return [row[field] for row in data['results']]
+
+
+def test_recipe_cursor_pages_without_count_and_offset(recipes, client_for):
+    client = client_for()
+    first = client.get(RECIPES_URL, {'pagination': 'cursor'}).json()
+
+    assert 'count' not in first
+    assert names(first) == [f'Рецепт {index}' for index in range(7, 1, -1)]
+    with CaptureQueriesContext(connection) as queries:
+        second = client.get(first['next']).json()
+    assert not any(
+        'COUNT' in query['sql'] or 'OFFSET' in query['sql']
+        for query in queries
+    )
+    assert names(second) == ['Рецепт 1', 'Рецепт 0']
+    assert second['next'] is None
+    assert second['previous']
+
+
+def test_cursor_keeps_filters(recipes, client_for):
+    data = client_for().get(
+        RECIPES_URL, {'pagination': 'cursor', 'tags': 'dinner'}).json()
+
+    assert names(data) == ['Рецепт 5', 'Рецепт 2']
+
+
+def test_count_estimate_only_on_postgresql(recipes, client_for):
+    data = client_for().get(
+        RECIPES_URL, {'pagination': 'cursor', 'count': 'estimate'}).json()
+
+    assert 'count' not in data
+    assert len(data['results']) == 6
+
+
+def test_page_numbers_by_default_and_for_other_orderings(recipes,
+                                                         client_for):
+    client = client_for()
+
+    assert client.get(RECIPES_URL).json()['count'] == 8
+    data = client.get(
+        RECIPES_URL, {'pagination': 'cursor', 'ordering': 'popular'}).json()
+    assert data['count'] == 8
+    assert 'page=2' in data['next']
+
+
+def test_subscription_cursor(recipes, users, client_for):
+    User.objects.bulk_create(
+        User(username=f'author{index}', email=f'author{index}@foodgram.ru')
+        for index in range(6)
+    )
+    authors = list(User.objects.filter(username__startswith='author'))
+    for author in users[:2] + authors:
+        Subscription.objects.create(user=users[2], subscribing=author)
+    client = client_for(users[2])
+
+    first = client.get(SUBSCRIPTIONS_URL, {'pagination': 'cursor'}).json()
+    second = client.get(first['next']).json()
+
+    assert 'count' not in first
+    assert names(first, 'username') == [
+        f'author{index}' for index in range(5, -1, -1)]
+    assert names(second, 'username') == ['user1', 'user0']
+    assert second['results'][0]['recipes_count'] == 4
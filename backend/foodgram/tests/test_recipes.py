@@ -0,0 +1,84 @@
+import pytest
+
+from recipes import catalog
+from recipes.catalog import get_catalog
+
+LIST_QUERIES = 4
+DETAIL_QUERIES = 3
+
+
+@pytest.fixture
+def warm_catalog(recipes):
+    """Справочник в памяти загружен, кэш ответов пуст."""
+    get_catalog()
+
+
+@pytest.mark.parametrize('viewer', [None, 2])
+def test_recipe_list_query_budget(warm_catalog, users, client_for,
+                                  django_assert_max_num_queries, viewer):
+    client = client_for(None if viewer is None else users[viewer])
+    with django_assert_max_num_queries(LIST_QUERIES):
+        response = client.get('/api/recipes/')
+
+    assert response.status_code == 200
+    assert response.json()['count'] == 8
+    assert len(response.json()['results']) == 6
+
+
+@pytest.mark.parametrize('viewer', [None, 2])
+def test_recipe_detail_query_budget(warm_catalog, recipes, users, client_for,
+                                    django_assert_max_num_queries, viewer):
+    client = client_for(None if viewer is None else users[viewer])
+    with django_assert_max_num_queries(DETAIL_QUERIES):
+        response = client.get(f'/api/recipes/{recipes[3].id}/')
+
+    assert response.status_code == 200
+    assert len(response.json()['ingredients']) == 4
+
+
+def test_recipe_list_budget_does_not_grow_with_page(
+        warm_catalog, users, client_for, django_assert_max_num_queries):
+    client = client_for(users[2])
+    for page, size in ((1, 6), (2, 2)):
+        with django_assert_max_num_queries(LIST_QUERIES):
+            response = client.get('/api/recipes/', {'page': page})
+        assert len(response.json()['results']) == size
+
+
+def test_recipe_detail_content(warm_catalog, recipes, users, ingredients,
+                               client_for):
+    data = client_for(users[2]).get(f'/api/recipes/{recipes[0].id}/').json()
+
+    assert data['is_favorited'] is True
+    assert data['is_in_shopping_cart'] is True
+    assert data['author']['username'] == 'user0'
+    assert [tag['slug'] for tag in data['tags']] == ['breakfast']
+    assert data['ingredients'] == [{
+        'id': ingredients[0].id,
+        'name': 'ингридиент 0',
+        'measurement_unit': 'г',
+        'amount': 1,
+    }]
+
+    anonymous = client_for().get(f'/api/recipes/{recipes[0].id}/').json()
+    assert anonymous['is_favorited'] is False
+    assert anonymous['is_in_shopping_cart'] is False
+
+
+def test_catalog_version_read_once_per_request(warm_catalog, users,
+                                               client_for, monkeypatch):
+    """Версия справочника читается из кэша один раз на всю страницу."""
+    reads = []
+    get = catalog.cache.get
+
+    def recording_get(key, *args, **kwargs):
+        if key == catalog.CATALOG_VERSION_KEY:
+            reads.append(key)
+        return get(key, *args, **kwargs)
+
+    monkeypatch.setattr(catalog.cache, 'get', recording_get)
+
+    response = client_for(users[2]).get('/api/recipes/')
+
+    assert len(response.json()['results']) == 6
+    assert reads == [catalog.CATALOG_VERSION_KEY]
@@ -0,0 +1,127 @@
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.cache import RECIPE_VERSION_KEY
+from recipes.models import Favourite, IngredientAmount
+
+LIST_URL = '/api/recipes/'
+
+
+def get(client, url, django_assert_num_queries, queries, **kwargs):
+    with django_assert_num_queries(queries):
+        return client.get(url, **kwargs)
+
+
+def flags(response):
+    data = response.json()
+    rows = data['results'] if 'results' in data else [data]
+    return [(row['is_favorited'], row['is_in_shopping_cart']) for row in rows]
+
+
+def test_anonymous_list_served_from_cache(recipes, client_for,
+                                          django_assert_num_queries):
+    client = client_for()
+    first = client.get(LIST_URL, {'page': 1, 'tags': ['lunch', 'dinner']})
+
+    # Порядок параметров не влияет на ключ.
+    second = get(client, LIST_URL + '?tags=dinner&tags=lunch&page=1',
+                 django_assert_num_queries, 0)
+    assert second.json() == first.json()
+    assert second['ETag'] == first['ETag']
+    assert 'Authorization' in second['Vary']
+    assert 'Last-Modified' in second
+
+    response = get(client, LIST_URL + '?tags=dinner&tags=lunch&page=1',
+                   django_assert_num_queries, 0,
+                   HTTP_IF_NONE_MATCH=first['ETag'])
+    assert response.status_code == 304
+
+
+def test_list_invalidated_by_recipe_save(recipes, client_for):
+    client = client_for()
+    etag = client.get(LIST_URL)['ETag']
+
+    recipes[7].name = 'Новое название'
+    recipes[7].save()
+    response = client.get(LIST_URL, HTTP_IF_NONE_MATCH=etag)
+
+    assert response.status_code == 200
+    assert response.json()['results'][0]['name'] == 'Новое название'
+
+
+def test_detail_invalidated_by_ingredients_and_tags(recipes, tags,
+                                                    client_for):
+    client = client_for()
+    url = f'{LIST_URL}{recipes[0].id}/'
+    client.get(url)
+
+    amount = IngredientAmount.objects.get(recipe=recipes[0])
+    amount.amount = 77
+    amount.save()
+    assert client.get(url).json()['ingredients'][0]['amount'] == 77
+
+    tags[0].name = 'Бранч'
+    tags[0].save()
+    assert client.get(url).json()['tags'][0]['name'] == 'Бранч'
+
+    recipes[0].tags.clear()
+    assert client.get(url).json()['tags'] == []
+
+
+@pytest.mark.parametrize('warm_viewer', [None, 0, 2])
+def test_user_flags_never_leak(recipes, users, client_for, warm_viewer):
+    """Третий пользователь добавил рецепты 0-3 в избранное и корзину."""
+    url = f'{LIST_URL}{recipes[0].id}/'
+    client_for(
+        None if warm_viewer is None else users[warm_viewer]).get(url)
+    client_for(
+        None if warm_viewer is None else users[warm_viewer]).get(LIST_URL)
+
+    for viewer, expected in ((None, False), (0, False), (2, True)):
+        client = client_for(None if viewer is None else users[viewer])
+        assert flags(client.get(url)) == [(expected, expected)]
+        assert flags(client.get(LIST_URL)) == [(False, False)] * 4 + [
+            (expected, expected)] * 2
+
+
+def test_authenticated_etag_follows_flags(recipes, users, client_for,
+                                          django_assert_num_queries):
+    client = client_for(users[2])
+    url = f'{LIST_URL}{recipes[0].id}/'
+    response = client.get(url)
+    assert 'Last-Modified' not in response
+
+    # Из кэша: один запрос за флагами пользователя.
+    cached = get(client, url, django_assert_num_queries, 1,
+                 HTTP_IF_NONE_MATCH=response['ETag'])
+    assert cached.status_code == 304
+
+    Favourite.objects.filter(user=users[2], recipe=recipes[0]).delete()
+    response = client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+    assert response.status_code == 200
+    assert flags(response) == [(False, True)]
+
+
+def test_user_filters_bypass_cache(recipes, users, client_for):
+    client = client_for(users[2])
+    client.get(LIST_URL, {'is_favorited': 1})
+
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(LIST_URL, {'is_favorited': 1})
+    assert response.json()['count'] == 4
+    assert len(queries) > 1
+
+
+@pytest.mark.parametrize('pk', ['abc', '1%20', '01', '1' * 300, '0', '-1'])
+def test_invalid_pk_is_not_found(recipes, client_for, pk):
+    assert client_for().get(f'{LIST_URL}{pk}/').status_code == 404
+
+
+def test_missing_recipe_leaves_no_version(recipes, client_for):
+    assert client_for().get(f'{LIST_URL}999/').status_code == 404
+    assert cache.get(RECIPE_VERSION_KEY.format(999)) is None
+
+    client_for().get(f'{LIST_URL}{recipes[0].id}/')
+    assert cache.get(RECIPE_VERSION_KEY.format(recipes[0].id)) is not None
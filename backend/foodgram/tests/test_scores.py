@@ -0,0 +1,83 @@
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from recipes.models import Favourite, Recipe, ShoppingCart
+
+URL = '/api/recipes/'
+
+
+@pytest.fixture
+def scored(recipes, users):
+    """
+    Рецепт 6 трижды добавлен сейчас; у рецептов 0-3 по два события
+    третьего пользователя, у рецепта 0 они месячной давности, у
+    рецепта 1 избранное - трёхдневной.
+    """
+    Favourite.objects.create(user=users[0], recipe=recipes[6])
+    Favourite.objects.create(user=users[1], recipe=recipes[6])
+    ShoppingCart.objects.create(user=users[1], recipe=recipes[6])
+    now = timezone.now()
+    for model in (Favourite, ShoppingCart):
+        model.objects.filter(recipe=recipes[0]).update(
+            created=now - timedelta(days=30))
+    Favourite.objects.filter(recipe=recipes[1]).update(
+        created=now - timedelta(days=3))
+    call_command('update_recipe_scores', stdout=StringIO())
+    return recipes
+
+
+def names(response):
+    return [row['name'] for row in response.json()['results']]
+
+
+def score(recipe, field):
+    return getattr(Recipe.objects.get(pk=recipe.pk), field)
+
+
+def test_popular_ordering(scored, client_for):
+    response = client_for().get(URL, {'ordering': 'popular'})
+
+    assert names(response) == [
+        'Рецепт 6', 'Рецепт 3', 'Рецепт 2', 'Рецепт 1', 'Рецепт 0',
+        'Рецепт 7']
+
+
+def test_trending_scores_decay(scored, client_for):
+    assert score(scored[0], 'trending_score') == 0
+    assert (score(scored[1], 'trending_score')
+            < score(scored[2], 'trending_score')
+            < score(scored[6], 'trending_score'))
+
+    with CaptureQueriesContext(connection) as queries:
+        response = client_for().get(URL, {'ordering': 'trending'})
+    assert names(response)[0] == 'Рецепт 6'
+    assert not any(
+        'recipes_favourite' in query['sql'] for query in queries)
+
+
+def test_rerun_resets_expired_trending(scored, client_for):
+    client = client_for()
+    assert names(client.get(URL, {'ordering': 'popular'}))[0] == 'Рецепт 6'
+    Favourite.objects.filter(recipe=scored[6]).delete()
+    ShoppingCart.objects.filter(recipe=scored[6]).update(
+        created=timezone.now() - timedelta(days=30))
+
+    call_command('update_recipe_scores', stdout=StringIO())
+
+    assert score(scored[6], 'trending_score') == 0
+    assert score(scored[6], 'popular_score') == 1
+    # Закэшированные страницы сброшены вместе с рейтингом.
+    assert names(client.get(URL, {'ordering': 'popular'}))[0] == 'Рецепт 3'
+
+
+def test_invalid_arguments(recipes, client_for):
+    with pytest.raises(CommandError):
+        call_command('update_recipe_scores', '--half-life-hours', '0')
+    assert client_for().get(URL, {'ordering': 'newest'}).status_code == 400
@@ -0,0 +1,86 @@
+import pytest
+
+from recipes.models import Ingredient, IngredientAmount
+
+URL = '/api/recipes/'
+
+
+@pytest.fixture
+def borscht(recipes):
+    """
+    Борщ в названии рецепта 0, в тексте рецептов 1 и 2.
+    Рецепт 2 - единственный из них с тегом dinner.
+    """
+    recipes[0].name = 'Борщ'
+    recipes[0].text = 'Свекла и капуста'
+    for recipe in recipes[1:3]:
+        recipe.text = 'Почти как борщ'
+    for recipe in recipes[:3]:
+        recipe.save()
+    return recipes
+
+
+def ids(client, **params):
+    response = client.get(URL, params)
+    assert response.status_code == 200, response.content
+    return [row['id'] for row in response.json()['results']]
+
+
+def test_name_match_ranks_first(borscht, client_for):
+    client = client_for()
+
+    for query in ('борщ', 'БОР'):
+        found = ids(client, search=query)
+        assert found[0] == borscht[0].id
+        assert sorted(found[1:]) == [borscht[1].id, borscht[2].id]
+    assert ids(client, search='борщ свекла') == [borscht[0].id]
+
+
+def test_search_with_tags(borscht, client_for):
+    assert ids(client_for(), search='борщ', tags='dinner') == [
+        borscht[2].id]
+    assert sorted(ids(client_for(), search='борщ', tags='lunch')) == [
+        borscht[1].id, borscht[2].id]
+
+
+def test_reindex_after_recipe_edit(borscht, users, client_for):
+    client_for(users[1]).patch(
+        f'{URL}{borscht[1].id}/', {'text': 'Уха'}, format='json')
+
+    assert ids(client_for(), search='борщ') == [
+        borscht[0].id, borscht[2].id]
+    assert ids(client_for(), search='уха') == [borscht[1].id]
+
+
+def test_reindex_after_ingredient_changes(recipes, client_for):
+    ingredient = Ingredient.objects.create(
+        name='картофель', measurement_unit='г')
+    IngredientAmount.objects.create(
+        recipe=recipes[5], ingredient=ingredient, amount=1)
+    assert ids(client_for(), search='картоф') == [recipes[5].id]
+
+    ingredient.name = 'батат'
+    ingredient.save()
+    assert ids(client_for(), search='картоф') == []
+    assert ids(client_for(), search='батат') == [recipes[5].id]
+
+    recipes[5].delete()
+    assert ids(client_for(), search='батат') == []
+
+
+def test_search_falls_back_to_page_pagination(borscht, client_for):
+    data = client_for().get(
+        URL, {'search': 'рецепт', 'pagination': 'cursor'}).json()
+
+    assert data['count'] == 7
+    assert 'page=2' in data['next']
+
+
+def test_ordering_overrides_rank(borscht, client_for):
+    assert ids(client_for(), search='борщ', ordering='popular') == [
+        borscht[2].id, borscht[1].id, borscht[0].id]
+
+
+@pytest.mark.parametrize('query', ['!!!', '"', 'борщ"'])
+def test_odd_queries(borscht, client_for, query):
+    assert client_for().get(URL, {'search': query}).status_code == 200
@@ -0,0 +1,94 @@
+import pytest
+
+from api.renderers import ShoppingListRenderer
+from recipes.models import ShoppingCartIngredient
+
+URL = '/api/recipes/download_shopping_cart/'
+
+
+def download(client, url=URL, **headers):
+    response = client.get(url, **headers)
+    if response.streaming:
+        return response, b''.join(response.streaming_content)
+    return response, response.content
+
+
+def test_download_formats(recipes, users, client_for):
+    client = client_for(users[2])
+
+    response, body = download(client)
+    assert response['Content-Type'] == 'text/plain; charset=utf-8'
+    assert body.decode().splitlines() == [
+        'ингридиент 0(г) - 4',
+        'ингридиент 1(г) - 6',
+        'ингридиент 2(г) - 6',
+        'ингридиент 3(г) - 4',
+    ]
+
+    response, body = download(client, URL + '?format=csv')
+    assert response['Content-Disposition'] == (
+        'attachment; filename="shopping_list.csv"')
+    assert 'ингридиент 0,г,4' in body.decode('utf-8-sig')
+
+    response, body = download(client, URL + '?format=pdf')
+    assert response['Content-Type'] == 'application/pdf'
+    assert body.startswith(b'%PDF')
+
+    assert download(client, URL + '?format=xml')[0].status_code == 404
+    assert download(client_for())[0].status_code == 401
+
+
+def test_download_etag_without_queries(recipes, users, client_for,
+                                       django_assert_num_queries):
+    client = client_for(users[2])
+    etag = download(client)[0]['ETag']
+
+    with django_assert_num_queries(0):
+        response, _ = download(client, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+    assert download(client, URL + '?format=csv')[0]['ETag'] != etag
+
+
+def test_download_etag_changes_with_equal_sums(recipes, users, ingredients,
+                                               client_for):
+    """
+    Итоги (1, 3, 1) и (2, 1, 2) совпадают по числу строк, сумме и
+    взвешенной сумме, но это разные списки.
+    """
+    user = users[0]
+    client = client_for(user)
+    first, second, third = (ingredient.id for ingredient in ingredients[:3])
+    ShoppingCartIngredient.objects.apply_changes(
+        [user.id], {first: 1, second: 3, third: 1})
+    etag = download(client)[0]['ETag']
+
+    ShoppingCartIngredient.objects.apply_changes(
+        [user.id], {first: 1, second: -2, third: 1})
+    response, body = download(client, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert 'ингридиент 1(г) - 1' in body.decode()
+
+
+def test_download_etag_changes_on_ingredient_rename(
+        recipes, users, ingredients, client_for):
+    client = client_for(users[2])
+    etag = download(client)[0]['ETag']
+
+    ingredients[0].measurement_unit = 'кг'
+    ingredients[0].save()
+    response, body = download(client, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert 'ингридиент 0(кг) - 4' in body.decode()
+
+
+def test_download_etag_changes_with_cart(recipes, users, client_for):
+    client = client_for(users[2])
+    etag = download(client)[0]['ETag']
+
+    client.post(f'/api/recipes/{recipes[5].id}/shopping_cart/')
+    assert download(client, HTTP_IF_NONE_MATCH=etag)[0].status_code == 200
+
+
+def test_shopping_list_renderer_is_abstract():
+    with pytest.raises(TypeError):
+        ShoppingListRenderer()
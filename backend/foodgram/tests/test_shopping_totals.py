@@ -0,0 +1,162 @@
+import pytest
+from django.core.management import call_command
+from django.core.cache import cache
+from django.core.management.base import CommandError
+
+from recipes.catalog import CATALOG_VERSION_KEY, get_catalog
+from recipes.models import (IngredientAmount, ShoppingCart,
+                            ShoppingCartIngredient)
+from recipes.signals import backfill_shopping_lists
+
+
+def stored_totals(user):
+    return dict(
+        ShoppingCartIngredient.objects.filter(user=user).values_list(
+            'ingredient_id', 'total_amount')
+    )
+
+
+@pytest.fixture
+def shared_recipe(recipes, users):
+    """Рецепт 0 (1 г первого ингридиента) в корзинах всех трёх."""
+    for user in users[:2]:
+        ShoppingCart.objects.create(user=user, recipe=recipes[0])
+    ShoppingCartIngredient.objects.rebuild()
+    return recipes[0]
+
+
+def test_shopping_totals_do_not_multiply_by_carts(shared_recipe, users,
+                                                  ingredients):
+    totals = list(IngredientAmount.objects.shopping_totals([users[0].id]))
+
+    assert totals == [(users[0].id, ingredients[0].id, 1)]
+
+
+def test_rebuild_for_user_with_shared_recipe(shared_recipe, users,
+                                             ingredients):
+    ShoppingCartIngredient.objects.rebuild([users[0].id])
+
+    assert stored_totals(users[0]) == {ingredients[0].id: 1}
+    assert stored_totals(users[2])[ingredients[0].id] == 4
+    call_command('rebuild_shopping_lists', '--check')
+
+
+def test_check_finds_drift_for_one_user(shared_recipe, users):
+    ShoppingCartIngredient.objects.filter(user=users[0]).update(
+        total_amount=3)
+
+    with pytest.raises(CommandError):
+        call_command('rebuild_shopping_lists', '--check',
+                     '--user', str(users[0].id))
+    call_command('rebuild_shopping_lists', '--user', str(users[0].id))
+    call_command('rebuild_shopping_lists', '--check')
+
+
+def test_apply_changes_upserts_and_drops_empty_rows(users, ingredients):
+    user = users[0].id
+    first, second = ingredients[0].id, ingredients[1].id
+    manager = ShoppingCartIngredient.objects
+
+    manager.apply_changes([user], {first: 2})
+    manager.apply_changes([user], {first: 3, second: 1})
+    assert stored_totals(user) == {first: 5, second: 1}
+
+    manager.apply_changes([user], {first: -5, second: 0})
+    assert stored_totals(user) == {second: 1}
+
+    manager.apply_changes([user], {ingredients[2].id: -1})
+    assert stored_totals(user) == {second: 1}
+
+
+def test_recipe_edit_updates_every_cart(shared_recipe, users, ingredients,
+                                        client_for):
+    response = client_for(users[0]).patch(
+        f'/api/recipes/{shared_recipe.id}/',
+        {'ingredients': [{'id': ingredients[5].id, 'amount': 7}]},
+        format='json'
+    )
+
+    assert response.status_code == 200, response.content
+    for user in users:
+        assert stored_totals(user)[ingredients[5].id] == 7
+    call_command('rebuild_shopping_lists', '--check')
+
+
+def recipe_rows(recipe):
+    return {
+        row.ingredient_id: (row.id, row.amount)
+        for row in IngredientAmount.objects.filter(recipe=recipe)
+    }
+
+
+def test_recipe_edit_writes_only_the_difference(recipes, users, ingredients,
+                                                client_for):
+    """Рецепт 3: ингридиенты 0-3 по 1-4 г, он в корзине user2."""
+    recipe = recipes[3]
+    before = recipe_rows(recipe)
+    first, second, fifth = (ingredients[index].id for index in (0, 1, 4))
+
+    response = client_for(users[1]).patch(
+        f'/api/recipes/{recipe.id}/',
+        {'ingredients': [
+            {'id': first, 'amount': 1},
+            {'id': second, 'amount': 5},
+            {'id': fifth, 'amount': 2},
+        ]},
+        format='json'
+    )
+
+    assert response.status_code == 200, response.content
+    after = recipe_rows(recipe)
+    assert set(after) == {first, second, fifth}
+    assert after[first] == before[first]
+    assert after[second] == (before[second][0], 5)
+    assert stored_totals(users[2])[fifth] == 2
+    assert ingredients[3].id not in stored_totals(users[2])
+    call_command('rebuild_shopping_lists', '--check')
+
+
+def test_edit_of_recipe_outside_carts(recipes, users, ingredients,
+                                      client_for):
+    expected = stored_totals(users[2])
+
+    response = client_for(users[1]).patch(
+        f'/api/recipes/{recipes[5].id}/',
+        {'ingredients': [{'id': ingredients[5].id, 'amount': 3}]},
+        format='json'
+    )
+
+    assert response.status_code == 200, response.content
+    assert stored_totals(users[2]) == expected
+    call_command('rebuild_shopping_lists', '--check')
+
+
+def test_ingredient_missing_from_stale_catalog(recipes, users, ingredients,
+                                               client_for):
+    """Ингридиент удалён, а снимок справочника ещё старый: ответ 400."""
+    recipe = recipes[3]
+    before = recipe_rows(recipe)
+    deleted = ingredients[5].id
+    version = get_catalog().version
+    ingredients[5].delete()
+    cache.set(CATALOG_VERSION_KEY, version, timeout=None)
+
+    response = client_for(users[1]).patch(
+        f'/api/recipes/{recipe.id}/',
+        {'ingredients': [{'id': deleted, 'amount': 3}]},
+        format='json'
+    )
+
+    assert response.status_code == 400
+    assert str(deleted) in str(response.json()['ingredients'])
+    assert recipe_rows(recipe) == before
+    call_command('rebuild_shopping_lists', '--check')
+
+
+def test_backfill_after_migrate(recipes, users):
+    expected = stored_totals(users[2])
+    ShoppingCartIngredient.objects.all().delete()
+
+    backfill_shopping_lists(sender=None)
+
+    assert stored_totals(users[2]) == expected
@@ -0,0 +1,46 @@
+import pytest
+
+from recipes.models import Subscription
+
+URL = '/api/users/subscriptions/'
+FEED_QUERIES = 3
+
+
+@pytest.fixture
+def subscriber(recipes, users):
+    """Третий пользователь подписан на авторов всех рецептов."""
+    for author in users[:2]:
+        Subscription.objects.create(user=users[2], subscribing=author)
+    return users[2]
+
+
+def test_feed_query_budget(subscriber, client_for,
+                           django_assert_max_num_queries):
+    with django_assert_max_num_queries(FEED_QUERIES):
+        response = client_for(subscriber).get(URL, {'recipes_limit': 2})
+
+    assert response.status_code == 200, response.content
+    results = response.json()['results']
+    assert [row['username'] for row in results] == ['user1', 'user0']
+    assert results[0]['is_subscribed'] is True
+    assert results[0]['recipes_count'] == 4
+    assert [recipe['name'] for recipe in results[0]['recipes']] == [
+        'Рецепт 7', 'Рецепт 5']
+    assert set(results[0]['recipes'][0]) == {
+        'id', 'name', 'image', 'image_variants', 'cooking_time'}
+
+
+def test_feed_without_recipes_limit(subscriber, client_for):
+    results = client_for(subscriber).get(URL).json()['results']
+
+    assert [len(row['recipes']) for row in results] == [4, 4]
+
+
+@pytest.mark.parametrize('recipes_limit', ['x', '0', '-1'])
+def test_feed_rejects_invalid_recipes_limit(subscriber, client_for,
+                                            recipes_limit):
+    response = client_for(subscriber).get(
+        URL, {'recipes_limit': recipes_limit})
+
+    assert response.status_code == 400
+    assert 'recipes_limit' in response.json()
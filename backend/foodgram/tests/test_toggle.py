@@ -0,0 +1,100 @@
+import pytest
+from django.core.management import call_command
+from django.db import transaction
+
+from api.services import delete_existing, insert_ignore
+from recipes.models import Favourite, Recipe, ShoppingCart, Subscription
+from users.models import User
+
+
+def check_consistency():
+    call_command('rebuild_shopping_lists', '--check')
+    call_command('reconcile_counters', '--check')
+
+
+@pytest.mark.parametrize('action', ['favorite', 'shopping_cart'])
+def test_recipe_toggle_status_mapping(recipes, users, client_for, action):
+    client = client_for(users[2])
+    url = f'/api/recipes/{recipes[6].id}/{action}/'
+
+    response = client.post(url)
+    assert response.status_code == 201, response.content
+    assert response.json()['name'] == 'Рецепт 6'
+    assert client.post(url).status_code == 400
+    check_consistency()
+
+    assert client.delete(url).status_code == 204
+    assert client.delete(url).status_code == 400
+    check_consistency()
+
+
+@pytest.mark.parametrize('action', ['favorite', 'shopping_cart'])
+def test_recipe_toggle_errors(recipes, users, client_for, action):
+    assert client_for(users[2]).post(
+        f'/api/recipes/999/{action}/').status_code == 404
+    assert client_for().post(
+        f'/api/recipes/{recipes[0].id}/{action}/').status_code == 401
+
+
+def test_favorite_toggle_updates_counter(recipes, users, client_for):
+    client = client_for(users[0])
+    url = f'/api/recipes/{recipes[0].id}/favorite/'
+
+    client.post(url)
+    client.post(url)
+    assert Recipe.objects.get(pk=recipes[0].pk).favorites_count == 2
+
+    client.delete(url)
+    client.delete(url)
+    assert Recipe.objects.get(pk=recipes[0].pk).favorites_count == 1
+
+
+def test_cart_toggle_updates_totals(recipes, users, ingredients, client_for):
+    client = client_for(users[0])
+    url = f'/api/recipes/{recipes[3].id}/shopping_cart/'
+
+    client.post(url)
+    client.post(url)
+    lines = b''.join(client.get(
+        '/api/recipes/download_shopping_cart/').streaming_content)
+    assert lines.decode().splitlines() == [
+        'ингридиент 0(г) - 1',
+        'ингридиент 1(г) - 2',
+        'ингридиент 2(г) - 3',
+        'ингридиент 3(г) - 4',
+    ]
+
+    client.delete(url)
+    assert not ShoppingCart.objects.filter(user=users[0]).exists()
+    check_consistency()
+
+
+def test_subscribe_status_mapping(users, client_for):
+    client = client_for(users[2])
+    url = f'/api/users/{users[0].id}/subscribe/'
+
+    response = client.post(url)
+    assert response.status_code == 201, response.content
+    assert response.json() == {'user': 'user2'}
+    assert client.post(url).status_code == 400
+    assert User.objects.get(pk=users[0].pk).subscribers_count == 1
+
+    assert client.delete(url).status_code == 204
+    assert client.delete(url).status_code == 400
+    assert User.objects.get(pk=users[0].pk).subscribers_count == 0
+
+    assert client.post(
+        f'/api/users/{users[2].id}/subscribe/').status_code == 400
+    assert client.post('/api/users/999/subscribe/').status_code == 404
+    assert not Subscription.objects.exists()
+
+
+def test_insert_ignore_keeps_transaction_usable(recipes, users):
+    with transaction.atomic():
+        assert insert_ignore(Favourite, user=users[0], recipe=recipes[0])
+        assert not insert_ignore(Favourite, user=users[0], recipe=recipes[0])
+        # После конфликта транзакция не прервана и принимает запросы.
+        assert Favourite.objects.filter(user=users[0]).count() == 1
+
+    assert delete_existing(Favourite, user=users[0], recipe=recipes[0])
+    assert not delete_existing(Favourite, user=users[0], recipe=recipes[0])
@@ -0,0 +1,51 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import Subscription
+from users.models import User
+
+URL = '/api/users/'
+
+
+def subscription_queries(client, url):
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url)
+    assert response.status_code == 200, response.content
+    return response, [
+        query['sql'] for query in queries
+        if 'recipes_subscription' in query['sql']
+    ]
+
+
+@pytest.fixture
+def subscriber(users):
+    """Третий пользователь подписан на первого; всего 13 пользователей."""
+    User.objects.bulk_create(
+        User(username=f'author{index}', email=f'author{index}@foodgram.ru')
+        for index in range(10)
+    )
+    Subscription.objects.create(user=users[2], subscribing=users[0])
+    return users[2]
+
+
+@pytest.mark.parametrize('page', [1, 2, 3])
+def test_users_list_resolves_flags_in_one_query(subscriber, users,
+                                                client_for, page):
+    response, queries = subscription_queries(
+        client_for(subscriber), f'{URL}?page={page}')
+
+    assert len(queries) == 1
+    assert {
+        row['id']: row['is_subscribed']
+        for row in response.json()['results']
+        if row['is_subscribed']
+    } == ({users[0].id: True} if page == 1 else {})
+
+
+def test_single_user_flags(subscriber, users, client_for):
+    client = client_for(subscriber)
+
+    assert client.get(f'{URL}{users[0].id}/').json()['is_subscribed'] is True
+    assert client.get(f'{URL}{users[1].id}/').json()['is_subscribed'] is False
+    assert client.get(f'{URL}me/').json()['is_subscribed'] is False
@@ -3,10 +3,11 @@ from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.validators import UnicodeUsernameValidator
 from django.db import models
 
+from recipes.mixins import DenormalizedFieldsMixin
 from recipes.validators import validate_name
 
 
-class User(AbstractUser):
+class User(DenormalizedFieldsMixin, AbstractUser):
     """Модель пользователя."""
 
     email = models.EmailField(
@@ -34,6 +35,21 @@ class User(AbstractUser):
         validators=[validate_name]
     )
 
+    recipes_count = models.IntegerField(
+        default=0,
+        db_index=True,
+        editable=False,
+        verbose_name='Рецептов'
+    )
+    subscribers_count = models.IntegerField(
+        default=0,
+        db_index=True,
+        editable=False,
+        verbose_name='Подписчиков'
+    )
+
+    denormalized_fields = ('recipes_count', 'subscribers_count')
+
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
 